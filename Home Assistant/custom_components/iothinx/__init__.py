@@ -0,0 +1,95 @@
+import logging
+import voluptuous as vol
+import homeassistant.helpers.config_validation as cv
+
+from homeassistant.const import CONF_HOST, CONF_PORT, CONF_USERNAME, CONF_PASSWORD, EVENT_HOMEASSISTANT_STOP
+
+from .const import (
+    DOMAIN,
+    CONF_BACKEND,
+    CONF_COMMUNITY,
+    CONF_VERSION,
+    CONF_AUTH_KEY,
+    CONF_AUTH_PROTOCOL,
+    CONF_PRIV_KEY,
+    CONF_PRIV_PROTOCOL,
+    CONF_TRAP,
+    BACKEND_HTTP,
+    DEFAULT_PORT,
+    DEFAULT_HTTP_PORT,
+    DEFAULT_COMMUNITY,
+    DEFAULT_TRAP_HOST,
+    DEFAULT_TRAP_PORT,
+)
+
+logger = logging.getLogger(__name__)
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        DOMAIN: vol.Schema(
+            {
+                vol.Optional(CONF_TRAP): vol.Schema(
+                    {
+                        vol.Optional(CONF_HOST, default=DEFAULT_TRAP_HOST): cv.string,
+                        vol.Optional(CONF_PORT, default=DEFAULT_TRAP_PORT): cv.port,
+                        vol.Optional(CONF_COMMUNITY, default=DEFAULT_COMMUNITY): cv.string,
+                    }
+                ),
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+class IoThinxError(Exception):
+    pass
+
+
+async def async_setup(hass, config):
+    """
+    Прием SNMP trap/inform от устройств. Уведомление обновляет сущности устройства сразу,
+    не дожидаясь очередного опроса.
+    """
+    trap = config.get(DOMAIN, {}).get(CONF_TRAP)
+    if trap is None:
+        return True
+
+    from iolib.snmp_trap import TrapReceiver
+
+    receiver = TrapReceiver(trap[CONF_HOST], trap[CONF_PORT], trap[CONF_COMMUNITY])
+
+    def dispatch(event):
+        for client in hass.data.setdefault(DOMAIN, {}).get('clients', {}).values():
+            if client.host == event.host:
+                hass.async_create_task(client.async_trap(event))
+
+    receiver.add_listener(dispatch)
+    try:
+        receiver.start()
+    except Exception as error:
+        logger.error(f'{DOMAIN} error: trap receiver failed to start: {error}')
+        return False
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: receiver.stop())
+    hass.data.setdefault(DOMAIN, {})['trap_receiver'] = receiver
+    return True
+
+
+def get_client(hass, config):
+    """
+    Общий клиент устройства для выбранного в конфигурации протокола.
+    """
+    host = config.get(CONF_HOST)
+    port = config.get(CONF_PORT)
+
+    if config.get(CONF_BACKEND) == BACKEND_HTTP:
+        from .rack import get_rack_client
+        if str(port) == DEFAULT_PORT:
+            port = DEFAULT_HTTP_PORT
+        return get_rack_client(hass, host, port, config.get(CONF_USERNAME), config.get(CONF_PASSWORD))
+
+    from .snmp import get_snmp_client
+    return get_snmp_client(hass, host, port, config.get(CONF_COMMUNITY), config.get(CONF_VERSION),
+                           config.get(CONF_USERNAME), config.get(CONF_AUTH_KEY), config.get(CONF_PRIV_KEY),
+                           config.get(CONF_AUTH_PROTOCOL), config.get(CONF_PRIV_PROTOCOL))
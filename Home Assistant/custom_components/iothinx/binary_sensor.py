@@ -1,32 +1,25 @@
 import logging
 import voluptuous as vol
-import pysnmp.hlapi.asyncio as hlapi
 import homeassistant.helpers.config_validation as cv
 
 from datetime import timedelta
-from pysnmp.hlapi.asyncio import (
-    CommunityData,
-    ContextData,
-    ObjectIdentity,
-    ObjectType,
-    SnmpEngine,
-    UdpTransportTarget,
-    UsmUserData,
-    getCmd,
-)
 
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.components.binary_sensor import BinarySensorEntity, PLATFORM_SCHEMA, DEVICE_CLASSES
 from homeassistant.const import (
     CONF_NAME,
     CONF_HOST,
     CONF_PORT,
     CONF_USERNAME,
+    CONF_PASSWORD,
     CONF_ICON_TEMPLATE,
     CONF_DEVICE_CLASS,
 )
 from .const import (
     DOMAIN,
     CONF_BASEOID,
+    CONF_BACKEND,
     CONF_IO_NUM,
     CONF_DEFAULT_VALUE,
     CONF_COMMUNITY,
@@ -36,6 +29,7 @@ from .const import (
     CONF_PRIV_KEY,
     CONF_PRIV_PROTOCOL,
     DEFAULT_NAME,
+    DEFAULT_BACKEND,
     DEFAULT_HOST,
     DEFAULT_PORT,
     DEFAULT_COMMUNITY,
@@ -45,8 +39,10 @@ from .const import (
     DEFAULT_VALUE,
     MAP_VERSIONS,
     MAP_AUTH_PROTOCOLS,
-    MAP_PRIV_PROTOCOLS
+    MAP_PRIV_PROTOCOLS,
+    BACKENDS,
 )
+from . import IoThinxError, get_client
 
 logger = logging.getLogger(__name__)
 
@@ -55,12 +51,14 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Required(CONF_BASEOID): cv.string,
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+        vol.Optional(CONF_BACKEND, default=DEFAULT_BACKEND): vol.In(BACKENDS),
         vol.Optional(CONF_HOST, default=DEFAULT_HOST): cv.string,
         vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
         vol.Optional(CONF_IO_NUM): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
         vol.Optional(CONF_COMMUNITY, default=DEFAULT_COMMUNITY): cv.string,
         vol.Optional(CONF_VERSION, default=DEFAULT_VERSION): vol.In(MAP_VERSIONS),
         vol.Optional(CONF_USERNAME): cv.string,
+        vol.Optional(CONF_PASSWORD): cv.string,
         vol.Optional(CONF_AUTH_KEY): cv.string,
         vol.Optional(CONF_PRIV_KEY): cv.string,
         vol.Optional(CONF_AUTH_PROTOCOL, default=DEFAULT_AUTH_PROTOCOL): vol.In(MAP_AUTH_PROTOCOLS),
@@ -92,40 +90,34 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     if icon_template is not None:
         icon_template.hass = hass
 
-    if version == '3':
-        auth = UsmUserData(username, authKey=auth_key or None, privKey=priv_key or None,
-                           authProtocol=getattr(hlapi, MAP_AUTH_PROTOCOLS[auth_protocol]), privProtocol=getattr(hlapi, MAP_PRIV_PROTOCOLS[priv_protocol])),
-    else:
-        auth = CommunityData(community, mpModel=MAP_VERSIONS[version])
-
-    auth = [SnmpEngine(), auth, UdpTransportTarget((host, port)), ContextData()]
+    client = get_client(hass, config)
     baseoid, start = baseoid.rsplit('.', 1)
     start = int(start)
 
     if io_num is not None and type(io_num) is int:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(f'{baseoid}.0')))
+        error = await client.async_check(f'{baseoid}.0')
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxBinarySensor(
             name=f'{name}-DI-{str(io).zfill(2)}',
             baseoid=f'{baseoid}.{io}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             icon_template=icon_template
         ) for io in range(start, start+io_num)]
     else:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(baseoid)))
+        error = await client.async_check(baseoid)
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxBinarySensor(
             name=f'{name}-DI-{str(start).zfill(2)}',
             baseoid=f'{baseoid}.{start}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             icon_template=icon_template
@@ -135,10 +127,10 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 
 
 class IoThinxBinarySensor(BinarySensorEntity):
-    def __init__(self, name, baseoid, auth, default_value, device_class, icon_template):
+    def __init__(self, name, baseoid, client, default_value, device_class, icon_template):
         self._name = name
         self._baseoid = baseoid
-        self._auth = auth
+        self._client = client
         self._default_value = default_value
         self._device_class = device_class
         self._icon_template = icon_template
@@ -161,16 +153,36 @@ class IoThinxBinarySensor(BinarySensorEntity):
     def is_on(self) -> bool:
         return self._value
 
+    @property
+    def should_poll(self) -> bool:
+        return False
+
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(async_track_time_interval(self.hass, self._async_poll, SCAN_INTERVAL))
+        self.async_on_remove(self._client.async_listen(self._baseoid, self._async_pushed))
+
+    async def _async_poll(self, now=None) -> None:
+        if await self._async_fetch():
+            self.async_write_ha_state()
+
     async def async_update(self) -> None:
-        error, status, index, table = await getCmd(*self._auth, ObjectType(ObjectIdentity(self._baseoid)))
-
-        if error:
-            logger.error(f'SNMP error ({self._baseoid}): {error}')
-        elif status:
-            logger.error(f'SNMP error: {status.prettyPrint()} at {index and table[-1][int(index) - 1] or "?"}')
-
-        if error or status:
-            self._value = self._default_value
-        else:
-            for row in table:
-                self._value = bool(int(row[-1]))
\ No newline at end of file
+        await self._async_fetch()
+
+    async def _async_fetch(self) -> bool:
+        try:
+            value = bool(int(await self._client.async_get(self._baseoid)))
+        except IoThinxError as error:
+            logger.error(error)
+            value = self._default_value
+        return self._apply(value)
+
+    @callback
+    def _async_pushed(self, value) -> None:
+        if self._apply(bool(int(value))):
+            self.async_write_ha_state()
+
+    def _apply(self, value) -> bool:
+        if value == self._value:
+            return False
+        self._value = value
+        return True
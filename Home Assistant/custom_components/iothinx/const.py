@@ -1,20 +1,32 @@
 # Base
 DOMAIN = 'iothinx'
 
+CONF_BACKEND = 'backend'
 CONF_DEFAULT_VALUE = 'default_value'
+CONF_DEADBAND = 'deadband'
 CONF_IO_NUM = 'io_num'
 CONF_MIN_LEVEL = 'min_level'
 CONF_MAX_LEVEL = 'max_level'
+CONF_TRANSITION = 'transition'
+CONF_STEP_RESOLUTION = 'step_resolution'
+CONF_TRAP = 'trap'
 
 DEFAULT_NAME = "IoThinx"
 DEFAULT_HOST = "localhost"
 DEFAULT_PORT = "161"
+DEFAULT_HTTP_PORT = 80
+DEFAULT_BACKEND = 'snmp'
 DEFAULT_VALUE = False
+DEFAULT_DEADBAND = 0
 DEFAULT_UNIT_OF_MEASUREMENT = 'mA'
 DEFAULT_PAYLOAD_ON = 1
 DEFAULT_PAYLOAD_OFF = 0
 DEFAULT_MIN_LEVEL = 4
 DEFAULT_MAX_LEVEL = 20
+DEFAULT_TRANSITION = 0
+DEFAULT_STEP_RESOLUTION = 0.1
+DEFAULT_TRAP_HOST = '0.0.0.0'
+DEFAULT_TRAP_PORT = 162
 
 # SNMP
 CONF_BASEOID = 'baseoid'
@@ -30,6 +42,16 @@ DEFAULT_VERSION = '1'
 DEFAULT_AUTH_PROTOCOL = 'none'
 DEFAULT_PRIV_PROTOCOL = 'none'
 
+BATCH_WINDOW = 0.05
+BATCH_MAX_VARBINDS = 32
+VERIFY_DELAY = 0.5
+RAMP_TICK = 0.1
+RACK_MIN_INTERVAL = 1.0
+
+BACKEND_SNMP = 'snmp'
+BACKEND_HTTP = 'http'
+BACKENDS = [BACKEND_SNMP, BACKEND_HTTP]
+
 MAP_VERSIONS = {"1": 0, "2c": 1, "3": None}
 
 MAP_AUTH_PROTOCOLS = {
@@ -1,27 +1,19 @@
 import logging
 import voluptuous as vol
-import pysnmp.hlapi.asyncio as hlapi
 import homeassistant.helpers.config_validation as cv
 
 from datetime import timedelta
+from functools import partial
+from homeassistant.core import callback
 from ..dimmer import DimmerEntity, PLATFORM_SCHEMA, DEVICE_CLASSES
-from pysnmp.hlapi.asyncio import (
-    CommunityData,
-    ContextData,
-    ObjectIdentity,
-    ObjectType,
-    SnmpEngine,
-    UdpTransportTarget,
-    UsmUserData,
-    getCmd,
-    setCmd,
-)
+from pysnmp.proto.rfc1902 import OctetString
 
 from homeassistant.const import (
     CONF_NAME,
     CONF_HOST,
     CONF_PORT,
     CONF_USERNAME,
+    CONF_PASSWORD,
     CONF_VALUE_TEMPLATE,
     CONF_ICON_TEMPLATE,
     CONF_DEVICE_CLASS,
@@ -31,6 +23,7 @@ from homeassistant.const import (
 from .const import (
     DOMAIN,
     CONF_BASEOID,
+    CONF_BACKEND,
     CONF_IO_NUM,
     CONF_DEFAULT_VALUE,
     CONF_COMMUNITY,
@@ -40,6 +33,7 @@ from .const import (
     CONF_PRIV_KEY,
     CONF_PRIV_PROTOCOL,
     DEFAULT_NAME,
+    DEFAULT_BACKEND,
     DEFAULT_HOST,
     DEFAULT_PORT,
     DEFAULT_COMMUNITY,
@@ -48,27 +42,37 @@ from .const import (
     DEFAULT_PRIV_PROTOCOL,
     CONF_MIN_LEVEL,
     CONF_MAX_LEVEL,
+    CONF_TRANSITION,
+    CONF_STEP_RESOLUTION,
     DEFAULT_UNIT_OF_MEASUREMENT,
     DEFAULT_MIN_LEVEL,
     DEFAULT_MAX_LEVEL,
+    DEFAULT_TRANSITION,
+    DEFAULT_STEP_RESOLUTION,
     MAP_VERSIONS,
     MAP_AUTH_PROTOCOLS,
-    MAP_PRIV_PROTOCOLS
+    MAP_PRIV_PROTOCOLS,
+    BACKENDS,
 )
+from . import IoThinxError, get_client
+from .ramp import get_ramp_scheduler
 
 logger = logging.getLogger(__name__)
 
 SCAN_INTERVAL = timedelta(seconds=10)
+LEVEL_TOLERANCE = 0.01
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Required(CONF_BASEOID): cv.string,
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+        vol.Optional(CONF_BACKEND, default=DEFAULT_BACKEND): vol.In(BACKENDS),
         vol.Optional(CONF_HOST, default=DEFAULT_HOST): cv.string,
         vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
         vol.Optional(CONF_IO_NUM): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
         vol.Optional(CONF_COMMUNITY, default=DEFAULT_COMMUNITY): cv.string,
         vol.Optional(CONF_VERSION, default=DEFAULT_VERSION): vol.In(MAP_VERSIONS),
         vol.Optional(CONF_USERNAME): cv.string,
+        vol.Optional(CONF_PASSWORD): cv.string,
         vol.Optional(CONF_AUTH_KEY): cv.string,
         vol.Optional(CONF_PRIV_KEY): cv.string,
         vol.Optional(CONF_AUTH_PROTOCOL, default=DEFAULT_AUTH_PROTOCOL): vol.In(MAP_AUTH_PROTOCOLS),
@@ -78,6 +82,8 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
         vol.Optional(CONF_DEVICE_CLASS): vol.In(DEVICE_CLASSES),
         vol.Optional(CONF_MIN_LEVEL, default=DEFAULT_MIN_LEVEL): vol.Coerce(float),
         vol.Optional(CONF_MAX_LEVEL, default=DEFAULT_MAX_LEVEL): vol.Coerce(float),
+        vol.Optional(CONF_TRANSITION, default=DEFAULT_TRANSITION): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_STEP_RESOLUTION, default=DEFAULT_STEP_RESOLUTION): vol.All(vol.Coerce(float), vol.Range(min=0)),
         vol.Optional(CONF_VALUE_TEMPLATE): cv.template,
         vol.Optional(CONF_ICON_TEMPLATE): cv.template,
     }
@@ -87,70 +93,64 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     baseoid = config.get(CONF_BASEOID)
     name = config.get(CONF_NAME)
-    host = config.get(CONF_HOST)
-    port = config.get(CONF_PORT)
     io_num = config.get(CONF_IO_NUM)
-    community = config.get(CONF_COMMUNITY)
-    version = config.get(CONF_VERSION)
-    username = config.get(CONF_USERNAME)
-    auth_key = config.get(CONF_AUTH_KEY)
-    priv_key = config.get(CONF_PRIV_KEY)
-    auth_protocol = config.get(CONF_AUTH_PROTOCOL)
-    priv_protocol = config.get(CONF_PRIV_PROTOCOL)
     default_value = config.get(CONF_DEFAULT_VALUE)
     unit_of_measurement = config.get(CONF_UNIT_OF_MEASUREMENT)
     device_class = config.get(CONF_DEVICE_CLASS)
     min_level = config.get(CONF_MIN_LEVEL)
     max_level = config.get(CONF_MAX_LEVEL)
+    transition = config.get(CONF_TRANSITION)
+    step_resolution = config.get(CONF_STEP_RESOLUTION)
     value_template = config.get(CONF_VALUE_TEMPLATE)
     icon_template = config.get(CONF_ICON_TEMPLATE)
 
     if icon_template is not None:
         icon_template.hass = hass
 
-    if version == '3':
-        auth = UsmUserData(username, authKey=auth_key or None, privKey=priv_key or None,
-                           authProtocol=getattr(hlapi, MAP_AUTH_PROTOCOLS[auth_protocol]), privProtocol=getattr(hlapi, MAP_PRIV_PROTOCOLS[priv_protocol])),
-    else:
-        auth = CommunityData(community, mpModel=MAP_VERSIONS[version])
-
-    auth = [SnmpEngine(), auth, UdpTransportTarget((host, port)), ContextData()]
+    client = get_client(hass, config)
+    ramps = get_ramp_scheduler(hass)
     baseoid, start = baseoid.rsplit('.', 1)
     start = int(start)
 
     if io_num is not None and type(io_num) is int:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(baseoid)))
+        error = await client.async_check(baseoid)
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxDimmer(
             name=f'{name}-AO-{str(io).zfill(2)}',
             baseoid=f'{baseoid}.{io}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             unit_of_measurement=unit_of_measurement,
             min_level=min_level,
             max_level=max_level,
+            ramps=ramps,
+            transition=transition,
+            step_resolution=step_resolution,
             value_template=value_template,
             icon_template=icon_template
         ) for io in range(start, start+io_num)]
     else:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(baseoid)))
+        error = await client.async_check(baseoid)
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxDimmer(
             name=f'{name}-AO-{str(start).zfill(2)}',
             baseoid=f'{baseoid}.{start}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             unit_of_measurement=unit_of_measurement,
             min_level=min_level,
             max_level=max_level,
+            ramps=ramps,
+            transition=transition,
+            step_resolution=step_resolution,
             value_template=value_template,
             icon_template=icon_template
         )]
@@ -159,10 +159,11 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 
 
 class IoThinxDimmer(DimmerEntity):
-    def __init__(self, name, baseoid, auth, default_value, device_class, unit_of_measurement, min_level, max_level, value_template, icon_template):
+    def __init__(self, name, baseoid, client, default_value, device_class, unit_of_measurement, min_level, max_level,
+                 ramps, transition, step_resolution, value_template, icon_template):
         self._name = name
         self._baseoid = baseoid
-        self._auth = auth
+        self._client = client
         self._default_value = default_value
         self._device_class = device_class
         self._unit_of_measurement = unit_of_measurement
@@ -170,9 +171,14 @@ class IoThinxDimmer(DimmerEntity):
         self._icon_template = icon_template
         self._min_level = min_level
         self._max_level = max_level
+        self._ramps = ramps
+        self._transition = transition
+        self._step_resolution = step_resolution
 
         self._lust_level = default_value
         self._level = default_value
+        self._writing = None
+        """Уровень, записанный на устройство и ожидающий проверки"""
 
     @property
     def name(self) -> str:
@@ -217,28 +223,98 @@ class IoThinxDimmer(DimmerEntity):
         level = kwargs.get('level')
         if type(level) is str and level.isdigit():
             level = float(level)
-            await self._set_value(level)
+            await self._set_value(level, kwargs.get(CONF_TRANSITION))
 
     async def async_turn_on(self, **kwargs):
-        await self._set_value(self._lust_level)
+        await self._set_value(self._lust_level, kwargs.get(CONF_TRANSITION))
 
     async def async_turn_off(self, **kwargs):
-        await self._set_value(self._min_level)
+        await self._set_value(self._min_level, kwargs.get(CONF_TRANSITION))
+
+    async def async_added_to_hass(self):
+        self.async_on_remove(self._client.async_listen(self._baseoid, self._async_pushed))
 
     async def async_update(self):
-        error, status, index, table = await getCmd(*self._auth, ObjectType(ObjectIdentity(self._baseoid)))
-        self._lust_level = self._level
+        if self._writing is not None:
+            return
 
-        if error:
-            logger.error(f'SNMP error ({self._baseoid}): {error}')
-        elif status:
-            logger.error(f'SNMP error: {status.prettyPrint()} at {index and table[-1][int(index) - 1] or "?"}')
+        self._lust_level = self._level
 
-        if error or status:
+        try:
+            value = await self._client.async_get(self._baseoid)
+        except IoThinxError as error:
+            logger.error(error)
             self._level = self._min_level
         else:
-            for row in table:
-                self._level = float(row[-1])
+            self._level = float(value)
+
+    async def _set_value(self, value, transition=None):
+        value = float(value)
+        transition = self._transition if transition is None else float(transition)
+        if self._writing == value:
+            return
+
+        if transition > 0:
+            self._writing = value
+            self._ramps.async_start(self._client, self._baseoid, self._level, value, transition, self._step_resolution,
+                                    partial(self._async_ramp_step, value), self._encode)
+            return
+
+        self._ramps.async_cancel(self._client, self._baseoid)
+        previous = self._level
+        self._writing = value
+        self._level = value
+        self.async_write_ha_state()
+
+        try:
+            await self._client.async_set(self._baseoid, self._encode(value))
+        except IoThinxError as error:
+            logger.error(error)
+            if self._writing == value:
+                self._writing = None
+                self._level = previous
+                self.async_write_ha_state()
+        else:
+            self._client.async_verify(self._baseoid, partial(self._async_verified, value))
+
+    @callback
+    def _async_verified(self, written, value):
+        if self._writing != written:
+            return
+        self._writing = None
+        if value is None:
+            return
+
+        value = float(value)
+        if abs(value - written) > LEVEL_TOLERANCE:
+            logger.warning(f'{self._name}: write not confirmed, device reports {value}')
+            self._level = value
+            self.async_write_ha_state()
+
+    @callback
+    def _async_pushed(self, value):
+        if self._writing is not None:
+            return
+
+        value = float(value)
+        if abs(value - self._level) > LEVEL_TOLERANCE:
+            self._lust_level = self._level
+            self._level = value
+            self.async_write_ha_state()
+
+    @callback
+    def _async_ramp_step(self, target, value, done):
+        if self._writing != target:
+            return
+        if value is None:
+            self._writing = None
+            return
+
+        self._level = value
+        self.async_write_ha_state()
+        if done:
+            self._client.async_verify(self._baseoid, partial(self._async_verified, target))
 
-    async def _set_value(self, value):
-        await setCmd(*self._auth, ObjectType(ObjectIdentity(self._baseoid), value))
\ No newline at end of file
+    @staticmethod
+    def _encode(value):
+        return OctetString(str(round(value, 3)))
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from iolib.cache import consume_exception
+from iolib.moxa_io import Device, DigitalInput, DigitalOutput, AnalogOutput
+
+from . import IoThinxError
+from .const import DOMAIN, RACK_MIN_INTERVAL, VERIFY_DELAY
+
+logger = logging.getLogger(__name__)
+
+
+def get_rack_client(hass, host, port, username, password) -> 'IoThinxRackClient':
+    """
+    Общий HTTP клиент устройства. Один опрос iolib Device на стойку для всех сущностей.
+    """
+    clients = hass.data.setdefault(DOMAIN, {}).setdefault('clients', {})
+    key = ('http', host, int(port), username)
+    if key not in clients:
+        device = Device(host, int(port), username, password, loop=hass.loop)
+        clients[key] = IoThinxRackClient(hass, device)
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: hass.async_create_task(device.close()))
+    return clients[key]
+
+
+class IoThinxRackClient:
+    """
+    Клиент с тем же интерфейсом, что и IoThinxSnmpClient.
+    Адрес канала задается как `<slot>.<channel>`, где channel - индекс в Module.ios.
+    """
+    def __init__(self, hass, device: Device) -> None:
+        self._hass = hass
+        self._device: Device = device
+
+        self._connected: bool = False
+        self._refresh: Optional[asyncio.Task] = None
+        """Текущее обновление, общее для всех ожидающих сущностей"""
+        self._lust_refresh: float = 0
+        self._verify_handle: Optional[asyncio.TimerHandle] = None
+        self._verify: List[Tuple[str, Callable[[Optional[Any]], None]]] = []
+        self._listeners: Dict[str, List[Callable[[Any], None]]] = {}
+
+    @property
+    def device(self) -> Device:
+        return self._device
+
+    @property
+    def host(self) -> str:
+        return self._device._host
+
+    async def async_check(self, address: str) -> Optional[str]:
+        try:
+            await self._async_refresh()
+            if '.' in address:
+                self._channel(address)
+            elif self._device[int(address) - 1] is None:
+                raise IoThinxError(f'Slot {address} not found on {self._device.base_url}')
+        except Exception as error:
+            return str(error)
+        return None
+
+    async def async_get(self, address: str) -> Any:
+        await self._async_refresh()
+        return self._read(self._channel(address))
+
+    async def async_set(self, address: str, value: Any) -> None:
+        await self.async_set_many([(address, value)])
+
+    async def async_set_many(self, varbinds: List[Tuple[str, Any]]) -> None:
+        writes = []
+        for address, value in varbinds:
+            channel = self._channel(address)
+            if isinstance(channel, DigitalOutput):
+                writes.append(channel.set_status(bool(int(value))))
+            elif isinstance(channel, AnalogOutput):
+                writes.append(channel.set_value(float(str(value))))
+            else:
+                raise IoThinxError(f'Channel {address} is read only')
+
+        try:
+            await asyncio.gather(*writes)
+        except Exception as error:
+            raise IoThinxError(f'HTTP error ({self._device.base_url}): {error}') from error
+
+    def async_verify(self, address: str, callback: Callable[[Optional[Any]], None]) -> None:
+        self._verify.append((address, callback))
+        if self._verify_handle is None:
+            self._verify_handle = self._hass.loop.call_later(VERIFY_DELAY, self._flush_verify)
+
+    def async_listen(self, address: str, callback: Callable[[Any], None]) -> Callable[[], None]:
+        self._listeners.setdefault(address, []).append(callback)
+        return lambda: self._listeners[address].remove(callback)
+
+    async def async_trap(self, event) -> None:
+        """
+        Применить SNMP уведомление к стойке: значения из уведомления записываются в каналы,
+        затронутые модули перечитываются по HTTP. Затем значения передаются подписчикам.
+        """
+        from iolib.snmp_trap import apply_event
+
+        if not self._connected:
+            return
+        try:
+            await apply_event(self._device, event)
+        except Exception as error:
+            logger.error(f'HTTP error ({self._device.base_url}): {error}')
+            return
+
+        for address, callbacks in self._listeners.items():
+            value = self._read(self._channel(address))
+            for callback in list(callbacks):
+                callback(value)
+
+    def _flush_verify(self) -> None:
+        self._verify_handle = None
+        verify, self._verify = self._verify, []
+
+        async def verify_task():
+            """
+            Перечитать только модули проверяемых каналов. Чтение начинается после записи, поэтому
+            подтверждает ее или возвращает значение устройства вместо записанного (Device.write_mismatches).
+            """
+            channels = []
+            for address, _ in verify:
+                try:
+                    channels.append(self._channel(address))
+                except IoThinxError as error:
+                    logger.error(error)
+                    channels.append(None)
+
+            modules = {id(channel._module): channel._module for channel in channels if channel is not None}
+            try:
+                await asyncio.gather(*[self._device.update_module(module) for module in modules.values()])
+            except Exception as error:
+                logger.error(f'HTTP error ({self._device.base_url}): {error}')
+                channels = [None for _ in verify]
+
+            for (address, callback), channel in zip(verify, channels):
+                value = self._read(channel) if channel is not None and not channel.unconfirmed else None
+                try:
+                    callback(value)
+                except Exception:
+                    logger.exception(f'Verify callback failed ({address})')
+
+        self._hass.async_create_task(verify_task())
+
+    async def _async_refresh(self) -> None:
+        if self._refresh is None:
+            if self._connected and self._hass.loop.time() - self._lust_refresh < RACK_MIN_INTERVAL:
+                return
+            self._refresh = self._hass.loop.create_task(self._async_update())
+            self._refresh.add_done_callback(consume_exception)
+        await asyncio.shield(self._refresh)
+
+    async def _async_update(self) -> None:
+        """
+        Общее обновление отдельной задачей: отмена обновления одной сущности не затрагивает остальные.
+        """
+        try:
+            if self._connected:
+                await self._device._update()
+            else:
+                await self._device.connect()
+                self._connected = True
+        except Exception as error:
+            raise IoThinxError(f'HTTP error ({self._device.base_url}): {error}') from error
+        else:
+            self._lust_refresh = self._hass.loop.time()
+        finally:
+            self._refresh = None
+
+    def _channel(self, address: str):
+        slot, no = address.split('.', 1)
+        module = self._device[int(slot) - 1]
+        channel = module[int(no)] if module is not None else None
+        if channel is None:
+            raise IoThinxError(f'Channel {address} not found on {self._device.base_url}')
+        return channel
+
+    @staticmethod
+    def _read(channel) -> Any:
+        if isinstance(channel, (DigitalInput, DigitalOutput)):
+            return int(channel.status)
+        return channel.value
@@ -0,0 +1,156 @@
+import math
+import asyncio
+import logging
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .const import DOMAIN, RAMP_TICK
+from . import IoThinxError
+
+logger = logging.getLogger(__name__)
+
+
+def get_ramp_scheduler(hass) -> 'RampScheduler':
+    """
+    Единый планировщик плавных переходов для всех AO каналов.
+    """
+    data = hass.data.setdefault(DOMAIN, {})
+    if 'ramp' not in data:
+        data['ramp'] = RampScheduler(hass)
+    return data['ramp']
+
+
+class Ramp:
+    def __init__(self, client, oid: str, start: float, target: float, duration: float, resolution: float,
+                 callback: Callable[[Optional[float], bool], None], now: float, encode: Callable[[float], Any]) -> None:
+        self.client = client
+        self.oid = oid
+        self.start = start
+        self.target = target
+        self.duration = duration
+        self.callback = callback
+        self.encode = encode
+        self.started = now
+
+        self.steps: int = max(1, math.ceil(abs(target - start) / resolution)) if resolution > 0 else 1
+        """Минимальное число записей, при котором шаг не превышает заданное разрешение"""
+        self.sent: int = 0
+        """Номер последнего отправленного шага"""
+
+    @property
+    def level(self) -> float:
+        return self.value(self.sent)
+
+    @property
+    def next_time(self) -> float:
+        return self.started + self.duration * (self.sent + 1) / self.steps
+
+    @property
+    def done(self) -> bool:
+        return self.sent >= self.steps
+
+    def value(self, step: int) -> float:
+        if step >= self.steps:
+            return self.target
+        return self.start + (self.target - self.start) * step / self.steps
+
+    def advance(self, now: float) -> Optional[float]:
+        """
+        Перейти к последнему шагу, время которого уже наступило.
+        Промежуточные шаги, пропущенные из за частоты планировщика, не отправляются.
+        """
+        if self.duration <= 0:
+            step = self.steps
+        else:
+            step = min(self.steps, math.floor((now - self.started) / self.duration * self.steps + 1e-9))
+        if step <= self.sent:
+            return None
+        self.sent = step
+        return self.value(step)
+
+
+class RampScheduler:
+    def __init__(self, hass) -> None:
+        self._hass = hass
+        self._ramps: Dict[Tuple[int, str], Ramp] = {}
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_active(self, client, oid: str) -> bool:
+        return (id(client), oid) in self._ramps
+
+    def level(self, client, oid: str) -> Optional[float]:
+        ramp = self._ramps.get((id(client), oid))
+        return ramp.level if ramp is not None else None
+
+    def async_start(self, client, oid: str, start: float, target: float, duration: float, resolution: float,
+                    callback: Callable[[Optional[float], bool], None], encode: Callable[[float], Any]) -> None:
+        """
+        Запустить переход канала к новому значению.
+        Если канал уже в переходе, новый переход начинается с последнего отправленного значения.
+        """
+        key = (id(client), oid)
+        current = self._ramps.get(key)
+        if current is not None:
+            start = current.level
+
+        self._ramps[key] = Ramp(client, oid, start, target, duration, resolution, callback, self._hass.loop.time(), encode)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = self._hass.async_create_task(self._async_run())
+
+    def async_cancel(self, client, oid: str) -> None:
+        self._ramps.pop((id(client), oid), None)
+
+    async def _async_run(self) -> None:
+        loop = self._hass.loop
+
+        while self._ramps:
+            self._wakeup.clear()
+            now = loop.time()
+
+            groups: Dict[int, List[Tuple[Ramp, float]]] = {}
+            for ramp in list(self._ramps.values()):
+                if ramp.next_time > now + RAMP_TICK / 2:
+                    continue
+                value = ramp.advance(now)
+                if value is not None:
+                    groups.setdefault(id(ramp.client), []).append((ramp, value))
+
+            if groups:
+                await asyncio.gather(*[self._async_write(steps) for steps in groups.values()])
+
+            if not self._ramps:
+                break
+
+            delay = max(RAMP_TICK, min(ramp.next_time for ramp in self._ramps.values()) - loop.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _async_write(self, steps: List[Tuple[Ramp, float]]) -> None:
+        client = steps[0][0].client
+        try:
+            await client.async_set_many([(ramp.oid, ramp.encode(value)) for ramp, value in steps])
+        except IoThinxError as error:
+            logger.error(error)
+            for ramp, _ in steps:
+                if self._finish(ramp, True):
+                    ramp.callback(None, True)
+            return
+
+        for ramp, value in steps:
+            if self._finish(ramp, ramp.done):
+                ramp.callback(value, ramp.done)
+
+    def _finish(self, ramp: Ramp, done: bool) -> bool:
+        """
+        Проверить, что переход не был заменен или отменен во время записи, и удалить завершенный.
+        """
+        key = (id(ramp.client), ramp.oid)
+        if self._ramps.get(key) is not ramp:
+            return False
+        if done:
+            del self._ramps[key]
+        return True
@@ -1,28 +1,20 @@
 import logging
 import voluptuous as vol
-import pysnmp.hlapi.asyncio as hlapi
 import homeassistant.helpers.config_validation as cv
 
 from datetime import timedelta
 
+from homeassistant.core import callback
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.components.sensor import PLATFORM_SCHEMA, DEVICE_CLASSES
-from pysnmp.hlapi.asyncio import (
-    CommunityData,
-    ContextData,
-    ObjectIdentity,
-    ObjectType,
-    SnmpEngine,
-    UdpTransportTarget,
-    UsmUserData,
-    getCmd,
-)
 
 from homeassistant.const import (
     CONF_NAME,
     CONF_HOST,
     CONF_PORT,
     CONF_USERNAME,
+    CONF_PASSWORD,
     CONF_VALUE_TEMPLATE,
     CONF_ICON_TEMPLATE,
     CONF_DEVICE_CLASS,
@@ -32,8 +24,10 @@ from homeassistant.const import (
 from .const import (
     DOMAIN,
     CONF_BASEOID,
+    CONF_BACKEND,
     CONF_IO_NUM,
     CONF_DEFAULT_VALUE,
+    CONF_DEADBAND,
     CONF_COMMUNITY,
     CONF_VERSION,
     CONF_AUTH_KEY,
@@ -41,6 +35,7 @@ from .const import (
     CONF_PRIV_KEY,
     CONF_PRIV_PROTOCOL,
     DEFAULT_NAME,
+    DEFAULT_BACKEND,
     DEFAULT_HOST,
     DEFAULT_PORT,
     DEFAULT_COMMUNITY,
@@ -48,11 +43,14 @@ from .const import (
     DEFAULT_AUTH_PROTOCOL,
     DEFAULT_PRIV_PROTOCOL,
     DEFAULT_VALUE,
+    DEFAULT_DEADBAND,
     DEFAULT_UNIT_OF_MEASUREMENT,
     MAP_VERSIONS,
     MAP_AUTH_PROTOCOLS,
-    MAP_PRIV_PROTOCOLS
+    MAP_PRIV_PROTOCOLS,
+    BACKENDS,
 )
+from . import IoThinxError, get_client
 
 logger = logging.getLogger(__name__)
 
@@ -61,12 +59,14 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Required(CONF_BASEOID): cv.string,
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+        vol.Optional(CONF_BACKEND, default=DEFAULT_BACKEND): vol.In(BACKENDS),
         vol.Optional(CONF_HOST, default=DEFAULT_HOST): cv.string,
         vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
         vol.Optional(CONF_IO_NUM): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
         vol.Optional(CONF_COMMUNITY, default=DEFAULT_COMMUNITY): cv.string,
         vol.Optional(CONF_VERSION, default=DEFAULT_VERSION): vol.In(MAP_VERSIONS),
         vol.Optional(CONF_USERNAME): cv.string,
+        vol.Optional(CONF_PASSWORD): cv.string,
         vol.Optional(CONF_AUTH_KEY): cv.string,
         vol.Optional(CONF_PRIV_KEY): cv.string,
         vol.Optional(CONF_AUTH_PROTOCOL, default=DEFAULT_AUTH_PROTOCOL): vol.In(MAP_AUTH_PROTOCOLS),
@@ -74,6 +74,7 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
         vol.Optional(CONF_DEFAULT_VALUE, default=DEFAULT_VALUE): cv.boolean,
         vol.Optional(CONF_DEVICE_CLASS): vol.In(DEVICE_CLASSES),
         vol.Optional(CONF_UNIT_OF_MEASUREMENT, default=DEFAULT_UNIT_OF_MEASUREMENT): cv.string,
+        vol.Optional(CONF_DEADBAND, default=DEFAULT_DEADBAND): vol.All(vol.Coerce(float), vol.Range(min=0)),
         vol.Optional(CONF_VALUE_TEMPLATE): cv.template,
         vol.Optional(CONF_ICON_TEMPLATE): cv.template,
     }
@@ -96,6 +97,7 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     default_value = config.get(CONF_DEFAULT_VALUE)
     device_class = config.get(CONF_DEVICE_CLASS)
     unit_of_measurement = config.get(CONF_UNIT_OF_MEASUREMENT)
+    deadband = config.get(CONF_DEADBAND)
     value_template = config.get(CONF_VALUE_TEMPLATE)
     icon_template = config.get(CONF_ICON_TEMPLATE)
 
@@ -104,45 +106,41 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     if icon_template is not None:
         icon_template.hass = hass
 
-    if version == '3':
-        auth = UsmUserData(username, authKey=auth_key or None, privKey=priv_key or None,
-                           authProtocol=getattr(hlapi, MAP_AUTH_PROTOCOLS[auth_protocol]), privProtocol=getattr(hlapi, MAP_PRIV_PROTOCOLS[priv_protocol])),
-    else:
-        auth = CommunityData(community, mpModel=MAP_VERSIONS[version])
-
-    auth = [SnmpEngine(), auth, UdpTransportTarget((host, port)), ContextData()]
+    client = get_client(hass, config)
     baseoid, start = baseoid.rsplit('.', 1)
     start = int(start)
 
     if io_num is not None and type(io_num) is int:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(baseoid)))
+        error = await client.async_check(baseoid)
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxSensor(
             name=f'{name}-AI-{str(io).zfill(2)}',
             baseoid=f'{baseoid}.{io}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             unit_of_measurement=unit_of_measurement,
+            deadband=deadband,
             value_template=value_template,
             icon_template=icon_template
         ) for io in range(start, start+io_num)]
     else:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(baseoid)))
+        error = await client.async_check(baseoid)
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxSensor(
             name=f'{name}-AI-{str(start).zfill(2)}',
             baseoid=f'{baseoid}.{start}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             unit_of_measurement=unit_of_measurement,
+            deadband=deadband,
             value_template=value_template,
             icon_template=icon_template
         )]
@@ -151,17 +149,22 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 
 
 class IoThinxSensor(Entity):
-    def __init__(self, name, baseoid, auth, default_value, device_class, unit_of_measurement, value_template, icon_template):
+    def __init__(self, name, baseoid, client, default_value, device_class, unit_of_measurement, deadband, value_template, icon_template):
         self._name = name
         self._baseoid = baseoid
-        self._auth = auth
+        self._client = client
         self._default_value = default_value
         self._device_class = device_class
         self._unit_of_measurement = unit_of_measurement
+        self._deadband = deadband
         self._value_template = value_template
         self._icon_template = icon_template
 
         self._value = default_value
+        self._raw = None
+        """Последнее принятое значение устройства, до применения шаблона"""
+        self._error = False
+        """Последнее значение - default_value из-за ошибки чтения"""
 
     @property
     def name(self) -> str:
@@ -183,23 +186,65 @@ class IoThinxSensor(Entity):
     def state(self) -> str:
         return self._value
 
-    async def async_update(self) -> None:
-        error, status, index, table = await getCmd(*self._auth, ObjectType(ObjectIdentity(self._baseoid)))
+    @property
+    def should_poll(self) -> bool:
+        return False
 
-        if error:
-            logger.error(f'SNMP error ({self._baseoid}): {error}')
-        elif status:
-            logger.error(f'SNMP error: {status.prettyPrint()} at {index and table[-1][int(index) - 1] or "?"}')
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(async_track_time_interval(self.hass, self._async_poll, SCAN_INTERVAL))
+        self.async_on_remove(self._client.async_listen(self._baseoid, self._async_pushed))
 
-        if error or status:
-            value = self._default_value
-        else:
-            for row in table:
-                value = str(row[-1])
+    async def _async_poll(self, now=None) -> None:
+        if await self._async_fetch():
+            self.async_write_ha_state()
 
-        if value is None:
+    async def async_update(self) -> None:
+        await self._async_fetch()
+
+    async def _async_fetch(self) -> bool:
+        """
+        Прочитать значение и вернуть True, если состояние сущности изменилось.
+        Шаблон применяется только к новому значению устройства.
+        """
+        try:
+            raw = str(await self._client.async_get(self._baseoid))
+        except IoThinxError as error:
+            logger.error(error)
+            return self._apply(self._default_value, error=True)
+        return self._apply(raw)
+
+    @callback
+    def _async_pushed(self, value) -> None:
+        if self._apply(str(value)):
+            self.async_write_ha_state()
+
+    def _apply(self, raw, error=False) -> bool:
+        """
+        Значение ошибки и первое значение после нее не проверяются зоной нечувствительности
+        и всегда записываются в состояние.
+        """
+        transition = error != self._error
+        self._error = error
+        if not transition and (raw == self._raw or self._in_deadband(raw)):
+            return False
+        self._raw = raw
+
+        if raw is None:
             value = STATE_UNKNOWN
         elif self._value_template is not None:
-            value = self._value_template.async_render_with_possible_json_value(value, STATE_UNKNOWN)
-
-        self._value = value
\ No newline at end of file
+            value = self._value_template.async_render_with_possible_json_value(raw, STATE_UNKNOWN)
+        else:
+            value = raw
+
+        if value == self._value and not transition:
+            return False
+        self._value = value
+        return True
+
+    def _in_deadband(self, raw) -> bool:
+        if not self._deadband or self._raw is None or raw is None:
+            return False
+        try:
+            return abs(float(raw) - float(self._raw)) < self._deadband
+        except (TypeError, ValueError):
+            return False
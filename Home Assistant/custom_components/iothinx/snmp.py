@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import pysnmp.hlapi.asyncio as hlapi
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pysnmp.hlapi.asyncio import (
+    CommunityData,
+    ContextData,
+    ObjectIdentity,
+    ObjectType,
+    SnmpEngine,
+    UdpTransportTarget,
+    UsmUserData,
+    getCmd,
+    setCmd,
+)
+
+from . import IoThinxError
+from .const import (
+    DOMAIN,
+    MAP_VERSIONS,
+    MAP_AUTH_PROTOCOLS,
+    MAP_PRIV_PROTOCOLS,
+    BATCH_WINDOW,
+    BATCH_MAX_VARBINDS,
+    VERIFY_DELAY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_snmp_client(hass, host, port, community, version, username=None, auth_key=None, priv_key=None,
+               auth_protocol='none', priv_protocol='none') -> 'IoThinxSnmpClient':
+    """
+    Общий SNMP клиент устройства. Все сущности одного устройства используют один клиент,
+    чтобы их запросы объединялись в общие PDU.
+    """
+    clients = hass.data.setdefault(DOMAIN, {}).setdefault('clients', {})
+    key = (host, int(port), version, community if version != '3' else username)
+    if key not in clients:
+        if version == '3':
+            auth = UsmUserData(username, authKey=auth_key or None, privKey=priv_key or None,
+                               authProtocol=getattr(hlapi, MAP_AUTH_PROTOCOLS[auth_protocol]),
+                               privProtocol=getattr(hlapi, MAP_PRIV_PROTOCOLS[priv_protocol]))
+        else:
+            auth = CommunityData(community, mpModel=MAP_VERSIONS[version])
+        clients[key] = IoThinxSnmpClient(hass, host, [SnmpEngine(), auth, UdpTransportTarget((host, port)), ContextData()])
+    return clients[key]
+
+
+class IoThinxSnmpClient:
+    def __init__(self, hass, host: str, auth: List[Any]) -> None:
+        self._hass = hass
+        self._host: str = host
+        self._auth: List[Any] = auth
+
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        """Ожидающие чтения, собираются в один GET запрос"""
+        self._verify: Dict[str, List[Callable[[Optional[Any]], None]]] = {}
+        """Проверочные чтения после записи, добавляются к ближайшему опросу"""
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._listeners: Dict[str, List[Callable[[Any], None]]] = {}
+        """Сущности, которые обновляются по SNMP уведомлениям"""
+
+    @property
+    def host(self) -> str:
+        return self._host
+
+    async def async_check(self, oid: str) -> Optional[str]:
+        error, _, _, _ = await getCmd(*self._auth, ObjectType(ObjectIdentity(oid)))
+        return error
+
+    async def async_get(self, oid: str) -> Any:
+        future = self._hass.loop.create_future()
+        self._pending.setdefault(oid, []).append(future)
+        self._schedule_flush(BATCH_WINDOW)
+        return await future
+
+    async def async_set(self, oid: str, value: Any) -> None:
+        await self.async_set_many([(oid, value)])
+
+    async def async_set_many(self, varbinds: List[Tuple[str, Any]]) -> None:
+        """
+        Записать несколько значений, по BATCH_MAX_VARBINDS в одном SET запросе.
+        """
+        for start in range(0, len(varbinds), BATCH_MAX_VARBINDS):
+            chunk = varbinds[start:start + BATCH_MAX_VARBINDS]
+            error, status, index, table = await setCmd(*self._auth, *[ObjectType(ObjectIdentity(oid), value) for oid, value in chunk])
+
+            if error:
+                raise IoThinxError(f'SNMP error ({", ".join(oid for oid, _ in chunk)}): {error}')
+            elif status:
+                raise IoThinxError(f'SNMP error: {status.prettyPrint()} at {index and table[-1][int(index) - 1] or "?"}')
+
+    def async_verify(self, oid: str, callback: Callable[[Optional[Any]], None]) -> None:
+        """
+        Запланировать проверочное чтение после записи.
+        Чтение выполняется вместе с ближайшим опросом устройства, но не позже VERIFY_DELAY.
+        В callback передается прочитанное значение или None при ошибке.
+        """
+        self._verify.setdefault(oid, []).append(callback)
+        self._schedule_flush(VERIFY_DELAY)
+
+    def async_listen(self, oid: str, callback: Callable[[Any], None]) -> Callable[[], None]:
+        """
+        Передавать в callback новые значения OID, полученные из уведомлений устройства.
+        Возвращает функцию отписки.
+        """
+        oid = oid.strip('.')
+        self._listeners.setdefault(oid, []).append(callback)
+        return lambda: self._listeners[oid].remove(callback)
+
+    async def async_trap(self, event) -> None:
+        """
+        Применить уведомление устройства.
+        Значения из уведомления передаются подписчикам сразу. Остальные OID той же строки таблицы
+        читаются одним пакетным запросом. Если уведомление не указывает на строку таблицы,
+        перечитываются все подписанные OID.
+        """
+        pushed = {'.'.join(map(str, varbind.oid)): varbind.value for varbind in event.varbinds}
+        rows = {self._row('.'.join(map(str, varbind.oid))) for varbind in event.varbinds if varbind.table is not None}
+
+        fetch = []
+        for oid, callbacks in self._listeners.items():
+            if oid in pushed:
+                for callback in list(callbacks):
+                    callback(pushed[oid])
+            elif not rows or self._row(oid) in rows:
+                fetch.append(oid)
+
+        async def fetch_task(oid):
+            try:
+                value = await self.async_get(oid)
+            except IoThinxError as error:
+                logger.error(error)
+                return
+            for callback in list(self._listeners.get(oid, [])):
+                callback(value)
+
+        await asyncio.gather(*[fetch_task(oid) for oid in fetch])
+
+    @staticmethod
+    def _row(oid: str) -> str:
+        """
+        Строка таблицы MIB: OID записи таблицы и индекс строки, без номера столбца.
+        """
+        entry, _, index = oid.rsplit('.', 2)
+        return f'{entry}.{index}'
+
+    def _schedule_flush(self, delay: float) -> None:
+        when = self._hass.loop.time() + delay
+        if self._flush_handle is not None:
+            if self._flush_handle.when() <= when:
+                return
+            self._flush_handle.cancel()
+        self._flush_handle = self._hass.loop.call_at(when, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        verify, self._verify = self._verify, {}
+        self._hass.async_create_task(self._async_fetch(pending, verify))
+
+    async def _async_fetch(self, pending: Dict[str, List[asyncio.Future]],
+                           verify: Dict[str, List[Callable[[Optional[Any]], None]]]) -> None:
+        oids = list(pending) + [oid for oid in verify if oid not in pending]
+
+        for start in range(0, len(oids), BATCH_MAX_VARBINDS):
+            chunk = oids[start:start + BATCH_MAX_VARBINDS]
+            values: Dict[str, Any] = {}
+            exception: Optional[IoThinxError] = None
+
+            try:
+                error, status, index, table = await getCmd(*self._auth, *[ObjectType(ObjectIdentity(oid)) for oid in chunk])
+            except Exception as e:
+                error, status, index, table = e, None, None, None
+
+            if error:
+                exception = IoThinxError(f'SNMP error ({", ".join(chunk)}): {error}')
+            elif status:
+                exception = IoThinxError(f'SNMP error: {status.prettyPrint()} at {index and table[-1][int(index) - 1] or "?"}')
+            else:
+                for oid, row in zip(chunk, table):
+                    values[oid] = row[-1]
+
+            for oid in chunk:
+                for future in pending.get(oid, []):
+                    if future.done():
+                        continue
+                    if exception is not None:
+                        future.set_exception(exception)
+                    else:
+                        future.set_result(values[oid])
+                for callback in verify.get(oid, []):
+                    try:
+                        callback(values.get(oid))
+                    except Exception:
+                        logger.exception(f'Verify callback failed ({oid})')
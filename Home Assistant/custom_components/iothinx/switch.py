@@ -1,29 +1,20 @@
 import logging
 import voluptuous as vol
-import pysnmp.hlapi.asyncio as hlapi
 import homeassistant.helpers.config_validation as cv
 
 from datetime import timedelta
+from functools import partial
 
+from homeassistant.core import callback
 from homeassistant.components.switch import SwitchEntity, DEVICE_CLASSES, PLATFORM_SCHEMA
 from pysnmp.proto.rfc1902 import Integer
-from pysnmp.hlapi.asyncio import (
-    CommunityData,
-    ContextData,
-    ObjectIdentity,
-    ObjectType,
-    SnmpEngine,
-    UdpTransportTarget,
-    UsmUserData,
-    getCmd,
-    setCmd,
-)
 
 from homeassistant.const import (
     CONF_NAME,
     CONF_HOST,
     CONF_PORT,
     CONF_USERNAME,
+    CONF_PASSWORD,
     CONF_ICON_TEMPLATE,
     CONF_DEVICE_CLASS,
     CONF_PAYLOAD_ON,
@@ -33,6 +24,7 @@ from homeassistant.const import (
 from .const import (
     DOMAIN,
     CONF_BASEOID,
+    CONF_BACKEND,
     CONF_IO_NUM,
     CONF_DEFAULT_VALUE,
     CONF_COMMUNITY,
@@ -42,6 +34,7 @@ from .const import (
     CONF_PRIV_KEY,
     CONF_PRIV_PROTOCOL,
     DEFAULT_NAME,
+    DEFAULT_BACKEND,
     DEFAULT_HOST,
     DEFAULT_PORT,
     DEFAULT_COMMUNITY,
@@ -53,8 +46,10 @@ from .const import (
     DEFAULT_PAYLOAD_OFF,
     MAP_VERSIONS,
     MAP_AUTH_PROTOCOLS,
-    MAP_PRIV_PROTOCOLS
+    MAP_PRIV_PROTOCOLS,
+    BACKENDS,
 )
+from . import IoThinxError, get_client
 
 logger = logging.getLogger(__name__)
 
@@ -63,12 +58,14 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Required(CONF_BASEOID): cv.string,
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+        vol.Optional(CONF_BACKEND, default=DEFAULT_BACKEND): vol.In(BACKENDS),
         vol.Optional(CONF_HOST, default=DEFAULT_HOST): cv.string,
         vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
         vol.Optional(CONF_IO_NUM): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
         vol.Optional(CONF_COMMUNITY, default=DEFAULT_COMMUNITY): cv.string,
         vol.Optional(CONF_VERSION, default=DEFAULT_VERSION): vol.In(MAP_VERSIONS),
         vol.Optional(CONF_USERNAME): cv.string,
+        vol.Optional(CONF_PASSWORD): cv.string,
         vol.Optional(CONF_AUTH_KEY): cv.string,
         vol.Optional(CONF_PRIV_KEY): cv.string,
         vol.Optional(CONF_AUTH_PROTOCOL, default=DEFAULT_AUTH_PROTOCOL): vol.In(MAP_AUTH_PROTOCOLS),
@@ -104,26 +101,20 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     if icon_template is not None:
         icon_template.hass = hass
 
-    if version == '3':
-        auth = UsmUserData(username, authKey=auth_key or None, privKey=priv_key or None,
-                           authProtocol=getattr(hlapi, MAP_AUTH_PROTOCOLS[auth_protocol]), privProtocol=getattr(hlapi, MAP_PRIV_PROTOCOLS[priv_protocol])),
-    else:
-        auth = CommunityData(community, mpModel=MAP_VERSIONS[version])
-
-    auth = [SnmpEngine(), auth, UdpTransportTarget((host, port)), ContextData()]
+    client = get_client(hass, config)
     baseoid, start = baseoid.rsplit('.', 1)
     start = int(start)
 
     if io_num is not None and type(io_num) is int:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(baseoid)))
+        error = await client.async_check(baseoid)
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxSwithc(
             name=f'{name}-DO-{str(io).zfill(2)}',
             baseoid=f'{baseoid}.{io}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             payload_on=payload_on,
@@ -131,15 +122,15 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
             icon_template=icon_template
         ) for io in range(start, start+io_num)]
     else:
-        error, _, _, _ = await getCmd(*auth, ObjectType(ObjectIdentity(baseoid)))
+        error = await client.async_check(baseoid)
         if error is not None:
-            logger.error(f'SNMP error: {error}')
+            logger.error(f'{DOMAIN} error: {error}')
             return
 
         sensors = [IoThinxSwithc(
             name=f'{name}-DO-{str(start).zfill(2)}',
             baseoid=f'{baseoid}.{start}',
-            auth=auth,
+            client=client,
             default_value=default_value,
             device_class=device_class,
             payload_on=payload_on,
@@ -151,10 +142,10 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 
 
 class IoThinxSwithc(SwitchEntity):
-    def __init__(self, name, baseoid, auth, default_value, device_class, payload_on, payload_off, icon_template):
+    def __init__(self, name, baseoid, client, default_value, device_class, payload_on, payload_off, icon_template):
         self._name = name
         self._baseoid = baseoid
-        self._auth = auth
+        self._client = client
         self._default_value = default_value
         self._device_class = device_class
         self._payload_on = payload_on
@@ -162,6 +153,8 @@ class IoThinxSwithc(SwitchEntity):
         self._icon_template = icon_template
 
         self._value = default_value
+        self._writing = None
+        """Значение, записанное на устройство и ожидающее проверки"""
 
     @property
     def name(self) -> str:
@@ -184,33 +177,74 @@ class IoThinxSwithc(SwitchEntity):
         return self._value
 
     async def async_turn_on(self, **kwargs):
-        await self._set_value(Integer(self._payload_on))
+        await self._set_value(True)
 
     async def async_turn_off(self, **kwargs):
-        await self._set_value(Integer(self._payload_off))
+        await self._set_value(False)
 
-    async def async_update(self):
-        error, status, index, table = await getCmd(*self._auth, ObjectType(ObjectIdentity(self._baseoid)))
+    async def async_added_to_hass(self):
+        self.async_on_remove(self._client.async_listen(self._baseoid, self._async_pushed))
 
-        if error:
-            logger.error(f'SNMP error ({self._baseoid}): {error}')
-        elif status:
-            logger.error(f'SNMP error: {status.prettyPrint()} at {index and table[-1][int(index) - 1] or "?"}')
+    async def async_update(self):
+        if self._writing is not None:
+            return
 
-        if error or status:
+        try:
+            value = await self._client.async_get(self._baseoid)
+        except IoThinxError as error:
+            logger.error(error)
             self._value = self._default_value
         else:
-            for row in table:
-                if row[-1] == self._payload_on:
-                    self._value = True
-                elif row[-1] == Integer(self._payload_on):
-                    self._value = True
-                elif row[-1] == self._payload_off:
-                    self._value = False
-                elif row[-1] == Integer(self._payload_off):
-                    self._value = False
-                else:
-                    self._value = None
-
-    async def _set_value(self, value):
-        await setCmd(*self._auth, ObjectType(ObjectIdentity(self._baseoid), value))
\ No newline at end of file
+            self._value = self._parse(value)
+
+    @callback
+    def _async_pushed(self, value):
+        if self._writing is not None:
+            return
+
+        value = self._parse(value)
+        if value != self._value:
+            self._value = value
+            self.async_write_ha_state()
+
+    def _parse(self, value):
+        if value == self._payload_on or value == Integer(self._payload_on):
+            return True
+        elif value == self._payload_off or value == Integer(self._payload_off):
+            return False
+        else:
+            return None
+
+    async def _set_value(self, state):
+        if self._writing is state:
+            return
+
+        previous = self._value
+        self._writing = state
+        self._value = state
+        self.async_write_ha_state()
+
+        try:
+            await self._client.async_set(self._baseoid, Integer(self._payload_on if state else self._payload_off))
+        except IoThinxError as error:
+            logger.error(error)
+            if self._writing is state:
+                self._writing = None
+                self._value = previous
+                self.async_write_ha_state()
+        else:
+            self._client.async_verify(self._baseoid, partial(self._async_verified, state))
+
+    @callback
+    def _async_verified(self, written, value):
+        if self._writing is not written:
+            return
+        self._writing = None
+        if value is None:
+            return
+
+        value = self._parse(value)
+        if value != written:
+            logger.warning(f'{self._name}: write not confirmed, device reports {value}')
+            self._value = value
+            self.async_write_ha_state()
@@ -0,0 +1,114 @@
+"""
+Проверка пределов AI парка стоек: AlarmEngine (один векторный проход) и обработчик на каждый канал.
+
+    python -m benchmarks.alarm_engine --racks 1250 --channels 20 --cycles 50
+"""
+import math
+import random
+import argparse
+
+from time import perf_counter
+from typing import Callable, List
+
+from iolib.alarms import AlarmEngine, HIGH, LOW
+from iolib.stream import Snapshot, ModuleSnapshot, ChannelSnapshot
+
+
+def fleet(racks: int, channels: int, cycle: int) -> List[Snapshot]:
+    """
+    Каналы медленно колеблются со случайной фазой и шумом, часть из них выходит за пределы 20..80.
+    """
+    generator = random.Random(cycle)
+    return [Snapshot(f'http://10.{number // 250}.0.{number % 250}', cycle, float(cycle), 0.0, [
+        ModuleSnapshot(slot, 3, '', [ChannelSnapshot('ai', no, '', 50.0 + 35.0 * math.sin(cycle / 8 + number + slot * 4 + no)
+                                                     + generator.gauss(0, 1)) for no in range(4)])
+        for slot in range(1, channels // 4 + 1)]) for number in range(racks)]
+
+
+def callbacks(racks: int, channels: int) -> Callable[[Snapshot, float], int]:
+    limits = {}
+    for number in range(racks):
+        for slot in range(1, channels // 4 + 1):
+            for no in range(4):
+                limits[(f'http://10.{number // 250}.0.{number % 250}', slot, no)] = [80.0, 20.0, 2.0, 5.0, False, False,
+                                                                                    None, None]
+
+    def check(snapshot: Snapshot, now: float) -> int:
+        events = 0
+        for module in snapshot.modules:
+            for channel in module.channels:
+                high, low, deadband, delay, high_active, low_active, high_since, low_since = \
+                    state = limits[(snapshot.host, module.slot, channel.no)]
+                value = channel.value
+                if not high_active:
+                    if value > high:
+                        state[6] = high_since = now if high_since is None else high_since
+                        if now - high_since >= delay:
+                            state[4], state[6] = True, None
+                            events += 1
+                    else:
+                        state[6] = None
+                elif value < high - deadband:
+                    state[4] = False
+                    events += 1
+                if not low_active:
+                    if value < low:
+                        state[7] = low_since = now if low_since is None else low_since
+                        if now - low_since >= delay:
+                            state[5], state[7] = True, None
+                            events += 1
+                    else:
+                        state[7] = None
+                elif value > low + deadband:
+                    state[5] = False
+                    events += 1
+        return events
+    return check
+
+
+def run(racks: int, channels: int, cycles: int) -> None:
+    engine = AlarmEngine()
+    for number in range(racks):
+        for slot in range(1, channels // 4 + 1):
+            for no in range(4):
+                host = f'http://10.{number // 250}.0.{number % 250}'
+                engine.add(host, slot, no, HIGH, 80.0, deadband=2.0, delay=5.0)
+                engine.add(host, slot, no, LOW, 20.0, deadband=2.0, delay=5.0)
+    check = callbacks(racks, channels)
+    print(f'{racks} racks, {racks * channels} AI channels, {engine._count} limits')
+
+    loading = evaluating = calling = 0.0
+    events = callback_events = 0
+    for cycle in range(cycles):
+        snapshots = fleet(racks, channels, cycle)
+        started = perf_counter()
+        for snapshot in snapshots:
+            engine.load(snapshot)
+        loaded = perf_counter()
+        events += len(engine.evaluate(float(cycle)))
+        evaluated = perf_counter()
+        for snapshot in snapshots:
+            callback_events += check(snapshot, float(cycle))
+        called = perf_counter()
+        if cycle:
+            loading += loaded - started
+            evaluating += evaluated - loaded
+            calling += called - evaluated
+
+    cycles -= 1
+    print(f'  engine    : evaluate {evaluating / cycles * 1000:6.2f} ms, load snapshots {loading / cycles * 1000:6.2f} ms'
+          f' per refresh, {events} transitions')
+    print(f'  callbacks : {calling / cycles * 1000:6.2f} ms per refresh, {callback_events} transitions')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Fleet-wide analog limit evaluation')
+    parser.add_argument('--racks', type=int, default=1250)
+    parser.add_argument('--channels', type=int, default=20, help='AI channels per rack, multiple of 4')
+    parser.add_argument('--cycles', type=int, default=20)
+    args = parser.parse_args()
+    run(args.racks, args.channels, args.cycles)
+
+
+if __name__ == '__main__':
+    main()
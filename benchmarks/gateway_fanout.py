@@ -0,0 +1,129 @@
+"""
+Нагрузка на стойки при многих клиентах: каждый клиент опрашивает стойку сам или все клиенты подключены к iolib.gateway.
+Стойки имитируются simulator.web_api, нагрузка - число запросов, принятых имитаторами.
+
+    python -m benchmarks.gateway_fanout --racks 5 --clients 50 --duration 10
+"""
+import asyncio
+import argparse
+
+from typing import List, Tuple
+
+import aiohttp
+
+from iolib.gateway import Gateway
+from iolib.moxa_io import Device
+from simulator.rack import SimRack
+from simulator.web_api import WebApiServer
+
+LAYOUT = ['45MR-1600', '45MR-2600', '45MR-3810', '45MR-4420']
+
+
+async def servers(racks: int, port: int) -> List[WebApiServer]:
+    """
+    Имитаторы стоек, значения AI меняются каждые 0.1 с.
+    """
+    started = []
+    for number in range(racks):
+        server = WebApiServer(SimRack(LAYOUT, name=f'ioThinx-SIM-{number:03}', seed=number), port=port + number,
+                              key_bits=512)
+        await server.start()
+        server.simulation = asyncio.ensure_future(server.rack.run(0.1))
+        started.append(server)
+    return started
+
+
+async def direct(racks: List[WebApiServer], clients: int, duration: float, interval: float) -> Tuple[int, int]:
+    devices = [Device('127.0.0.1', server.port, 'admin', 'moxa') for _ in range(clients) for server in racks]
+    await asyncio.gather(*[device.connect() for device in devices])
+    before = sum(server.requests for server in racks)
+    snapshots = 0
+
+    async def client(device: Device) -> None:
+        nonlocal snapshots
+        subscription = device.stream(interval)
+        async for _ in subscription:
+            snapshots += 1
+
+    running = [asyncio.ensure_future(client(device)) for device in devices]
+    await asyncio.sleep(duration)
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+    requests = sum(server.requests for server in racks) - before
+    for device in devices:
+        await device.close()
+    return requests, snapshots
+
+
+async def gateway(racks: List[WebApiServer], clients: int, duration: float, interval: float, port: int) -> Tuple[int, int]:
+    devices = [Device('127.0.0.1', server.port, 'admin', 'moxa') for server in racks]
+    await asyncio.gather(*[device.connect() for device in devices])
+    service = Gateway('127.0.0.1', port, interval)
+    names = [service.add(device, str(server.port)) for device, server in zip(devices, racks)]
+    await service.start()
+    before = sum(server.requests for server in racks)
+    messages = 0
+
+    async def subscriber(session: aiohttp.ClientSession, name: str) -> None:
+        nonlocal messages
+        async with session.ws_connect(f'http://127.0.0.1:{port}/devices/{name}/ws') as socket:
+            async for _ in socket:
+                messages += 1
+
+    async def poller(session: aiohttp.ClientSession, name: str) -> None:
+        nonlocal messages
+        etag = None
+        while True:
+            async with session.get(f'http://127.0.0.1:{port}/devices/{name}',
+                                   headers={'If-None-Match': etag} if etag else {}) as response:
+                if response.status == 200:
+                    etag = response.headers['ETag']
+                    await response.read()
+                    messages += 1
+            await asyncio.sleep(interval / 4)
+
+    async with aiohttp.ClientSession() as session:
+        running = [asyncio.ensure_future((subscriber if number % 2 else poller)(session, name))
+                   for number in range(clients) for name in names]
+        await asyncio.sleep(duration)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+    requests = sum(server.requests for server in racks) - before
+    print(f'    gateway: {service.requests} client requests, {service.not_modified} not modified, '
+          f'{service.messages} WebSocket messages')
+    await service.stop()
+    for device in devices:
+        await device.close()
+    return requests, messages
+
+
+async def run(racks: int, clients: int, duration: float, interval: float, port: int) -> None:
+    started = await servers(racks, port)
+    print(f'{racks} racks, {clients} clients per rack, poll interval {interval} s, {duration:.0f} s')
+    try:
+        for name, result in (('direct ', await direct(started, clients, duration, interval)),
+                             ('gateway', await gateway(started, clients, duration, interval, port + racks))):
+            requests, updates = result
+            print(f'  {name}: {requests / duration / racks:7.1f} device requests/s per rack, '
+                  f'{updates / duration:7.0f} client updates/s')
+    finally:
+        for server in started:
+            server.simulation.cancel()
+            await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Gateway fan-out vs direct polling')
+    parser.add_argument('--racks', type=int, default=5)
+    parser.add_argument('--clients', type=int, default=20, help='clients per rack')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=0.5)
+    parser.add_argument('--port', type=int, default=18300)
+    args = parser.parse_args()
+    asyncio.run(run(args.racks, args.clients, args.duration, args.interval, args.port))
+
+
+if __name__ == '__main__':
+    main()
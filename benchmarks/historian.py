@@ -0,0 +1,97 @@
+"""
+Запись всех каналов парка стоек раз в секунду в Historian и запросы HistorianReader,
+для сравнения - размер тех же записей строками JSON.
+
+    python -m benchmarks.historian --racks 500 --seconds 60
+"""
+import os
+import json
+import shutil
+import argparse
+import tempfile
+
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from iolib.historian import Historian, HistorianReader, KINDS
+from iolib.stream import Snapshot, ModuleSnapshot, ChannelSnapshot
+
+from simulator.rack import SimRack
+
+
+def templates(racks: int, layout: Optional[List[str]]) -> List[List[Tuple[int, int, List[Tuple[str, int]]]]]:
+    return [[(module.slot, module.type.value, [(channel.kind, channel.no) for channel in module.channels
+                                                  if channel.kind in KINDS])
+             for module in SimRack(layout, seed=number).modules] for number in range(racks)]
+
+
+def snapshots(racks: list, second: int, start: float) -> List[Snapshot]:
+    result = []
+    for number, modules in enumerate(racks):
+        result.append(Snapshot(f'http://10.0.{number // 250}.{number % 250}', second, start + second, 0.0, [
+            ModuleSnapshot(slot, type, '', [
+                ChannelSnapshot(kind, no, '', float((second + number + no) % 100) if kind in ('ai', 'ao')
+                                else (second // 10 + no) % 2 == 0, 0 if kind in ('di', 'do') else None)
+                for kind, no in channels])
+            for slot, type, channels in modules]))
+    return result
+
+
+def run(racks: int, seconds: int, layout: Optional[List[str]], path: str, changes_only: bool) -> None:
+    start = 1_700_000_000.0
+    fleet = templates(racks, layout)
+    historian = Historian(path, segment_duration=600.0, changes_only=changes_only)
+    writing = 0.0
+    json_bytes = 0
+    for second in range(seconds):
+        batch = snapshots(fleet, second, start)
+        if second == 0:
+            json_bytes = sum(len(json.dumps({'host': snapshot.host, 'slot': module.slot, 'kind': channel.kind,
+                                             'no': channel.no, 'time': snapshot.time, 'value': channel.value,
+                                             'status': channel.status})) + 1
+                             for snapshot in batch for module in snapshot.modules for channel in module.channels)
+        started = perf_counter()
+        for snapshot in batch:
+            historian.append(snapshot)
+        writing += perf_counter() - started
+    historian.close()
+
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    channels = sum(len(channels) for modules in fleet for _, _, channels in modules)
+    print(f'{racks} racks, {channels // racks} channels each, {seconds} s, changes only: {changes_only}')
+    print(f'  write : {historian.records / writing:9.0f} records/s, {writing / seconds * 1000:6.1f} ms per second of data'
+          f' ({writing / seconds * 100:.1f}% of real time)')
+    print(f'  size  : {size / max(historian.records, 1):5.1f} bytes/record on disk, {size / 1e6:.1f} MB total, '
+          f'JSON rows would take {json_bytes * seconds / 1e6:.1f} MB')
+
+    reader = HistorianReader(path)
+    host = reader.devices()[racks // 2]
+    started = perf_counter()
+    samples = list(reader.range(host, start + seconds * 0.25, start + seconds * 0.75, slot=1))
+    print(f'  range : {len(samples)} samples of one module over {seconds // 2} s in {(perf_counter() - started) * 1000:.1f} ms')
+    started = perf_counter()
+    for _ in range(100):
+        reader.last(host, 1, samples[0].kind, samples[0].no)
+    print(f'  last  : {(perf_counter() - started) * 10:.2f} ms per channel')
+    started = perf_counter()
+    values = reader.last_values(host)
+    print(f'  rack  : {len(values)} last values in {(perf_counter() - started) * 1000:.1f} ms')
+    reader.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Historian write and query throughput')
+    parser.add_argument('--racks', type=int, default=500)
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    parser.add_argument('--changes-only', action='store_true')
+    args = parser.parse_args()
+    path = tempfile.mkdtemp(prefix='iolib-historian-')
+    try:
+        run(args.racks, args.seconds, args.layout.split(',') if args.layout else None, path, args.changes_only)
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
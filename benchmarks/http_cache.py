@@ -0,0 +1,60 @@
+"""
+Нагрузка на Web API при обновлении Device с кэшем ответов и без него.
+Несколько потребителей вызывают update() одновременно, как сущности Home Assistant одной стойки.
+
+    python -m benchmarks.http_cache --racks 5 --cycles 20 --consumers 8
+"""
+import asyncio
+import argparse
+
+from time import monotonic
+from typing import List
+
+from iolib.moxa_io import Device
+
+from simulator.rack import SimRack
+from simulator.web_api import WebApiServer
+
+
+async def run(racks: int, port: int, cycles: int, consumers: int, latency: float, layout: List[str]) -> None:
+    servers = [WebApiServer(SimRack(layout, seed=number), port=port + number, latency=latency) for number in range(racks)]
+    for server in servers:
+        await server.start()
+
+    for name, tiers in (('no cache', []), ('cache', None)):
+        devices = [Device('127.0.0.1', server.port, 'admin', 'moxa', cache_tiers=tiers) for server in servers]
+        await asyncio.gather(*[device.connect() for device in devices])
+        for device in devices:
+            device._update_time = 0
+
+        for server in servers:
+            server.requests = 0
+        started = monotonic()
+        for _ in range(cycles):
+            await asyncio.gather(*[device.update() if tiers is None else device._update()
+                                   for device in devices for _ in range(consumers)])
+        elapsed = (monotonic() - started) / cycles
+        requests = sum(server.requests for server in servers)
+        print(f'{name:>8}: {requests / cycles / racks:.1f} requests per rack per cycle, {elapsed * 1000:.1f} ms per cycle')
+        for device in devices:
+            await device.close()
+
+    for server in servers:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Web API load with and without the response cache')
+    parser.add_argument('--racks', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--consumers', type=int, default=8, help='concurrent update() callers per rack')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    args = parser.parse_args()
+    layout = args.layout.split(',') if args.layout else None
+    asyncio.run(run(args.racks, args.port, args.cycles, args.consumers, args.latency, layout))
+
+
+if __name__ == '__main__':
+    main()
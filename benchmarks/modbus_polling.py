@@ -0,0 +1,72 @@
+"""
+Сравнение обновления Device по Web API и по Modbus TCP на наборе локальных стоек.
+
+    python -m benchmarks.modbus_polling --racks 10 --cycles 20 --latency 0.002
+"""
+import asyncio
+import argparse
+
+from time import monotonic
+from typing import List
+
+from iolib.moxa_io import Device
+
+from simulator.rack import SimRack
+from simulator.web_api import WebApiServer
+from simulator.modbus_server import ModbusServer
+
+
+async def cycle(devices: List[Device], count: int) -> float:
+    started = monotonic()
+    for _ in range(count):
+        await asyncio.gather(*[device._update() for device in devices])
+    return (monotonic() - started) / count
+
+
+async def run(racks: int, http_port: int, modbus_port: int, cycles: int, latency: float, layout: List[str]) -> None:
+    web_servers = []
+    modbus_servers = []
+    devices = []
+    for number in range(racks):
+        rack = SimRack(layout, name=f'ioThinx-SIM-{number:03}', seed=number)
+        web_servers.append(WebApiServer(rack, port=http_port + number, latency=latency))
+        modbus_servers.append(ModbusServer(rack, port=modbus_port + number, latency=latency))
+        devices.append(Device('127.0.0.1', http_port + number, 'admin', 'moxa'))
+
+    for server in web_servers + modbus_servers:
+        await server.start()
+    await asyncio.gather(*[device.connect() for device in devices])
+
+    for server in web_servers:
+        server.requests = 0
+    elapsed = await cycle(devices, cycles)
+    requests = sum(server.requests for server in web_servers)
+    print(f'{"http":>7}: {requests} requests, {elapsed * 1000:.1f} ms per cycle')
+
+    for device, server in zip(devices, modbus_servers):
+        device.use_modbus(port=server.port)
+    elapsed = await cycle(devices, cycles)
+    requests = sum(server.requests for server in modbus_servers)
+    print(f'{"modbus":>7}: {requests} requests, {elapsed * 1000:.1f} ms per cycle')
+
+    for device in devices:
+        await device.close()
+    for server in web_servers + modbus_servers:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Device update over web API vs Modbus TCP')
+    parser.add_argument('--racks', type=int, default=10)
+    parser.add_argument('--http-port', type=int, default=8080)
+    parser.add_argument('--modbus-port', type=int, default=5020)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    args = parser.parse_args()
+    layout = args.layout.split(',') if args.layout else None
+    asyncio.run(run(args.racks, args.http_port, args.modbus_port, args.cycles, args.latency, layout))
+
+
+if __name__ == '__main__':
+    main()
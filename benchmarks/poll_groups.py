@@ -0,0 +1,62 @@
+"""
+Число запросов Web API за одно и то же время при опросе всех слотов с периодом 100 мс
+и при опросе группами (iolib.poll).
+
+    python -m benchmarks.poll_groups --duration 5
+"""
+import asyncio
+import argparse
+
+from time import monotonic
+from typing import List
+
+from iolib.moxa_io import Device
+
+from simulator.rack import SimRack
+from simulator.web_api import WebApiServer
+
+LAYOUT = ['45MR-1600', '45MR-2600', '45MR-3810', '45MR-4420', '45MR-6600', '45MR-6810']
+
+
+async def uniform(device: Device, duration: float, interval: float) -> None:
+    end = monotonic() + duration
+    while monotonic() < end:
+        await device._update()
+        await asyncio.sleep(interval)
+
+
+async def grouped(device: Device, duration: float) -> None:
+    task = device.poller.start()
+    await asyncio.sleep(duration)
+    device.poller.stop()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def run(port: int, duration: float, interval: float, layout: List[str]) -> None:
+    server = WebApiServer(SimRack(layout), port=port)
+    await server.start()
+    device = Device('127.0.0.1', port, 'admin', 'moxa')
+    await device.connect()
+
+    for name, job in (('uniform', uniform(device, duration, interval)), ('groups', grouped(device, duration))):
+        server.requests = 0
+        await job
+        print(f'{name:>8}: {server.requests / duration:.1f} requests/s')
+
+    await device.close()
+    await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Uniform polling vs poll groups')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--interval', type=float, default=0.1, help='uniform polling period, seconds')
+    parser.add_argument('--layout', default=None, help='comma separated module types')
+    args = parser.parse_args()
+    layout = args.layout.split(',') if args.layout else LAYOUT
+    asyncio.run(run(args.port, args.duration, args.interval, layout))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Одновременные чтения и записи к стойке с ограниченным буфером запросов с AIMD ограничением и без него.
+Без ограничения часть запросов отклоняется устройством (503), с ограничением предел подстраивается под емкость.
+
+    python -m benchmarks.request_limiter --capacity 6 --consumers 24 --duration 5
+"""
+import asyncio
+import argparse
+
+from time import monotonic
+from typing import List
+
+from iolib.limiter import AimdLimiter
+from iolib.moxa_io import Device
+
+from simulator.rack import SimRack
+from simulator.web_api import WebApiServer
+
+
+async def load(device: Device, duration: float, write: bool) -> List[float]:
+    """
+    Задержки успешных операций одного потребителя.
+    """
+    latencies = []
+    stop = monotonic() + duration
+    while monotonic() < stop:
+        started = monotonic()
+        try:
+            if write:
+                await device[1].ios[0].set_status(not device[1].ios[0].status)
+            else:
+                await device.update_module(device[0])
+        except Exception:
+            continue
+        latencies.append(monotonic() - started)
+    return latencies
+
+
+async def run(port: int, capacity: int, consumers: int, duration: float, latency: float) -> None:
+    server = WebApiServer(SimRack(['45MR-1600', '45MR-2600']), port=port, latency=latency, capacity=capacity)
+    await server.start()
+
+    for name, limiter in (('unlimited', AimdLimiter(initial=64, minimum=64, maximum=64)), ('aimd', AimdLimiter())):
+        device = Device('127.0.0.1', port, 'admin', 'moxa', cache_tiers=[], limiter=limiter)
+        await device.connect()
+        server.requests = server.rejected = 0
+
+        results = await asyncio.gather(*[load(device, duration, number % 8 == 0) for number in range(consumers)])
+        reads = sorted(latency for number, result in enumerate(results) if number % 8 for latency in result)
+        writes = sorted(latency for number, result in enumerate(results) if not number % 8 for latency in result)
+        ok = server.requests - server.rejected
+        print(f'{name:>9}: {ok / duration:6.1f} ok/s, {server.rejected / duration:6.1f} rejected/s, limit {limiter.limit}, '
+              f'read p50 {reads[len(reads) // 2] * 1000:.1f} ms, write p50 {writes[len(writes) // 2] * 1000:.1f} ms')
+        await device.close()
+
+    await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Web API load with and without the AIMD request limiter')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--capacity', type=int, default=6, help='concurrent requests the simulated device accepts')
+    parser.add_argument('--consumers', type=int, default=24)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(run(args.port, args.capacity, args.consumers, args.duration, args.latency))
+
+
+if __name__ == '__main__':
+    main()
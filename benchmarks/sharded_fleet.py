@@ -0,0 +1,83 @@
+"""
+Пропускная способность опроса парка стоек в одном процессе и в ShardedPoller с разным числом процессов.
+Имитаторы стоек работают в отдельном процессе, чтобы не делить процессор с опросом.
+
+    python -m benchmarks.sharded_fleet --racks 200 --workers 1,2,4 --duration 10
+"""
+import asyncio
+import argparse
+import multiprocessing
+
+from time import monotonic
+from typing import List, Optional
+
+from iolib.moxa_io import Device
+from iolib.shard import ShardedPoller
+
+from simulator.web_api import run_servers
+
+
+def _servers(racks: int, port: int, layout: Optional[List[str]]) -> None:
+    asyncio.run(run_servers(racks, port, layout, interval=0.5))
+
+
+async def single(racks: int, port: int, duration: float) -> float:
+    devices = [Device('127.0.0.1', port + number, 'admin', 'moxa', cache_tiers=[]) for number in range(racks)]
+    await asyncio.gather(*[device.connect() for device in devices])
+    refreshes = 0
+
+    async def poll(device: Device, stop: float) -> None:
+        nonlocal refreshes
+        while monotonic() < stop:
+            await device._update()
+            refreshes += 1
+
+    stop = monotonic() + duration
+    await asyncio.gather(*[poll(device, stop) for device in devices])
+    for device in devices:
+        await device.close()
+    return refreshes / duration
+
+
+async def sharded(racks: int, port: int, duration: float, workers: int) -> float:
+    poller = ShardedPoller(workers=workers, interval=0.0, rebalance_interval=2.0)
+    for number in range(racks):
+        poller.add('127.0.0.1', port + number, 'admin', 'moxa', cache_tiers=[])
+    poller.start()
+
+    await asyncio.sleep(3.0)
+    updates = poller.updates
+    await asyncio.sleep(duration)
+    refreshes = (poller.updates - updates) / duration
+    await poller.stop()
+    return refreshes
+
+
+async def run(racks: int, port: int, duration: float, workers: List[int]) -> None:
+    print(f'{"single loop":>12}: {await single(racks, port, duration):7.1f} refreshes/s')
+    for count in workers:
+        rate = await sharded(racks, port, duration, count)
+        print(f'{count:>3} workers : {rate:7.1f} refreshes/s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Fleet polling throughput with a sharded multi-process poller')
+    parser.add_argument('--racks', type=int, default=200)
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts')
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    args = parser.parse_args()
+    layout = args.layout.split(',') if args.layout else None
+
+    servers = multiprocessing.get_context('spawn').Process(target=_servers, args=(args.racks, args.port, layout), daemon=True)
+    servers.start()
+    try:
+        asyncio.run(asyncio.sleep(2.0 + args.racks * 0.02))
+        asyncio.run(run(args.racks, args.port, args.duration, [int(count) for count in args.workers.split(',')]))
+    finally:
+        servers.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Локальные потребители читают снимки из общей памяти, опрос стоек один независимо от числа потребителей.
+Каждый потребитель - отдельный процесс, читает снимки всех стоек в цикле.
+
+    python -m benchmarks.shared_snapshot --racks 10 --consumers 1,4 --duration 5
+"""
+import os
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+from time import monotonic, perf_counter
+from typing import List
+
+from iolib.moxa_io import Device
+from iolib.shared import SnapshotPublisher, SnapshotReader
+
+from simulator.rack import SimRack
+from simulator.web_api import WebApiServer
+
+
+def consume(path: str, duration: float, results) -> None:
+    reader = SnapshotReader(path)
+    devices = reader.count
+    reads = 0
+    values = 0
+    latencies = []
+    stop = monotonic() + duration
+    while monotonic() < stop:
+        started = perf_counter()
+        for index in range(devices):
+            reader.read(index)
+        latencies.append((perf_counter() - started) / devices)
+        reads += devices
+        for index in range(devices):
+            reader.value(index, 1, 'di', 0)
+        values += devices
+    latencies.sort()
+    results.put((reads / duration, values * 2 / duration, latencies[len(latencies) // 2], reader.torn))
+    reader.close()
+
+
+async def run(racks: int, port: int, consumers: List[int], duration: float, interval: float) -> None:
+    servers = [WebApiServer(SimRack(seed=number), port=port + number) for number in range(racks)]
+    for server in servers:
+        await server.start()
+    devices = [Device('127.0.0.1', port + number, 'admin', 'moxa') for number in range(racks)]
+    await asyncio.gather(*[device.connect() for device in devices])
+
+    path = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f'iolib-bench-{os.getpid()}')
+    publisher = SnapshotPublisher(path, devices=racks)
+    tasks = [asyncio.ensure_future(publisher.follow(device, interval)) for device in devices]
+    while publisher.published < racks:
+        await asyncio.sleep(0.1)
+
+    context = multiprocessing.get_context('spawn')
+    for count in consumers:
+        results = context.Queue()
+        processes = [context.Process(target=consume, args=(path, duration, results)) for _ in range(count)]
+        requests = sum(server.requests for server in servers)
+        started = monotonic()
+        for process in processes:
+            process.start()
+        stats = [await asyncio.get_running_loop().run_in_executor(None, results.get) for _ in processes]
+        for process in processes:
+            process.join()
+        rate = (sum(server.requests for server in servers) - requests) / (monotonic() - started)
+        reads = sum(stat[0] for stat in stats)
+        values = sum(stat[1] for stat in stats)
+        latency = sorted(stat[2] for stat in stats)[len(stats) // 2]
+        print(f'{count:>3} consumers: {reads:9.0f} snapshots/s, {values:9.0f} values/s, '
+              f'p50 snapshot {latency * 1e6:6.1f} us, {sum(stat[3] for stat in stats)} retried, '
+              f'device load {rate:5.1f} requests/s')
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    publisher.close(unlink=True)
+    for device in devices:
+        await device.close()
+    for server in servers:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Shared-memory snapshot readers')
+    parser.add_argument('--racks', type=int, default=10)
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--consumers', default='1,4', help='comma separated consumer process counts')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--interval', type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(run(args.racks, args.port, [int(count) for count in args.consumers.split(',')], args.duration,
+                    args.interval))
+
+
+if __name__ == '__main__':
+    main()
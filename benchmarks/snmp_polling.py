@@ -0,0 +1,77 @@
+"""
+Сравнение опроса по одному OID на сущность и пакетного опроса (несколько OID в одном PDU)
+на наборе локальных SNMP агентов.
+
+    python -m benchmarks.snmp_polling --racks 20 --cycles 5 --latency 0.002
+"""
+import asyncio
+import argparse
+
+from time import monotonic
+from typing import List
+
+from pysnmp.hlapi.asyncio import CommunityData, ContextData, ObjectIdentity, ObjectType, SnmpEngine, UdpTransportTarget, getCmd
+
+from simulator.rack import SimRack
+from simulator.snmp_agent import IoThinxAgent, TABLES, IOTHINX_OID
+
+
+def rack_oids(rack: SimRack) -> List[str]:
+    """
+    OID значений всех каналов стойки, как их опрашивают сущности Home Assistant.
+    """
+    columns = {'di': 6, 'do': 6, 'relay': 5, 'ai': 10, 'ao': 8, 'rtd': 7, 'tc': 7}
+    oids = []
+    for kind, column in columns.items():
+        entry = TABLES[kind][0]
+        for channel in rack.tables[kind]:
+            oids.append('.'.join(map(str, IOTHINX_OID + entry + (column, channel.index))))
+    return oids
+
+
+async def poll(engine, target, oids: List[str], batch: int) -> int:
+    requests = 0
+    for start in range(0, len(oids), batch):
+        error, status, _, _ = await getCmd(engine, CommunityData('public', mpModel=1), target, ContextData(),
+                                           *[ObjectType(ObjectIdentity(oid)) for oid in oids[start:start + batch]])
+        requests += 1
+        if error or status:
+            raise RuntimeError(f'{error or status.prettyPrint()}')
+    return requests
+
+
+async def run(racks: int, port: int, cycles: int, latency: float, batch: int) -> None:
+    agents = [IoThinxAgent(SimRack(seed=number), port=port + number, latency=latency) for number in range(racks)]
+    for agent in agents:
+        agent.start()
+
+    engine = SnmpEngine()
+    targets = [UdpTransportTarget(('127.0.0.1', agent.port)) for agent in agents]
+    oids = [rack_oids(agent.rack) for agent in agents]
+
+    for name, size in (('per-entity', 1), ('batched', batch)):
+        started = monotonic()
+        requests = 0
+        for _ in range(cycles):
+            counts = await asyncio.gather(*[poll(engine, target, rack, size) for target, rack in zip(targets, oids)])
+            requests += sum(counts)
+        elapsed = monotonic() - started
+        print(f'{name:>10}: {requests} requests, {elapsed / cycles * 1000:.1f} ms per cycle, {requests / elapsed:.0f} req/s')
+
+    for agent in agents:
+        agent.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='SNMP per-entity vs batched polling benchmark')
+    parser.add_argument('--racks', type=int, default=10)
+    parser.add_argument('--port', type=int, default=1161)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--batch', type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run(args.racks, args.port, args.cycles, args.latency, args.batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Серии импульсов на тысячах DO: Scheduler (колесо таймеров, записи объединяются по устройствам)
+и задача asyncio.sleep на каждый выход. Устройства имитируются: запись занимает --latency секунд.
+
+    python -m benchmarks.timer_wheel --devices 100 --channels 50 --duration 10
+"""
+import random
+import asyncio
+import argparse
+
+from time import monotonic
+from typing import Any, List, Tuple
+
+from iolib.scheduler import Scheduler
+
+
+class FakeDevice:
+    def __init__(self, number: int, latency: float) -> None:
+        self.base_url: str = f'http://10.0.0.{number}'
+        self.latency: float = latency
+        self.writes: int = 0
+        self.values: int = 0
+
+    async def write(self, values: List[Tuple[Any, Any]]) -> None:
+        self.writes += 1
+        self.values += len(values)
+        await asyncio.sleep(self.latency)
+
+
+class FakeOutput:
+    def __init__(self, device: FakeDevice, no: int) -> None:
+        self._device: FakeDevice = device
+        self.no: int = no
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] if ordered else 0.0
+
+
+async def wheel(outputs: List[FakeOutput], widths: List[float], duration: float, tick: float) -> Tuple[float, ...]:
+    scheduler = Scheduler(tick=tick, history=1 << 20)
+    scheduler.start()
+    jobs = [scheduler.pulse(output, on=width, off=width, count=None) for output, width in zip(outputs, widths)]
+    await asyncio.sleep(duration)
+    for job in jobs:
+        job.cancel()
+    await scheduler.stop()
+    late = list(scheduler.late)
+    return scheduler.fired, scheduler.writes, percentile(late, 50), percentile(late, 99), scheduler.late_max
+
+
+async def tasks(outputs: List[FakeOutput], widths: List[float], duration: float) -> Tuple[float, ...]:
+    late = []
+    writes = 0
+
+    async def pulse(output: FakeOutput, width: float) -> None:
+        nonlocal writes
+        deadline = monotonic()
+        value = True
+        while True:
+            await asyncio.sleep(max(0.0, deadline - monotonic()))
+            late.append(monotonic() - deadline)
+            writes += 1
+            await output._device.write([(output, value)])
+            value = not value
+            deadline += width
+
+    running = [asyncio.ensure_future(pulse(output, width)) for output, width in zip(outputs, widths)]
+    await asyncio.sleep(duration)
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+    return len(late), writes, percentile(late, 50), percentile(late, 99), max(late)
+
+
+async def run(devices: int, channels: int, duration: float, latency: float, tick: float) -> None:
+    generator = random.Random(1)
+    racks = [FakeDevice(number, latency) for number in range(devices)]
+    outputs = [FakeOutput(rack, no) for rack in racks for no in range(channels)]
+    widths = [generator.choice([0.1, 0.2, 0.25, 0.5, 1.0]) for _ in outputs]
+    print(f'{len(outputs)} outputs on {devices} devices, write latency {latency * 1000:.0f} ms, {duration:.0f} s')
+    for name, result in (('timer wheel', await wheel(outputs, widths, duration, tick)),
+                         ('sleep tasks', await tasks(outputs, widths, duration))):
+        fired, writes, p50, p99, worst = result
+        print(f'  {name}: {fired / duration:7.0f} steps/s, {writes / duration:7.0f} writes/s, '
+              f'late p50 {p50 * 1000:5.1f} ms, p99 {p99 * 1000:6.1f} ms, max {worst * 1000:6.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Timer wheel output scheduling')
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--channels', type=int, default=50, help='outputs per device')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated write latency, seconds')
+    parser.add_argument('--tick', type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(run(args.devices, args.channels, args.duration, args.latency, args.tick))
+
+
+if __name__ == '__main__':
+    main()
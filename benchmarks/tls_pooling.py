@@ -0,0 +1,66 @@
+"""
+Обновление Device по HTTP, HTTPS с пулом соединений и HTTPS с новым соединением на каждый запрос.
+Число TLS рукопожатий считает сервер (SSLContext.session_stats).
+
+    python -m benchmarks.tls_pooling --racks 3 --cycles 50
+"""
+import asyncio
+import argparse
+
+from time import monotonic
+from typing import List
+
+from iolib.moxa_io import Device
+
+from simulator.rack import SimRack
+from simulator.web_api import WebApiServer, self_signed_context
+
+
+async def run(racks: int, port: int, cycles: int, latency: float, layout: List[str]) -> None:
+    context = self_signed_context()
+    modes = (
+        ('http', False, True),
+        ('https pooled', True, True),
+        ('https no pool', True, False),
+    )
+    for number, (name, https, pool) in enumerate(modes):
+        servers = [WebApiServer(SimRack(layout, seed=rack), port=port + number * racks + rack, latency=latency)
+                   for rack in range(racks)]
+        for server in servers:
+            await server.start(context if https else None)
+
+        devices = [Device('127.0.0.1', server.port, 'admin', 'moxa', cache_tiers=[], https=https, pool=pool)
+                   for server in servers]
+        await asyncio.gather(*[device.connect() for device in devices])
+
+        stats = context.session_stats()
+        handshakes = stats['accept'] if https else 0
+        started = monotonic()
+        for _ in range(cycles):
+            await asyncio.gather(*[device._update() for device in devices])
+        elapsed = (monotonic() - started) / cycles
+        if https:
+            handshakes = context.session_stats()['accept'] - handshakes
+
+        print(f'{name:>14}: {elapsed * 1000:6.1f} ms per refresh, {handshakes / cycles / racks:5.1f} TLS handshakes per rack per refresh')
+
+        for device in devices:
+            await device.close()
+        for server in servers:
+            await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Refresh latency and TLS handshakes with and without connection pooling')
+    parser.add_argument('--racks', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--cycles', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    args = parser.parse_args()
+    layout = args.layout.split(',') if args.layout else None
+    asyncio.run(run(args.racks, args.port, args.cycles, args.latency, layout))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+import attr
+import logging
+
+import numpy as np
+
+from time import time
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from .stream import Snapshot, LATEST
+
+if TYPE_CHECKING:
+    from .moxa_io import Device
+
+logger = logging.getLogger(__name__)
+
+HIGH = 'high'
+"""Значение выше предела"""
+LOW = 'low'
+"""Значение ниже предела"""
+RATE = 'rate'
+"""Скорость изменения по модулю выше предела, единиц в секунду"""
+KINDS = [HIGH, LOW, RATE]
+
+
+@attr.s(frozen=True, slots=True)
+class AlarmEvent:
+    id: int = attr.ib()
+    """Идентификатор предела в AlarmEngine"""
+    host: str = attr.ib()
+    slot: int = attr.ib()
+    no: int = attr.ib()
+    kind: str = attr.ib()
+    active: bool = attr.ib()
+    """True - тревога возникла, False - снята"""
+    value: float = attr.ib()
+    """Значение канала, для RATE - скорость изменения"""
+    limit: float = attr.ib()
+    time: float = attr.ib()
+
+
+class AlarmEngine:
+    def __init__(self) -> None:
+        """
+        Контроль пределов AI всего парка устройств. Значения и пределы хранятся в массивах numpy,
+        все пределы проверяются за один векторный проход, наружу выдаются только смены состояния тревог.
+
+        Тревога возникает, когда условие выполняется не меньше delay секунд подряд, и снимается,
+        когда значение вернется за предел с запасом deadband.
+
+            engine = AlarmEngine()
+            engine.add('http://192.168.127.254', 3, 0, HIGH, 80.0, deadband=2.0, delay=5.0)
+            for event in engine.update(snapshot):
+                print(event.host, event.slot, event.no, event.kind, event.active)
+        """
+        self._channels: Dict[Tuple[str, int, int], int] = {}
+        """Номер канала в массивах значений по (адрес, слот, номер AI)"""
+        self._names: List[Tuple[str, int, int]] = []
+        self._layouts: Dict[str, Tuple[Tuple[Tuple[int, int], ...], np.ndarray]] = {}
+        """Состав AI снимка устройства и номера его каналов в массивах значений"""
+
+        self._value = np.empty(0)
+        self._time = np.empty(0)
+        self._previous = np.empty(0)
+        self._previous_time = np.empty(0)
+
+        self._count: int = 0
+        self._channel = np.empty(0, dtype=np.int64)
+        self._kind = np.empty(0, dtype=np.int8)
+        self._direction = np.empty(0)
+        """1 - тревога выше предела (HIGH, RATE), -1 - ниже (LOW)"""
+        self._rates: int = 0
+        self._limit = np.empty(0)
+        self._deadband = np.empty(0)
+        self._delay = np.empty(0)
+        self._enabled = np.empty(0, dtype=bool)
+        self._active = np.empty(0, dtype=bool)
+        self._since = np.empty(0)
+        """Время начала выполнения условия, NaN - условие не выполняется"""
+
+        self._listeners: List[Callable[[AlarmEvent], None]] = []
+        self.evaluations: int = 0
+
+    def _channel_for(self, host: str, slot: int, no: int) -> int:
+        key = (host, slot, no)
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = len(self._names)
+            self._names.append(key)
+            if channel >= len(self._value):
+                size = max(64, len(self._value) * 2)
+                self._value = _grow(self._value, size, np.nan)
+                self._time = _grow(self._time, size, np.nan)
+                self._previous = _grow(self._previous, size, np.nan)
+                self._previous_time = _grow(self._previous_time, size, np.nan)
+            self._layouts.pop(host, None)
+        return channel
+
+    def add(self, host: str, slot: int, no: int, kind: str, limit: float, deadband: float = 0.0,
+            delay: float = 0.0) -> int:
+        """
+        Добавить предел AI.
+
+        :param host: Адрес устройства, как в Snapshot.host
+        :param slot: Номер слота
+        :param no: Номер AI в модуле
+        :param kind: HIGH, LOW или RATE
+        :param limit: Предел
+        :param deadband: Запас для снятия тревоги
+        :param delay: Сколько секунд условие должно выполняться до возникновения тревоги
+        :return: Идентификатор предела
+        """
+        if kind not in KINDS:
+            raise ValueError(f'Unknown alarm kind {kind}')
+        channel = self._channel_for(host, slot, no)
+        id = self._count
+        if id >= len(self._channel):
+            size = max(64, len(self._channel) * 2)
+            self._channel = _grow(self._channel, size, 0)
+            self._kind = _grow(self._kind, size, 0)
+            self._direction = _grow(self._direction, size, 1.0)
+            self._limit = _grow(self._limit, size, np.nan)
+            self._deadband = _grow(self._deadband, size, 0.0)
+            self._delay = _grow(self._delay, size, 0.0)
+            self._enabled = _grow(self._enabled, size, False)
+            self._active = _grow(self._active, size, False)
+            self._since = _grow(self._since, size, np.nan)
+        self._channel[id] = channel
+        self._kind[id] = KINDS.index(kind)
+        self._direction[id] = -1.0 if kind == LOW else 1.0
+        self._rates += kind == RATE
+        self._limit[id] = limit
+        self._deadband[id] = deadband
+        self._delay[id] = delay
+        self._enabled[id] = True
+        self._active[id] = False
+        self._since[id] = np.nan
+        self._count += 1
+        return id
+
+    def remove(self, id: int) -> None:
+        """
+        Отключить предел. Активная тревога снимается без события.
+        """
+        self._enabled[id] = False
+        self._active[id] = False
+        self._since[id] = np.nan
+
+    def set_limit(self, id: int, limit: float, deadband: Optional[float] = None, delay: Optional[float] = None) -> None:
+        self._limit[id] = limit
+        if deadband is not None:
+            self._deadband[id] = deadband
+        if delay is not None:
+            self._delay[id] = delay
+
+    def active(self) -> List[int]:
+        """
+        Идентификаторы пределов с активной тревогой.
+        """
+        return np.flatnonzero(self._active[:self._count]).tolist()
+
+    def add_listener(self, listener: Callable[[AlarmEvent], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[AlarmEvent], None]) -> None:
+        self._listeners.remove(listener)
+
+    def load(self, snapshot: Snapshot) -> None:
+        """
+        Записать значения AI снимка в массивы без проверки пределов. Снимки недоступного устройства пропускаются.
+        """
+        if snapshot.stale:
+            return
+        channels = [(module.slot, channel) for module in snapshot.modules for channel in module.channels
+                    if channel.kind == 'ai']
+        if not channels:
+            return
+        keys = tuple((slot, channel.no) for slot, channel in channels)
+        values = np.array([channel.value for _, channel in channels], dtype=float)
+        """None становится NaN"""
+
+        layout = self._layouts.get(snapshot.host)
+        if layout is None or layout[0] != keys:
+            positions = np.array([self._channels.get((snapshot.host, slot, no), -1) for slot, no in keys],
+                                 dtype=np.int64)
+            layout = self._layouts[snapshot.host] = (keys, positions)
+        positions = layout[1]
+        known = positions >= 0
+        if not known.all():
+            positions = positions[known]
+            values = values[known]
+        if not len(positions):
+            return
+        self._previous[positions] = self._value[positions]
+        self._previous_time[positions] = self._time[positions]
+        self._value[positions] = values
+        self._time[positions] = snapshot.time
+
+    def evaluate(self, now: Optional[float] = None) -> List[AlarmEvent]:
+        """
+        Проверить все пределы одним проходом.
+        :return: Смены состояния тревог
+        """
+        now = time() if now is None else now
+        count = self._count
+        channel = self._channel[:count]
+        kind = self._kind[:count]
+        limit = self._limit[:count]
+        deadband = self._deadband[:count]
+        active = self._active[:count]
+        since = self._since[:count]
+
+        measured = self._value[channel]
+        rates = np.flatnonzero(kind == 2) if self._rates else None
+        if rates is not None and len(rates):
+            source = channel[rates]
+            elapsed = self._time[source] - self._previous_time[source]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rate = np.abs((measured[rates] - self._previous[source]) / elapsed)
+            rate[~(elapsed > 0)] = np.nan
+            measured[rates] = rate
+
+        with np.errstate(invalid='ignore'):
+            excess = (measured - limit) * self._direction[:count]
+            condition = excess > 0
+            cleared = excess < -deadband
+        condition &= self._enabled[:count]
+
+        pending = condition & ~active
+        since[pending & np.isnan(since)] = now
+        since[~pending] = np.nan
+        raised = pending & (now - since >= self._delay[:count])
+        dropped = active & cleared
+        since[raised] = np.nan
+        active |= raised
+        active &= ~dropped
+        self.evaluations += 1
+
+        changed = np.flatnonzero(raised | dropped)
+        events = []
+        if len(changed):
+            names = self._names
+            for id, source, code, state, current, threshold in zip(
+                    changed.tolist(), channel[changed].tolist(), kind[changed].tolist(), active[changed].tolist(),
+                    measured[changed].tolist(), limit[changed].tolist()):
+                host, slot, no = names[source]
+                events.append(AlarmEvent(id, host, slot, no, KINDS[code], state, current, threshold, now))
+        for event in events:
+            for listener in list(self._listeners):
+                try:
+                    listener(event)
+                except Exception:
+                    logger.exception('Alarm listener failed')
+        return events
+
+    def update(self, *snapshots: Snapshot, now: Optional[float] = None) -> List[AlarmEvent]:
+        """
+        Записать снимки и проверить все пределы.
+        """
+        for snapshot in snapshots:
+            self.load(snapshot)
+        return self.evaluate(now)
+
+    async def follow(self, device: 'Device', interval: float = 1.0) -> None:
+        """
+        Проверять пределы по снимкам устройства из общего потока до отмены задачи, события - слушателям.
+        """
+        subscription = device.stream(interval, policy=LATEST)
+        try:
+            async for snapshot in subscription:
+                self.update(snapshot)
+        finally:
+            subscription.close()
+
+
+def _grow(array: np.ndarray, size: int, fill) -> np.ndarray:
+    grown = np.full(size, fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
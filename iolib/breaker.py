@@ -0,0 +1,125 @@
+import logging
+
+from time import monotonic
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .stream import Snapshot
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+"""Устройство доступно, запросы выполняются"""
+OPEN = 'open'
+"""Устройство недоступно, запросы сразу завершаются ошибкой"""
+HALF_OPEN = 'half_open'
+"""Выполняется пробный запрос, остальные завершаются ошибкой"""
+
+
+class DeviceUnavailableError(Exception):
+    def __init__(self, host: str, state: str, retry_in: float, snapshot: Optional['Snapshot'] = None) -> None:
+        """
+        Устройство недоступно, запрос не отправлялся.
+
+        :param host: Адрес устройства
+        :param state: Состояние автомата
+        :param retry_in: Через сколько секунд будет пробный запрос
+        :param snapshot: Последнее известное состояние устройства, помечено stale
+        """
+        super().__init__(f'{host} is unavailable ({state}), next probe in {retry_in:.1f} s')
+        self.host: str = host
+        self.state: str = state
+        self.retry_in: float = retry_in
+        self.snapshot: Optional['Snapshot'] = snapshot
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = 3, reset_timeout: float = 2.0, max_reset_timeout: float = 60.0,
+                 probe_timeout: float = 1.0) -> None:
+        """
+        Отслеживание доступности устройства. После failures ошибок связи подряд запросы не отправляются
+        reset_timeout секунд, затем один пробный запрос с коротким таймаутом: успех закрывает автомат,
+        ошибка удваивает время ожидания до max_reset_timeout.
+
+        :param failures: Число ошибок подряд для размыкания
+        :param reset_timeout: Время до первого пробного запроса, секунды
+        :param max_reset_timeout: Наибольшее время до пробного запроса
+        :param probe_timeout: Таймаут пробного запроса
+        """
+        self.failures: int = failures
+        self.reset_timeout: float = reset_timeout
+        self.max_reset_timeout: float = max_reset_timeout
+        self.probe_timeout: float = probe_timeout
+
+        self._state: str = CLOSED
+        self._failures: int = 0
+        self._timeout: float = reset_timeout
+        self._retry_at: float = 0.0
+        self._opened: float = 0.0
+
+        self.trips: int = 0
+        """Число размыканий"""
+        self.rejected: int = 0
+        """Число запросов, завершенных без отправки"""
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and monotonic() >= self._retry_at:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def retry_in(self) -> float:
+        return max(0.0, self._retry_at - monotonic())
+
+    @property
+    def downtime(self) -> float:
+        """
+        Время с размыкания, 0 если устройство доступно.
+        """
+        return monotonic() - self._opened if self._state != CLOSED else 0.0
+
+    def blocked(self) -> bool:
+        """
+        Запросы сейчас не отправляются: автомат разомкнут и время пробы не наступило, или проба уже выполняется.
+        """
+        return self._state == HALF_OPEN or (self._state == OPEN and monotonic() < self._retry_at)
+
+    def acquire(self) -> Optional[float]:
+        """
+        Начать запрос, перед вызовом проверяется blocked().
+        :return: None - обычный запрос, число - таймаут пробного запроса
+        """
+        if self._state == CLOSED:
+            return None
+        self._state = HALF_OPEN
+        return self.probe_timeout
+
+    def abort(self) -> None:
+        """
+        Пробный запрос отменен без результата, следующий запрос снова будет пробным.
+        """
+        if self._state == HALF_OPEN:
+            self._state = OPEN
+            self._retry_at = monotonic()
+
+    def success(self) -> None:
+        if self._state != CLOSED:
+            logger.info(f'Device is reachable again after {self.downtime:.1f} s')
+        self._state = CLOSED
+        self._failures = 0
+        self._timeout = self.reset_timeout
+
+    def failure(self) -> None:
+        self._failures += 1
+        if self._state == HALF_OPEN:
+            self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self._state == CLOSED and self._failures >= self.failures:
+            self._opened = monotonic()
+            self.trips += 1
+            self._open()
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._retry_at = monotonic() + self._timeout
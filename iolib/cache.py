@@ -0,0 +1,123 @@
+import re
+import attr
+import asyncio
+import logging
+
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(frozen=True, slots=True)
+class CacheTier:
+    name: str = attr.ib()
+    pattern: str = attr.ib()
+    """Регулярное выражение адреса запроса без ведущего /"""
+    ttl: float = attr.ib()
+    """Время жизни ответа в секундах, 0 - только объединение одновременных запросов"""
+
+
+DEFAULT_TIERS: List[CacheTier] = [
+    CacheTier('device', r'action/device$', 60.0),
+    CacheTier('topology', r'action/slotinfo$', 10.0),
+    CacheTier('io', r'action/io/\d+/\d+$', 0.0),
+]
+"""Уровни кэша: информация об устройстве меняется редко, состав модулей - при замене модуля, состояние каналов - постоянно"""
+
+
+class ResponseCache:
+    def __init__(self, tiers: Optional[List[CacheTier]] = None, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Кэш ответов GET запросов с временем жизни по уровням.
+        Одновременные запросы одного адреса объединяются в один, даже если ответ не кэшируется.
+        Адреса, не подходящие ни под один уровень, не кэшируются и не объединяются.
+
+        :param tiers: Уровни кэша, проверяются по порядку
+        :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        """
+        self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
+        tiers = DEFAULT_TIERS if tiers is None else tiers
+        self._tiers: List[Tuple[CacheTier, Any]] = [(tier, re.compile(tier.pattern)) for tier in tiers]
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        """Ответы по адресу: (время окончания жизни, ответ)"""
+        self._inflight: Dict[str, asyncio.Future] = {}
+        """Выполняющиеся запросы по адресу"""
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def tier(self, key: str) -> Optional[CacheTier]:
+        for tier, pattern in self._tiers:
+            if pattern.search(key):
+                return tier
+        return None
+
+    def set_ttl(self, name: str, ttl: float) -> None:
+        """
+        Изменить время жизни уровня.
+        """
+        for number, (tier, pattern) in enumerate(self._tiers):
+            if tier.name == name:
+                self._tiers[number] = (attr.evolve(tier, ttl=ttl), pattern)
+                self.invalidate(name)
+                return
+        raise KeyError(f'Unknown cache tier {name}')
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        tier = self.tier(key)
+        if tier is None:
+            return await fetch()
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > monotonic():
+            self.hits += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            task = self._inflight[key] = self.loop.create_task(self._fetch(key, tier, fetch))
+            task.add_done_callback(consume_exception)
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, tier: CacheTier, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Общий запрос всех ожидающих. Выполняется отдельной задачей: отмена одного ожидающего не прерывает запрос
+        для остальных. Запрос, сброшенный invalidate(), не сохраняет ответ в кэше.
+        """
+        task = asyncio.current_task()
+        try:
+            response = await fetch()
+        finally:
+            current = self._inflight.get(key) is task
+            if current:
+                del self._inflight[key]
+        if current and tier.ttl > 0:
+            self._entries[key] = (monotonic() + tier.ttl, response)
+        return response
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """
+        Сбросить ответы уровня или весь кэш.
+        Выполняющиеся запросы уровня отвязываются: вызовы после сброса начинают новый запрос.
+        """
+        if name is None:
+            self._entries.clear()
+            self._inflight.clear()
+            return
+        for entries in (self._entries, self._inflight):
+            for key in list(entries):
+                tier = self.tier(key)
+                if tier is not None and tier.name == name:
+                    del entries[key]
+
+
+def consume_exception(task: asyncio.Future) -> None:
+    """
+    Ошибка общего запроса передается ожидающим; если все они отменены, она не должна попасть в лог как непрочитанная.
+    """
+    if not task.cancelled():
+        task.exception()
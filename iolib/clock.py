@@ -0,0 +1,138 @@
+import attr
+import logging
+
+from collections import deque
+from datetime import datetime
+from typing import Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+DEVICE_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+"""Формат ответа /action/time, местное время устройства"""
+
+
+def parse_device_time(text: str) -> float:
+    """
+    Время устройства в секундах от эпохи. Время без часового пояса считается местным временем хоста,
+    разница часовых поясов попадает в смещение часов.
+    """
+    return datetime.strptime(text.strip().strip('"')[:19], DEVICE_TIME_FORMAT).timestamp()
+
+
+@attr.s(frozen=True, slots=True)
+class ClockSample:
+    sent: float = attr.ib()
+    """Время отправки запроса по часам хоста"""
+    received: float = attr.ib()
+    """Время получения ответа по часам хоста"""
+    device: float = attr.ib()
+    """Показание часов устройства"""
+
+    @property
+    def rtt(self) -> float:
+        return self.received - self.sent
+
+
+@attr.s(frozen=True, slots=True)
+class Timestamp:
+    time: float = attr.ib()
+    """Оценка времени получения данных устройством по часам хоста: середина обмена"""
+    uncertainty: float = attr.ib()
+    """Половина ширины интервала, в котором гарантированно лежит время получения данных"""
+    device_time: Optional[float] = attr.ib(default=None)
+    """То же время по часам устройства, None пока смещение не оценено"""
+    device_uncertainty: Optional[float] = attr.ib(default=None)
+    """Погрешность device_time с учетом погрешности смещения часов"""
+
+
+class ClockEstimator:
+    def __init__(self, window: int = 32, resolution: float = 1.0, max_drift: float = 100e-6) -> None:
+        """
+        Оценка смещения часов устройства относительно хоста по обменам /action/time (как в NTP).
+        Каждый обмен дает интервал возможных смещений [device - received, device + resolution - sent],
+        интервалы окна пересекаются, поэтому погрешность может быть меньше разрешения часов устройства.
+
+        :param window: Число хранимых обменов
+        :param resolution: Разрешение часов устройства, секунды
+        :param max_drift: Допустимый дрейф часов, с/с. Старые интервалы расширяются на max_drift * возраст
+        """
+        self.resolution: float = resolution
+        self.max_drift: float = max_drift
+        self._samples: Deque[ClockSample] = deque(maxlen=window)
+        self._offset: Optional[float] = None
+        self._uncertainty: Optional[float] = None
+
+        self.steps: int = 0
+        """Число скачков часов устройства: интервалы окна перестали пересекаться"""
+
+    @property
+    def samples(self) -> int:
+        return len(self._samples)
+
+    @property
+    def offset(self) -> Optional[float]:
+        """
+        Смещение: часы устройства минус часы хоста, секунды.
+        """
+        return self._offset
+
+    @property
+    def uncertainty(self) -> Optional[float]:
+        return self._uncertainty
+
+    @property
+    def rtt(self) -> Optional[float]:
+        """
+        Наименьшее время обмена в окне.
+        """
+        return min((sample.rtt for sample in self._samples), default=None)
+
+    @property
+    def drift(self) -> float:
+        """
+        Дрейф часов устройства по методу наименьших квадратов, с/с. Положительный - часы устройства спешат.
+        Оценка диагностическая, погрешности считаются по max_drift.
+        """
+        if len(self._samples) < 2:
+            return 0.0
+        points = [((sample.sent + sample.received) / 2, sample.device + self.resolution / 2 - (sample.sent + sample.received) / 2)
+                  for sample in self._samples]
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_o = sum(o for _, o in points) / len(points)
+        variance = sum((t - mean_t) ** 2 for t, _ in points)
+        if variance <= 0:
+            return 0.0
+        return sum((t - mean_t) * (o - mean_o) for t, o in points) / variance
+
+    def add(self, sample: ClockSample) -> None:
+        self._samples.append(sample)
+        if not self._estimate(sample.received):
+            logger.warning(f'Device clock step detected, offset {self._offset} discarded')
+            self.steps += 1
+            self._samples.clear()
+            self._samples.append(sample)
+            self._estimate(sample.received)
+
+    def _estimate(self, now: float) -> bool:
+        low, high = float('-inf'), float('inf')
+        for sample in self._samples:
+            widen = self.max_drift * (now - sample.sent)
+            low = max(low, sample.device - sample.received - widen)
+            high = min(high, sample.device + self.resolution - sample.sent + widen)
+        if low > high:
+            return False
+        self._offset = (low + high) / 2
+        self._uncertainty = (high - low) / 2
+        return True
+
+    def stamp(self, sent: float, received: float) -> Timestamp:
+        """
+        Время данных, полученных в обмене [sent, received] по часам хоста.
+        """
+        time = (sent + received) / 2
+        uncertainty = (received - sent) / 2
+        if self._offset is None:
+            return Timestamp(time, uncertainty)
+
+        age = abs(time - self._samples[-1].received)
+        return Timestamp(time, uncertainty, time + self._offset, uncertainty + self._uncertainty + self.max_drift * age)
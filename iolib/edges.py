@@ -0,0 +1,133 @@
+import attr
+import logging
+
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .moxa_io import Device, DigitalInput
+
+logger = logging.getLogger(__name__)
+
+COUNTER_MODE = 1
+"""diMode: счетчик импульсов"""
+TRIGGER_RISING = 0
+TRIGGER_FALLING = 1
+TRIGGER_BOTH = 2
+"""Фронт, по которому считает счетчик DI"""
+COUNTER_MODULO = 1 << 32
+"""diCounterValue - Gauge32, после переполнения счет продолжается с 0"""
+
+
+@attr.s(frozen=True, slots=True)
+class EdgeState:
+    rising: int = attr.ib(default=0)
+    """Число передних фронтов с последнего чтения"""
+    falling: int = attr.ib(default=0)
+    """Число задних фронтов с последнего чтения"""
+    status: bool = attr.ib(default=False)
+    """Состояние входа при последнем опросе"""
+    exact: bool = attr.ib(default=True)
+    """Фронты посчитаны по счетчику. False - вход не в режиме счетчика, видны только изменения между опросами"""
+
+    @property
+    def changed(self) -> bool:
+        """
+        Вход переключался с последнего чтения, даже если вернулся в прежнее состояние.
+        """
+        return bool(self.rising or self.falling)
+
+
+def count_edges(previous_status: int, status: int, delta: int, trigger: Optional[int]) -> Tuple[int, int]:
+    """
+    Разделить приращение счетчика на передние и задние фронты.
+    Число фронтов разного типа отличается не больше чем на один и согласуется с изменением состояния.
+
+    :param delta: Приращение счетчика по модулю COUNTER_MODULO
+    :return: (передние, задние)
+    """
+    step = int(bool(status)) - int(bool(previous_status))
+    if trigger == TRIGGER_BOTH:
+        # rising + falling = delta, rising - falling = step
+        delta = max(delta, abs(step))
+        if (delta + step) % 2:
+            delta += 1
+        return (delta + step) // 2, (delta - step) // 2
+    elif trigger == TRIGGER_FALLING:
+        falling = max(delta, -step)
+        return falling + step, falling
+    else:
+        rising = max(delta, step)
+        return rising, rising - step
+
+
+class EdgeCapture:
+    def __init__(self, device: 'Device') -> None:
+        """
+        Фиксация фронтов DI между опросами по счетчику импульсов.
+        Фронты накапливаются до чтения, поэтому короткие импульсы не теряются при редком опросе.
+        Для точного счета канал должен быть в режиме счетчика (diMode = counter) и счетчик запущен.
+        """
+        self._device: 'Device' = device
+        self._last: Dict['DigitalInput', Tuple[int, Optional[int]]] = {}
+        """Последние (состояние, счетчик) по каналу"""
+        self._latched: Dict['DigitalInput', EdgeState] = {}
+
+    def channels(self) -> List['DigitalInput']:
+        from .moxa_io import DigitalInput
+        return [io for module in self._device.modules for io in module.ios if isinstance(io, DigitalInput)]
+
+    def scan(self) -> List['DigitalInput']:
+        """
+        Учесть состояние каналов после обновления устройства.
+        :return: Каналы, у которых появились новые фронты
+        """
+        changed = []
+        channels = self.channels()
+        for channel in channels:
+            status = int(bool(channel._status))
+            counter = channel._value if channel._mode == COUNTER_MODE and channel._value is not None else None
+            previous = self._last.get(channel)
+            self._last[channel] = (status, counter)
+            if previous is None:
+                self._latched.setdefault(channel, EdgeState(status=bool(status), exact=counter is not None))
+                continue
+
+            previous_status, previous_counter = previous
+            if counter is not None and previous_counter is not None:
+                rising, falling = count_edges(previous_status, status, (counter - previous_counter) % COUNTER_MODULO,
+                                              channel._trigger)
+                exact = True
+            else:
+                rising, falling = int(status > previous_status), int(status < previous_status)
+                exact = False
+
+            latched = self._latched.get(channel, EdgeState())
+            self._latched[channel] = EdgeState(latched.rising + rising, latched.falling + falling, bool(status), exact)
+            if rising or falling:
+                changed.append(channel)
+
+        for channel in set(self._last) - set(channels):
+            self._last.pop(channel)
+            self._latched.pop(channel, None)
+        return changed
+
+    async def poll(self) -> List['DigitalInput']:
+        """
+        Обновить устройство и учесть фронты.
+        """
+        await self._device.update()
+        return self.scan()
+
+    def peek(self, channel: 'DigitalInput') -> EdgeState:
+        return self._latched.get(channel, EdgeState(status=channel.status))
+
+    def read(self, channel: 'DigitalInput') -> EdgeState:
+        """
+        Фронты канала с последнего чтения. Счетчики фронтов сбрасываются.
+        """
+        state = self.peek(channel)
+        self._latched[channel] = EdgeState(status=state.status, exact=state.exact)
+        return state
+
+    def read_all(self) -> Dict['DigitalInput', EdgeState]:
+        return {channel: self.read(channel) for channel in list(self._latched)}
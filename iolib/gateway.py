@@ -0,0 +1,430 @@
+"""
+Шлюз к стойкам ioThinx для многих клиентов: каждое устройство опрашивается один раз,
+клиенты получают снимки по HTTP и изменения по WebSocket, записи выходов объединяются в очередь устройства.
+
+    python -m iolib.gateway --port 8180 --username admin --password moxa 192.168.127.254 192.168.127.253:8080
+"""
+import json
+import asyncio
+import logging
+import argparse
+
+from collections import deque
+from time import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiohttp import web, WSMsgType
+
+from .breaker import DeviceUnavailableError
+from .moxa_io import Device, DigitalOutput, AnalogOutput
+from .stream import ChannelSnapshot, Snapshot, LATEST
+
+logger = logging.getLogger(__name__)
+
+_Key = Tuple[int, str, int]
+"""Слот, тип канала, номер канала в типе"""
+
+
+def encode_snapshot(name: str, snapshot: Snapshot) -> Dict[str, Any]:
+    """
+    Снимок устройства в виде JSON объекта шлюза.
+    """
+    return {
+        'type': 'snapshot',
+        'device': name,
+        'host': snapshot.host,
+        'sequence': snapshot.sequence,
+        'time': snapshot.time,
+        'stale': snapshot.stale,
+        'modules': [{
+            'slot': module.slot,
+            'type': int(module.type),
+            'name': module.name,
+            'timestamp': module.timestamp.time if module.timestamp is not None else None,
+            'channels': [_channel(channel) for channel in module.channels],
+        } for module in snapshot.modules],
+    }
+
+
+def _channel(channel: ChannelSnapshot) -> Dict[str, Any]:
+    return {'kind': channel.kind, 'no': channel.no, 'name': channel.name, 'value': channel.value,
+            'status': channel.status, 'unconfirmed': channel.unconfirmed}
+
+
+def _values(snapshot: Snapshot) -> Dict[_Key, Tuple[Any, Optional[int], bool]]:
+    return {(module.slot, channel.kind, channel.no): (channel.value, channel.status, channel.unconfirmed)
+            for module in snapshot.modules for channel in module.channels}
+
+
+def _layout(snapshot: Snapshot) -> Tuple[Tuple[int, int], ...]:
+    return tuple((module.slot, int(module.type)) for module in snapshot.modules)
+
+
+class _Client:
+    def __init__(self, socket: web.WebSocketResponse, maxsize: int) -> None:
+        """
+        Очередь сообщений одного подписчика WebSocket. Переполненная очередь отбрасывается,
+        вместо нее клиент получает полный снимок.
+        """
+        self.socket: web.WebSocketResponse = socket
+        self.maxsize: int = maxsize
+        self.pending: Deque[str] = deque()
+        self.resync: bool = False
+        self.ready: asyncio.Event = asyncio.Event()
+
+    def push(self, message: str) -> None:
+        if len(self.pending) >= self.maxsize:
+            self.pending.clear()
+            self.resync = True
+        else:
+            self.pending.append(message)
+        self.ready.set()
+
+
+class _Rack:
+    def __init__(self, name: str, device: Device) -> None:
+        self.name: str = name
+        self.device: Device = device
+        self.snapshot: Optional[Snapshot] = None
+        self.values: Dict[_Key, Tuple[Any, Optional[int], bool]] = {}
+        self.layout: Tuple[Tuple[int, int], ...] = ()
+        self.body: str = ''
+        """Полный снимок в JSON, кодируется один раз на версию"""
+        self.etag: str = ''
+        self.clients: List[_Client] = []
+        self.queue: Dict[Any, Any] = {}
+        """Значения, ожидающие записи, по каналам: последняя запись канала заменяет предыдущую"""
+        self.waiters: List[asyncio.Future] = []
+        self.writer: Optional[asyncio.Future] = None
+        self.task: Optional[asyncio.Future] = None
+
+
+class Gateway:
+    def __init__(self, host: str = '0.0.0.0', port: int = 8180, interval: float = 1.0, client_buffer: int = 64,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        HTTP/WebSocket шлюз к подключенным устройствам. Нагрузка на устройство не зависит от числа клиентов:
+        один опрос через общий поток снимков и одна очередь записи на устройство.
+
+            GET  /devices                 - список устройств
+            GET  /devices/{name}          - последний снимок, ETag - версия снимка, If-None-Match -> 304
+            GET  /devices/{name}/ws       - WebSocket: полный снимок, затем только изменившиеся каналы
+            POST /devices/{name}/outputs  - записать [{"slot": 1, "kind": "do", "no": 0, "value": true}, ...]
+            GET  /stats                   - счетчики шлюза
+
+        :param host: Адрес для прослушивания
+        :param port: TCP порт
+        :param interval: Период опроса устройств, секунды
+        :param client_buffer: Число неотправленных сообщений клиента WebSocket, после которого он получит полный снимок
+        :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        """
+        self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
+        self.host: str = host
+        self.port: int = port
+        self.interval: float = interval
+        self.client_buffer: int = client_buffer
+        self._epoch: str = f'{int(time() * 1000):x}'
+        """Часть ETag: версии снимков разных запусков шлюза не совпадают"""
+        self._racks: Dict[str, _Rack] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+        self.requests: int = 0
+        self.not_modified: int = 0
+        """Ответов 304 на условные запросы"""
+        self.messages: int = 0
+        """Сообщений WebSocket, поставленных в очереди клиентов"""
+        self.resyncs: int = 0
+        self.write_requests: int = 0
+        """Запросов записи от клиентов"""
+        self.writes: int = 0
+        """Вызовов Device.write"""
+
+        self.app: web.Application = web.Application(middlewares=[self._middleware])
+        self.app.add_routes([
+            web.get('/devices', self._devices),
+            web.get('/devices/{name}', self._snapshot),
+            web.get('/devices/{name}/ws', self._socket),
+            web.post('/devices/{name}/outputs', self._outputs),
+            web.get('/stats', self._stats),
+        ])
+
+    @property
+    def clients(self) -> int:
+        return sum(len(rack.clients) for rack in self._racks.values())
+
+    def add(self, device: Device, name: Optional[str] = None) -> str:
+        """
+        Добавить подключенное устройство.
+
+        :param name: Имя устройства в адресах шлюза, по умолчанию адрес устройства
+        :return: Имя устройства
+        """
+        name = name or device._host
+        if name in self._racks:
+            raise KeyError(f'Device {name} already added')
+        rack = self._racks[name] = _Rack(name, device)
+        if self._runner is not None:
+            rack.task = asyncio.ensure_future(self._follow(rack), loop=self.loop)
+        return name
+
+    async def remove(self, name: str) -> None:
+        rack = self._racks.pop(name)
+        await self._stop_rack(rack)
+
+    def snapshot(self, name: str) -> Optional[Snapshot]:
+        return self._racks[name].snapshot
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        for rack in self._racks.values():
+            if rack.task is None or rack.task.done():
+                rack.task = asyncio.ensure_future(self._follow(rack), loop=self.loop)
+        logger.info(f'Gateway listening on {self.host}:{self.port}, {len(self._racks)} devices')
+
+    async def stop(self) -> None:
+        for rack in self._racks.values():
+            await self._stop_rack(rack)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _stop_rack(self, rack: _Rack) -> None:
+        if rack.task is not None:
+            rack.task.cancel()
+            await asyncio.gather(rack.task, return_exceptions=True)
+            rack.task = None
+        for client in list(rack.clients):
+            await client.socket.close()
+        if rack.writer is not None:
+            await asyncio.gather(rack.writer, return_exceptions=True)
+
+    async def _follow(self, rack: _Rack) -> None:
+        subscription = rack.device.stream(self.interval, policy=LATEST)
+        try:
+            async for snapshot in subscription:
+                self._publish(rack, snapshot)
+        finally:
+            subscription.close()
+
+    def _publish(self, rack: _Rack, snapshot: Snapshot) -> None:
+        """
+        Новая версия снимка: полный JSON для HTTP и одно сообщение об изменениях для всех клиентов WebSocket.
+        """
+        previous = rack.snapshot
+        values = _values(snapshot)
+        layout = _layout(snapshot)
+        rack.snapshot = snapshot
+        rack.body = json.dumps(encode_snapshot(rack.name, snapshot))
+        rack.etag = f'"{self._epoch}-{snapshot.sequence}"'
+
+        if previous is None or layout != rack.layout:
+            message = rack.body
+        else:
+            changes = [[slot, kind, no, value, status, unconfirmed]
+                       for (slot, kind, no), (value, status, unconfirmed) in values.items()
+                       if rack.values.get((slot, kind, no)) != (value, status, unconfirmed)]
+            if not changes and snapshot.stale == previous.stale:
+                message = None
+            else:
+                message = json.dumps({'type': 'delta', 'device': rack.name, 'sequence': snapshot.sequence,
+                                      'previous': previous.sequence, 'time': snapshot.time, 'stale': snapshot.stale,
+                                      'changes': changes})
+        rack.values = values
+        rack.layout = layout
+
+        if message is not None:
+            for client in rack.clients:
+                client.push(message)
+            self.messages += len(rack.clients)
+
+    def _rack(self, request: web.Request) -> _Rack:
+        rack = self._racks.get(request.match_info['name'])
+        if rack is None:
+            raise web.HTTPNotFound(text=f'Device {request.match_info["name"]} not found')
+        return rack
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        return await handler(request)
+
+    async def _devices(self, request: web.Request) -> web.Response:
+        return web.json_response([{
+            'name': rack.name,
+            'host': rack.device.base_url,
+            'sequence': rack.snapshot.sequence if rack.snapshot is not None else None,
+            'stale': rack.snapshot.stale if rack.snapshot is not None else None,
+            'clients': len(rack.clients),
+        } for rack in self._racks.values()])
+
+    async def _snapshot(self, request: web.Request) -> web.Response:
+        rack = self._rack(request)
+        if rack.snapshot is None:
+            raise web.HTTPServiceUnavailable(text=f'No data from {rack.name} yet', headers={'Retry-After': '1'})
+        headers = {'ETag': rack.etag, 'Cache-Control': 'no-cache'}
+        match = request.headers.get('If-None-Match')
+        if match is not None and (match.strip() == '*' or rack.etag in [tag.strip() for tag in match.split(',')]):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=rack.body, content_type='application/json', headers=headers)
+
+    async def _socket(self, request: web.Request) -> web.WebSocketResponse:
+        rack = self._rack(request)
+        socket = web.WebSocketResponse(heartbeat=30.0)
+        await socket.prepare(request)
+
+        client = _Client(socket, self.client_buffer)
+        if rack.snapshot is not None:
+            client.push(rack.body)
+        rack.clients.append(client)
+        sender = asyncio.ensure_future(self._send(rack, client), loop=self.loop)
+        try:
+            async for message in socket:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            rack.clients.remove(client)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+        return socket
+
+    async def _send(self, rack: _Rack, client: _Client) -> None:
+        try:
+            while not client.socket.closed:
+                await client.ready.wait()
+                client.ready.clear()
+                while client.resync or client.pending:
+                    if client.resync:
+                        # Полный снимок уже содержит изменения из очереди: они отбрасываются, а не отправляются после него
+                        client.resync = False
+                        client.pending.clear()
+                        self.resyncs += 1
+                        await client.socket.send_str(rack.body)
+                    else:
+                        await client.socket.send_str(client.pending.popleft())
+        except ConnectionError as error:
+            logger.debug(f'WebSocket client of {rack.name} lost: {error}')
+
+    async def _outputs(self, request: web.Request) -> web.Response:
+        rack = self._rack(request)
+        try:
+            items = await request.json()
+            values = [(self._output(rack, item), item['value']) for item in items]
+        except (ValueError, KeyError, TypeError) as error:
+            raise web.HTTPBadRequest(text=str(error))
+
+        try:
+            await self.write(rack.name, values)
+        except DeviceUnavailableError as error:
+            raise web.HTTPServiceUnavailable(text=str(error))
+        except Exception as error:
+            raise web.HTTPBadGateway(text=f'{rack.device.base_url}: {error}')
+        return web.json_response([{
+            'slot': channel._module.slot,
+            'kind': 'do' if isinstance(channel, DigitalOutput) else 'ao',
+            'no': channel.no,
+            'value': channel.status if isinstance(channel, DigitalOutput) else channel.value,
+            'unconfirmed': channel.unconfirmed,
+        } for channel, _ in values])
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'devices': len(self._racks),
+            'clients': self.clients,
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'messages': self.messages,
+            'resyncs': self.resyncs,
+            'write_requests': self.write_requests,
+            'writes': self.writes,
+        })
+
+    @staticmethod
+    def _output(rack: _Rack, item: Dict[str, Any]):
+        kind = {'do': DigitalOutput, 'ao': AnalogOutput}.get(item['kind'])
+        if kind is None:
+            raise ValueError(f'Channel kind {item["kind"]} is read only')
+        for module in rack.device.modules:
+            if module.slot == int(item['slot']):
+                for io in module.ios:
+                    if type(io) is kind and io.no == int(item['no']):
+                        return io
+        raise KeyError(f'{item["kind"].upper()} {item["no"]} not found in slot {item["slot"]} of {rack.name}')
+
+    async def write(self, name: str, values: List[Tuple[Any, Any]]) -> None:
+        """
+        Поставить запись в очередь устройства. Пока выполняется предыдущая запись, новые запросы объединяются
+        в одну следующую: для каждого канала записывается последнее значение.
+        """
+        rack = self._racks[name]
+        self.write_requests += 1
+        waiter = self.loop.create_future()
+        for channel, value in values:
+            rack.queue.pop(channel, None)
+            rack.queue[channel] = value
+        rack.waiters.append(waiter)
+        if rack.writer is None or rack.writer.done():
+            rack.writer = asyncio.ensure_future(self._drain(rack), loop=self.loop)
+        await waiter
+
+    async def _drain(self, rack: _Rack) -> None:
+        while rack.queue:
+            values, rack.queue = list(rack.queue.items()), {}
+            waiters, rack.waiters = rack.waiters, []
+            self.writes += 1
+            try:
+                await rack.device.write(values)
+            except asyncio.CancelledError:
+                for waiter in waiters + rack.waiters:
+                    waiter.cancel()
+                raise
+            except Exception as error:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(error)
+            else:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+
+
+def _address(value: str, port: int) -> Tuple[str, int]:
+    host, _, number = value.partition(':')
+    return host, int(number) if number else port
+
+
+async def run_gateway(addresses: List[Tuple[str, int]], username: str, password: str, host: str, port: int,
+                      interval: float) -> None:
+    devices = [Device(address, device_port, username, password) for address, device_port in addresses]
+    gateway = Gateway(host, port, interval)
+    try:
+        for device, address in zip(devices, addresses):
+            await device.connect()
+            gateway.add(device, address[0] if address[1] == 80 else f'{address[0]}:{address[1]}')
+        await gateway.start()
+        await asyncio.Event().wait()
+    finally:
+        await gateway.stop()
+        for device in devices:
+            await device.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='ioThinx 4510 aggregating gateway')
+    parser.add_argument('devices', nargs='+', help='device address, host or host:port')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='moxa')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8180)
+    parser.add_argument('--interval', type=float, default=1.0, help='device poll period, seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_gateway([_address(value, 80) for value in args.devices], args.username, args.password,
+                            args.host, args.port, args.interval))
+
+
+if __name__ == '__main__':
+    main()
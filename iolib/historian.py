@@ -0,0 +1,396 @@
+import os
+import attr
+import mmap
+import json
+import struct
+import logging
+
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from .stream import Snapshot, LATEST
+
+if TYPE_CHECKING:
+    from .moxa_io import Device
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'IOHS'
+VERSION = 1
+
+KINDS = ['di', 'do', 'ai', 'ao']
+"""Коды типов каналов в записях"""
+
+_SEGMENT = struct.Struct('<4sHHIIdd')
+"""Заголовок сегмента: метка, версия формата, размер записи, записей в блоке индекса, флаги, начало, длительность"""
+_SEGMENT_SIZE = 32
+_RECORD = struct.Struct('<HBBBbxxdd')
+"""Запись: id устройства, слот, тип, номер канала, состояние (-1 - нет), время, значение"""
+_INDEX = struct.Struct('<dd')
+"""Индекс сегмента, по записи на каждый заполненный блок: наименьшее и наибольшее время записей блока"""
+
+CHANGES_ONLY = 1
+"""Флаг сегмента: записаны только изменения, в начале сегмента - последние значения всех каналов"""
+
+_Key = Tuple[int, int, int, int]
+_Record = Tuple[int, int, int, int, int, float, float]
+
+
+class HistorianError(Exception):
+    pass
+
+
+@attr.s(frozen=True, slots=True)
+class Sample:
+    host: str = attr.ib()
+    slot: int = attr.ib()
+    kind: str = attr.ib()
+    """di, do, ai или ao"""
+    no: int = attr.ib()
+    time: float = attr.ib()
+    value: Any = attr.ib()
+    status: Optional[int] = attr.ib(default=None)
+
+
+class _Segment:
+    def __init__(self, path: str, start: float, duration: float, block: int, flags: int) -> None:
+        self.path: str = path
+        self.start: float = start
+        self.end: float = start + duration
+        self.block: int = block
+        new = not os.path.exists(path)
+        self.data = open(path, 'ab')
+        self.index = open(path[:-4] + '.idx', 'ab')
+        if new:
+            self.data.write(_SEGMENT.pack(MAGIC, VERSION, _RECORD.size, block, flags, start, duration))
+            self.records = 0
+        else:
+            self.records = (os.path.getsize(path) - _SEGMENT_SIZE) // _RECORD.size
+        self.lowest: float = float('inf')
+        self.highest: float = float('-inf')
+        """Наименьшее и наибольшее время записей незаполненного блока"""
+
+        partial = self.records % block
+        if partial:
+            with open(path, 'rb') as file:
+                file.seek(_SEGMENT_SIZE + (self.records - partial) * _RECORD.size)
+                for record in _RECORD.iter_unpack(file.read(partial * _RECORD.size)):
+                    self.lowest = min(self.lowest, record[5])
+                    self.highest = max(self.highest, record[5])
+
+    def append(self, records: List[_Record]) -> None:
+        for record in records:
+            self.data.write(_RECORD.pack(*record))
+            self.lowest = min(self.lowest, record[5])
+            self.highest = max(self.highest, record[5])
+            self.records += 1
+            if self.records % self.block == 0:
+                self.index.write(_INDEX.pack(self.lowest, self.highest))
+                self.lowest, self.highest = float('inf'), float('-inf')
+
+    def flush(self) -> None:
+        self.data.flush()
+        self.index.flush()
+
+    def close(self) -> None:
+        self.data.close()
+        self.index.close()
+
+
+class Historian:
+    def __init__(self, path: str, segment_duration: float = 3600.0, block: int = 1024, flush_interval: float = 1.0,
+                 changes_only: bool = False) -> None:
+        """
+        Архив значений каналов: обновления дописываются записями постоянной длины (24 байта) в файлы сегментов.
+        У каждого сегмента есть индекс по времени: наименьшее и наибольшее время каждого блока записей,
+        поэтому запросы HistorianReader читают только нужные блоки.
+
+        :param path: Каталог архива
+        :param segment_duration: Длительность сегмента, секунды
+        :param block: Число записей в блоке индекса
+        :param flush_interval: Период сброса буферов на диск, секунды
+        :param changes_only: Записывать только изменившиеся значения
+        """
+        self.path: str = path
+        self.segment_duration: float = segment_duration
+        self.block: int = block
+        self.flush_interval: float = flush_interval
+        self.changes_only: bool = changes_only
+
+        os.makedirs(path, exist_ok=True)
+        self._devices: Dict[str, int] = _load_devices(path)
+        self._segment: Optional[_Segment] = None
+        self._flushed: float = monotonic()
+        self._last: Dict[_Key, _Record] = {}
+
+        self.records: int = 0
+        """Число записанных записей"""
+
+    def _device(self, host: str) -> int:
+        device = self._devices.get(host)
+        if device is None:
+            if len(self._devices) > 0xFFFF:
+                raise HistorianError(f'No device id left for {host}')
+            device = self._devices[host] = len(self._devices)
+            temporary = os.path.join(self.path, 'devices.json.tmp')
+            with open(temporary, 'w') as file:
+                json.dump(self._devices, file)
+            os.replace(temporary, os.path.join(self.path, 'devices.json'))
+        return device
+
+    def _segment_for(self, timestamp: float) -> _Segment:
+        segment = self._segment
+        if segment is None or timestamp >= segment.end:
+            if segment is not None:
+                segment.close()
+            start = timestamp // self.segment_duration * self.segment_duration
+            segment = self._segment = _Segment(os.path.join(self.path, f'{int(start * 1000):016d}.seg'), start,
+                                               self.segment_duration, self.block,
+                                               CHANGES_ONLY if self.changes_only else 0)
+            if self.changes_only and segment.records == 0 and self._last:
+                segment.append(list(self._last.values()))
+                self.records += len(self._last)
+        return segment
+
+    def append(self, snapshot: Snapshot) -> int:
+        """
+        Записать снимок, снимки недоступного устройства пропускаются.
+        :return: Число записанных записей
+        """
+        if snapshot.stale:
+            return 0
+        device = self._device(snapshot.host)
+        records = []
+        for module in snapshot.modules:
+            timestamp = module.timestamp.time if module.timestamp is not None else snapshot.time
+            for channel in module.channels:
+                kind = KINDS.index(channel.kind)
+                value = float('nan') if channel.value is None else float(channel.value)
+                status = -1 if channel.status is None else int(channel.status)
+                record = (device, module.slot, kind, channel.no, status, timestamp, value)
+                if self.changes_only:
+                    key = record[:4]
+                    previous = self._last.get(key)
+                    if previous is not None and previous[4] == status and \
+                            (previous[6] == value or previous[6] != previous[6] and value != value):
+                        continue
+                    self._last[key] = record
+                records.append(record)
+
+        if records:
+            self._segment_for(snapshot.time).append(records)
+            self.records += len(records)
+        if monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+        return len(records)
+
+    async def follow(self, device: 'Device', interval: float = 1.0) -> None:
+        """
+        Записывать снимки устройства из общего потока до отмены задачи.
+        """
+        subscription = device.stream(interval, policy=LATEST)
+        try:
+            async for snapshot in subscription:
+                self.append(snapshot)
+        finally:
+            subscription.close()
+
+    def flush(self) -> None:
+        if self._segment is not None:
+            self._segment.flush()
+        self._flushed = monotonic()
+
+    def close(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+class _Mapped:
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.size: int = 0
+        self.map: Optional[mmap.mmap] = None
+        self.start: float = 0.0
+        self.block: int = 0
+        self.flags: int = 0
+        self.index: List[Tuple[float, float]] = []
+
+    def refresh(self) -> int:
+        """
+        Отобразить файл заново, если он вырос. :return: Число полных записей
+        """
+        size = os.path.getsize(self.path)
+        if size != self.size or self.map is None:
+            if self.map is not None:
+                self.map.close()
+            with open(self.path, 'rb') as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = size
+            magic, version, record, self.block, self.flags, self.start, _ = _SEGMENT.unpack_from(self.map, 0)
+            if magic != MAGIC or version != VERSION or record != _RECORD.size:
+                raise HistorianError(f'{self.path} is not an iolib historian segment')
+            with open(self.path[:-4] + '.idx', 'rb') as file:
+                data = file.read()
+            self.index = list(_INDEX.iter_unpack(data[:len(data) // _INDEX.size * _INDEX.size]))
+        return (self.size - _SEGMENT_SIZE) // _RECORD.size
+
+    def blocks(self, start: float, end: float, reverse: bool = False) -> List[Tuple[int, int, float]]:
+        """
+        Блоки, время записей которых пересекается с [start, end]: первая и последняя запись, наибольшее время.
+        Незаполненный блок выдается всегда.
+        """
+        records = self.refresh()
+        ranges = []
+        for number, (lowest, highest) in enumerate(self.index[:records // self.block]):
+            if highest >= start and lowest <= end:
+                ranges.append((number * self.block, (number + 1) * self.block, highest))
+        tail = min(len(self.index), records // self.block) * self.block
+        if tail < records:
+            ranges.append((tail, records, float('inf')))
+        return ranges[::-1] if reverse else ranges
+
+    def records(self, first: int, last: int) -> Iterator[_Record]:
+        return _RECORD.iter_unpack(self.map[_SEGMENT_SIZE + first * _RECORD.size:_SEGMENT_SIZE + last * _RECORD.size])
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class HistorianReader:
+    def __init__(self, path: str) -> None:
+        """
+        Запросы к архиву Historian без загрузки файлов целиком: сегменты отображаются в память,
+        по индексу читаются только блоки нужного интервала. Можно использовать одновременно с записью.
+
+            reader = HistorianReader('/var/lib/iolib/history')
+            for sample in reader.range('http://192.168.127.254', start, end, slot=3, kind='ai', no=0):
+                print(sample.time, sample.value)
+        """
+        self.path: str = path
+        self._segments: Dict[str, _Mapped] = {}
+        self._devices: Dict[str, int] = {}
+        self._hosts: Dict[int, str] = {}
+
+    def devices(self) -> List[str]:
+        self._devices = _load_devices(self.path)
+        self._hosts = {device: host for host, device in self._devices.items()}
+        return list(self._devices)
+
+    def _device(self, host: str) -> int:
+        if host not in self._devices:
+            self.devices()
+        if host not in self._devices:
+            raise KeyError(f'{host} is not in {self.path}')
+        return self._devices[host]
+
+    def _host(self, device: int) -> str:
+        if device not in self._hosts:
+            self.devices()
+        return self._hosts.get(device, str(device))
+
+    def _candidates(self, start: float, end: float) -> List[_Mapped]:
+        """
+        Сегменты, которые могут содержать записи из [start, end]. Запоздавшие записи попадают в следующий
+        сегмент, поэтому следующий за интервалом сегмент тоже проверяется.
+        """
+        names = sorted(name for name in os.listdir(self.path) if name.endswith('.seg'))
+        starts = [int(name[:-4]) / 1000 for name in names]
+        selected = []
+        for number, name in enumerate(names):
+            following = starts[number + 1] if number + 1 < len(starts) else float('inf')
+            previous = starts[number - 1] if number > 0 else float('-inf')
+            if following > start and previous <= end:
+                segment = self._segments.get(name)
+                if segment is None:
+                    segment = self._segments[name] = _Mapped(os.path.join(self.path, name))
+                selected.append(segment)
+        return selected
+
+    def _filter(self, host: Optional[str], slot: Optional[int], kind: Optional[str], no: Optional[int]):
+        device = self._device(host) if host is not None else None
+        code = KINDS.index(kind) if kind is not None else None
+
+        def matches(record: _Record) -> bool:
+            return (device is None or record[0] == device) and (slot is None or record[1] == slot) and \
+                (code is None or record[2] == code) and (no is None or record[3] == no)
+        return matches
+
+    def _sample(self, record: _Record) -> Sample:
+        device, slot, kind, no, status, timestamp, value = record
+        return Sample(self._host(device), slot, KINDS[kind], no, timestamp, _value(kind, value),
+                      None if status < 0 else status)
+
+    def range(self, host: Optional[str], start: float, end: float, slot: Optional[int] = None,
+              kind: Optional[str] = None, no: Optional[int] = None) -> Iterator[Sample]:
+        """
+        Записи с временем из [start, end] в порядке записи.
+
+        :param host: Адрес устройства, None - все устройства
+        """
+        matches = self._filter(host, slot, kind, no)
+        for segment in self._candidates(start, end):
+            for first, last, _ in segment.blocks(start, end):
+                for record in segment.records(first, last):
+                    if start <= record[5] <= end and matches(record):
+                        yield self._sample(record)
+
+    def last(self, host: str, slot: int, kind: str, no: int, before: Optional[float] = None) -> Optional[Sample]:
+        """
+        Последнее значение канала не позже before.
+        """
+        samples = self.last_values(host, before, slot, kind, no)
+        return samples[0] if samples else None
+
+    def last_values(self, host: str, before: Optional[float] = None, slot: Optional[int] = None,
+                    kind: Optional[str] = None, no: Optional[int] = None) -> List[Sample]:
+        """
+        Последние значения каналов устройства не позже before. Блоки читаются с конца: пока найденные значения
+        могут быть заменены более новыми, а для архива изменений - до начала сегмента с последними значениями.
+        """
+        before = float('inf') if before is None else before
+        matches = self._filter(host, slot, kind, no)
+        single = slot is not None and kind is not None and no is not None
+        found: Dict[Tuple[int, int, int], _Record] = {}
+        oldest = float('inf')
+        """Наименьшее время среди найденных значений: блоки с меньшим наибольшим временем не нужны"""
+        for segment in reversed(self._candidates(float('-inf'), before)):
+            for first, last, highest in segment.blocks(float('-inf'), before, reverse=True):
+                complete = single or not segment.flags & CHANGES_ONLY
+                if found and complete and highest < oldest:
+                    break
+                for record in segment.records(first, last):
+                    if record[5] <= before and matches(record):
+                        key = record[1:4]
+                        if key not in found or found[key][5] <= record[5]:
+                            found[key] = record
+                if found:
+                    oldest = min(record[5] for record in found.values())
+            if found:
+                break
+        return [self._sample(record) for _, record in sorted(found.items())]
+
+    def close(self) -> None:
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
+
+
+def _load_devices(path: str) -> Dict[str, int]:
+    try:
+        with open(os.path.join(path, 'devices.json')) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def _value(kind: int, value: float) -> Any:
+    if value != value:
+        return None
+    if kind == 1:
+        return bool(value)
+    if kind == 0:
+        return int(value)
+    return value
@@ -0,0 +1,140 @@
+import heapq
+import asyncio
+import logging
+
+from time import monotonic
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WRITE_PRIORITY = 0
+READ_PRIORITY = 1
+"""Меньшее значение обслуживается раньше"""
+
+
+class LimiterSlot:
+    def __init__(self, limiter: 'AimdLimiter') -> None:
+        self._limiter: 'AimdLimiter' = limiter
+        self.started: float = monotonic()
+        self._released: bool = False
+
+    def release(self, overloaded: bool = False) -> None:
+        """
+        Завершить запрос.
+        :param overloaded: Признак перегрузки устройства: таймаут, ответ 5xx
+        """
+        if not self._released:
+            self._released = True
+            self._limiter._release(self, overloaded)
+
+
+class AimdLimiter:
+    def __init__(self, initial: int = 2, minimum: int = 1, maximum: int = 16, decrease: float = 0.5,
+                 tolerance: float = 3.0, spike: float = 0.05, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Ограничение числа одновременных запросов к устройству (AIMD, как окно TCP).
+        Предел растет на 1 после каждого окна успешных запросов и умножается на decrease
+        при таймауте, ответе 5xx или росте задержки выше tolerance * базовая задержка.
+        Ожидающие запросы обслуживаются по приоритету: запись раньше чтения.
+
+        :param initial: Начальный предел
+        :param minimum: Наименьший предел
+        :param maximum: Наибольший предел
+        :param decrease: Множитель уменьшения предела
+        :param tolerance: Во сколько раз задержка может превысить базовую без уменьшения предела
+        :param spike: Наименьший рост задержки над базовой в секундах, считающийся перегрузкой
+        :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        """
+        self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
+        self.minimum: int = minimum
+        self.maximum: int = maximum
+        self.decrease: float = decrease
+        self.tolerance: float = tolerance
+        self.spike: float = spike
+
+        self._limit: float = float(max(minimum, min(initial, maximum)))
+        self._inflight: int = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence: int = 0
+        self._successes: int = 0
+        """Успешные запросы с последнего изменения предела"""
+        self._decreased: float = 0.0
+        """Время последнего уменьшения, запросы начатые раньше не уменьшают предел повторно"""
+        self._baseline: Optional[float] = None
+        """Базовая задержка: минимум с медленным подъемом"""
+
+        self.increases: int = 0
+        self.decreases: int = 0
+        self.max_inflight: int = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def baseline(self) -> Optional[float]:
+        return self._baseline
+
+    async def acquire(self, priority: int = READ_PRIORITY) -> LimiterSlot:
+        if self._inflight < self.limit and not self._waiters:
+            return self._grant()
+
+        future = self.loop.create_future()
+        self._sequence += 1
+        heapq.heappush(self._waiters, (priority, self._sequence, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                future.result().release()
+            else:
+                self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+                heapq.heapify(self._waiters)
+            raise
+        return future.result()
+
+    def _grant(self) -> LimiterSlot:
+        self._inflight += 1
+        self.max_inflight = max(self.max_inflight, self._inflight)
+        return LimiterSlot(self)
+
+    def _release(self, slot: LimiterSlot, overloaded: bool) -> None:
+        self._inflight -= 1
+        latency = monotonic() - slot.started
+        if not overloaded and self._baseline is not None and \
+                latency > max(self._baseline * self.tolerance, self._baseline + self.spike):
+            overloaded = True
+
+        if overloaded:
+            if slot.started >= self._decreased:
+                self._limit = max(float(self.minimum), self._limit * self.decrease)
+                self._decreased = monotonic()
+                self._successes = 0
+                self.decreases += 1
+                logger.debug(f'Request limit decreased to {self.limit}')
+        else:
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                self._baseline += (latency - self._baseline) * 0.01
+            self._successes += 1
+            if self._successes >= self.limit and self._inflight + 1 >= self.limit and self._limit < self.maximum:
+                self._limit = min(float(self.maximum), self._limit + 1)
+                self._successes = 0
+                self.increases += 1
+
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._inflight < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(self._grant())
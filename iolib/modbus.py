@@ -0,0 +1,295 @@
+import attr
+import struct
+import asyncio
+import logging
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from .transport import Transport, READ, WRITE
+
+if TYPE_CHECKING:
+    from .moxa_io import Device, Module
+
+logger = logging.getLogger(__name__)
+
+READ_COILS = 0x01
+READ_DISCRETE_INPUTS = 0x02
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+WRITE_SINGLE_COIL = 0x05
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_COILS = 0x0F
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+MAX_READ_BITS = 2000
+MAX_READ_REGISTERS = 125
+
+
+class ModbusError(Exception):
+    def __init__(self, function: int, code: int) -> None:
+        super().__init__(f'Modbus exception {code} on function {function:#04x}')
+        self.function: int = function
+        self.code: int = code
+        """Код исключения Modbus: 1 - функция, 2 - адрес, 3 - значение, 4 - сбой устройства"""
+
+
+@attr.s(frozen=True, slots=True)
+class ModbusMap:
+    """
+    Таблица адресов Modbus TCP головного модуля (раздел настроек 4).
+    Адрес канала: <начало типа> + (slot - 1) * <шаг слота> + номер канала.
+    Значения по умолчанию - таблица iolib, на устройстве должна быть задана такая же.
+    """
+    di_start: int = attr.ib(default=0)
+    """Начало DI, discrete inputs (функция 2)"""
+    do_start: int = attr.ib(default=0)
+    """Начало DO, coils (функция 1)"""
+    ai_start: int = attr.ib(default=0)
+    """Начало AI, input registers (функция 4), float32 в двух регистрах"""
+    ao_start: int = attr.ib(default=0)
+    """Начало AO, holding registers (функция 3), float32 в двух регистрах"""
+    bit_stride: int = attr.ib(default=32)
+    """Шаг слота для дискретных каналов"""
+    register_stride: int = attr.ib(default=32)
+    """Шаг слота для аналоговых каналов, в регистрах"""
+
+    def di(self, slot: int, no: int = 0) -> int:
+        return self.di_start + (slot - 1) * self.bit_stride + no
+
+    def do(self, slot: int, no: int = 0) -> int:
+        return self.do_start + (slot - 1) * self.bit_stride + no
+
+    def ai(self, slot: int, no: int = 0) -> int:
+        return self.ai_start + (slot - 1) * self.register_stride + no * 2
+
+    def ao(self, slot: int, no: int = 0) -> int:
+        return self.ao_start + (slot - 1) * self.register_stride + no * 2
+
+
+def registers_to_floats(registers: Sequence[int]) -> List[float]:
+    data = struct.pack(f'>{len(registers)}H', *registers)
+    return list(struct.unpack(f'>{len(registers) // 2}f', data))
+
+
+def floats_to_registers(values: Sequence[float]) -> List[int]:
+    data = struct.pack(f'>{len(values)}f', *values)
+    return list(struct.unpack(f'>{len(values) * 2}H', data))
+
+
+class ModbusClient:
+    def __init__(self, host: str, port: int = 502, unit: int = 1, timeout: float = 3.0,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Клиент Modbus TCP с конвейерной передачей запросов.
+        Запросы отправляются без ожидания ответов на предыдущие, ответы сопоставляются по Transaction ID.
+
+        :param host: IP адрес устройства
+        :param port: Порт Modbus TCP
+        :param unit: Unit ID
+        :param timeout: Время ожидания ответа в секундах
+        :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        """
+        self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
+        self._host: str = host
+        self._port: int = port
+        self._unit: int = unit
+        self._timeout: float = timeout
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._receiver: Optional[asyncio.Task] = None
+        self._connecting: Optional[asyncio.Future] = None
+        self._transaction: int = 0
+        self._pending: Dict[int, asyncio.Future] = {}
+        """Ожидающие ответа запросы по Transaction ID"""
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self) -> None:
+        if self.connected:
+            return
+        if self._connecting is not None:
+            return await asyncio.shield(self._connecting)
+
+        self._connecting = self.loop.create_future()
+        try:
+            self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self._host, self._port), self._timeout)
+        except Exception as error:
+            self._connecting.set_exception(error)
+            self._connecting.exception()
+            raise
+        else:
+            self._receiver = self.loop.create_task(self._receive())
+            self._connecting.set_result(None)
+        finally:
+            self._connecting = None
+
+    async def close(self) -> None:
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending(ConnectionError('Connection closed'))
+
+    async def request(self, pdu: bytes) -> bytes:
+        """
+        Отправить PDU и дождаться ответа.
+        :return: PDU ответа, начиная с кода функции
+        """
+        await self.connect()
+
+        self._transaction = (self._transaction + 1) & 0xFFFF
+        transaction = self._transaction
+        future = self.loop.create_future()
+        self._pending[transaction] = future
+
+        self._writer.write(struct.pack('>HHHB', transaction, 0, len(pdu) + 1, self._unit) + pdu)
+        try:
+            response = await asyncio.wait_for(future, self._timeout)
+        finally:
+            self._pending.pop(transaction, None)
+
+        if response[0] & 0x80:
+            raise ModbusError(pdu[0], response[1])
+        return response
+
+    async def read_bits(self, function: int, address: int, count: int) -> List[bool]:
+        response = await self.request(struct.pack('>BHH', function, address, count))
+        return [bool(response[2 + i // 8] >> (i % 8) & 1) for i in range(count)]
+
+    async def read_registers(self, function: int, address: int, count: int) -> List[int]:
+        response = await self.request(struct.pack('>BHH', function, address, count))
+        return list(struct.unpack(f'>{count}H', response[2:2 + count * 2]))
+
+    async def read_coils(self, address: int, count: int) -> List[bool]:
+        return await self.read_bits(READ_COILS, address, count)
+
+    async def read_discrete_inputs(self, address: int, count: int) -> List[bool]:
+        return await self.read_bits(READ_DISCRETE_INPUTS, address, count)
+
+    async def read_holding_registers(self, address: int, count: int) -> List[int]:
+        return await self.read_registers(READ_HOLDING_REGISTERS, address, count)
+
+    async def read_input_registers(self, address: int, count: int) -> List[int]:
+        return await self.read_registers(READ_INPUT_REGISTERS, address, count)
+
+    async def write_coil(self, address: int, value: bool) -> None:
+        await self.request(struct.pack('>BHH', WRITE_SINGLE_COIL, address, 0xFF00 if value else 0x0000))
+
+    async def write_registers(self, address: int, values: Sequence[int]) -> None:
+        await self.request(struct.pack(f'>BHHB{len(values)}H', WRITE_MULTIPLE_REGISTERS, address, len(values),
+                                       len(values) * 2, *values))
+
+    async def _receive(self) -> None:
+        try:
+            while True:
+                header = await self._reader.readexactly(7)
+                transaction, _, length, _ = struct.unpack('>HHHB', header)
+                pdu = await self._reader.readexactly(length - 1)
+
+                future = self._pending.get(transaction)
+                if future is not None and not future.done():
+                    future.set_result(pdu)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            logger.debug(f'Modbus connection to {self._host}:{self._port} lost: {error}')
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._fail_pending(ConnectionError(f'Modbus connection to {self._host}:{self._port} lost'))
+
+    def _fail_pending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+
+class ModbusTransport(Transport):
+    """
+    Чтение и запись каналов по Modbus TCP. Состав модулей Modbus не передает,
+    поэтому discover выполняется другим транспортом, обычно HttpTransport.
+    """
+    name = 'modbus'
+    operations = (READ, WRITE)
+
+    def __init__(self, host: str, port: int = 502, unit: int = 1, address_map: Optional[ModbusMap] = None,
+                 timeout: float = 3.0, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        :param host: IP адрес устройства
+        :param port: Порт Modbus TCP
+        :param unit: Unit ID
+        :param address_map: Таблица адресов Modbus, должна совпадать с настройками устройства
+        :param timeout: Время ожидания ответа в секундах
+        :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        """
+        self._map: ModbusMap = address_map or ModbusMap()
+        self.client: ModbusClient = ModbusClient(host, port, unit, timeout, loop=loop)
+
+    @property
+    def address_map(self) -> ModbusMap:
+        return self._map
+
+    async def read(self, device: 'Device') -> None:
+        """
+        Обновить все модули. Запросы всех слотов передаются одновременно по одному соединению.
+        """
+        await asyncio.gather(*[self.read_slot(device, module) for module in device.modules])
+
+    async def read_slot(self, device: 'Device', module: 'Module') -> None:
+        """
+        Обновить модуль: по одному запросу на каждый тип каналов модуля.
+        """
+        from .moxa_io import DigitalInput, DigitalOutput, AnalogInput, AnalogOutput
+
+        groups = {kind: [io for io in module.ios if type(io) is kind]
+                  for kind in (DigitalInput, DigitalOutput, AnalogInput, AnalogOutput)}
+        reads = []
+
+        if groups[DigitalInput]:
+            reads.append(self._read_bits(READ_DISCRETE_INPUTS, self._map.di(module.slot), groups[DigitalInput]))
+        if groups[DigitalOutput]:
+            reads.append(self._read_bits(READ_COILS, self._map.do(module.slot), groups[DigitalOutput]))
+        if groups[AnalogInput]:
+            reads.append(self._read_floats(READ_INPUT_REGISTERS, self._map.ai(module.slot), groups[AnalogInput]))
+        if groups[AnalogOutput]:
+            reads.append(self._read_floats(READ_HOLDING_REGISTERS, self._map.ao(module.slot), groups[AnalogOutput]))
+
+        await asyncio.gather(*reads)
+
+    async def write(self, device: 'Device', values: List[Tuple[Any, Any]]) -> Optional[List[Any]]:
+        from .moxa_io import DigitalOutput, AnalogOutput
+
+        for channel, _ in values:
+            if not isinstance(channel, (DigitalOutput, AnalogOutput)):
+                raise TypeError(f'{type(channel).__name__} is read only')
+
+        writes = []
+        for channel, value in values:
+            slot = channel._module.slot
+            if isinstance(channel, DigitalOutput):
+                writes.append(self.client.write_coil(self._map.do(slot, channel.no), bool(value)))
+            elif isinstance(channel, AnalogOutput):
+                writes.append(self.client.write_registers(self._map.ao(slot, channel.no), floats_to_registers([float(value)])))
+        await asyncio.gather(*writes)
+        return None
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def _read_bits(self, function: int, start: int, channels: List) -> None:
+        count = max(channel.no for channel in channels) + 1
+        bits = await self.client.read_bits(function, start, count)
+        for channel in channels:
+            channel._status = int(bits[channel.no])
+
+    async def _read_floats(self, function: int, start: int, channels: List) -> None:
+        count = max(channel.no for channel in channels) + 1
+        values = registers_to_floats(await self.client.read_registers(function, start, count * 2))
+        for channel in channels:
+            channel._value = round(values[channel.no], 3)
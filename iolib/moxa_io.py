@@ -1,5 +1,6 @@
 import re
 import rsa
+import ssl
 import enum
 import attr
 import json
@@ -7,9 +8,24 @@ import hashlib
 import logging
 import aiohttp
 import asyncio
+import concurrent.futures
 
-from time import monotonic
-from typing import Any, List, Dict, Optional, Callable, Union, Tuple
+from time import monotonic, time
+from typing import Any, List, Dict, Optional, Callable, Union, Tuple, TYPE_CHECKING
+
+from .breaker import CircuitBreaker, DeviceUnavailableError, CLOSED
+from .cache import ResponseCache, CacheTier, consume_exception
+from .clock import ClockEstimator, ClockSample, Timestamp, parse_device_time
+from .edges import EdgeCapture
+from .limiter import AimdLimiter, READ_PRIORITY, WRITE_PRIORITY
+from .poll import Poller, PollGroup
+from .stream import DeviceStream, Subscription, Snapshot, DROP_OLDEST, take_snapshot
+from . import tls
+from .topology import TopologyEvent, ADDED, REMOVED, REPLACED
+from .transport import Transport, HttpTransport, DISCOVER, READ, WRITE, OPERATIONS
+
+if TYPE_CHECKING:
+    from .modbus import ModbusTransport, ModbusMap
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +73,10 @@ class ModuleType(enum.Enum):
 
 
 class Device:
-    def __init__(self, host: str, port: int, username: str, password: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    def __init__(self, host: str, port: int, username: str, password: str, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 transports: Optional[Dict[str, Transport]] = None, cache_tiers: Optional[List[CacheTier]] = None,
+                 https: bool = False, ssl_context: Optional[ssl.SSLContext] = None, pool_size: int = 4, pool: bool = True,
+                 limiter: Optional[AimdLimiter] = None, breaker: Optional[CircuitBreaker] = None, timeout: float = 5.0) -> None:
         """
         Создание виртуального представления Moxa ioThinx 4510.
 
@@ -66,6 +85,15 @@ class Device:
         :param username: Имя пользователя, должен иметь права Администратора или Оператора
         :param password: Пароль пользователя
         :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        :param transports: Транспорт для операций discover, read, write. По умолчанию все операции идут через Web API
+        :param cache_tiers: Уровни кэша ответов Web API, по умолчанию iolib.cache.DEFAULT_TIERS
+        :param https: Обращаться к Web API по HTTPS
+        :param ssl_context: SSL контекст, по умолчанию iolib.tls.ssl_context(host) без проверки сертификата
+        :param pool_size: Число соединений, открываемых заранее при HTTPS
+        :param pool: Сохранять соединения между запросами. False - новое соединение (и TLS рукопожатие) на каждый запрос
+        :param limiter: Ограничение одновременных запросов Web API, по умолчанию AimdLimiter()
+        :param breaker: Отслеживание доступности устройства, по умолчанию CircuitBreaker()
+        :param timeout: Таймаут запроса Web API, секунды
         """
         self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
         self._host: str = host
@@ -73,14 +101,42 @@ class Device:
         self._username: str = username
         self._password: str = password
 
-        self._https: bool = False
+        self._https: bool = https
         """Тип соединения для запросов: http или https."""
+        self._ssl_context: Optional[ssl.SSLContext] = (ssl_context or tls.ssl_context(host)) if https else None
+        self._pool_size: int = pool_size
+        self._pool: bool = pool
+        self._session: Optional[aiohttp.ClientSession] = None
+        """Общая сессия с пулом соединений, создается при первом запросе"""
+        self._limiter: AimdLimiter = limiter or AimdLimiter(loop=self.loop)
+        """Ограничение одновременных запросов, предотвращает перегрузку буфера устройства"""
+        self._breaker: CircuitBreaker = breaker or CircuitBreaker()
+        """Быстрый отказ запросов к недоступному устройству"""
+        self._timeout: float = timeout
         self._update_time: float = 0.3
         """Минимальное время обновления, предотвращает перегрузку буфира устройства."""
         self._lust_update: float = 0
         """Время последнего обновления."""
         self._jar: aiohttp.CookieJar = aiohttp.CookieJar(unsafe=True)
         """Cookie запись для хранения текущей сессий."""
+        self._cache: ResponseCache = ResponseCache(cache_tiers, loop=self.loop)
+        """Кэш ответов GET запросов"""
+        self._updating: Optional[asyncio.Future] = None
+        """Выполняющееся обновление, общее для одновременных вызовов update()"""
+        self._poller: Optional[Poller] = None
+        """Опрос слотов группами"""
+        self._streams: Optional[DeviceStream] = None
+        """Общий опрос для потоков снимков"""
+        self._edges: Optional[EdgeCapture] = None
+        """Фиксация фронтов DI"""
+        self._clock: ClockEstimator = ClockEstimator()
+        """Смещение часов устройства относительно хоста"""
+        self._timestamp: Optional[Timestamp] = None
+        """Время последнего полного обновления"""
+        self._unconfirmed: Dict[Any, None] = {}
+        """Выходы, записанные после последнего чтения, в порядке записи"""
+        self.write_mismatches: int = 0
+        """Число записей, не подтвержденных чтением: устройство сообщило другое значение"""
 
         self._name: Optional[str] = None
         """Имя устройства"""
@@ -101,6 +157,11 @@ class Device:
 
         self._module_list: List[Module] = []
         """Контейнер установленных модулей"""
+        self._topology_lock: asyncio.Lock = asyncio.Lock()
+        self._topology_listeners: List[Callable[[TopologyEvent], None]] = []
+        self._routes: Dict[str, Transport] = {operation: HttpTransport() for operation in OPERATIONS}
+        """Транспорт для каждой операции"""
+        self.route(**(transports or {}))
 
     @property
     def base_url(self) -> str:
@@ -110,126 +171,437 @@ class Device:
         """
         return f'{"https" if self._https else "http"}://{self._host}:{self._port}'
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Сессия Web API. Соединения (и TLS сессии) сохраняются между запросами, cookie авторизации общие.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=max(self._pool_size, self._limiter.maximum), ssl=self._ssl_context if self._https else False,
+                                             **({'keepalive_timeout': 30} if self._pool else {'force_close': True}))
+            self._session = aiohttp.ClientSession(cookie_jar=self._jar, connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self._timeout))
+        return self._session
+
+    async def warm_up(self, connections: Optional[int] = None) -> None:
+        """
+        Заранее открыть соединения пула, чтобы первые запросы опроса не ждали TCP и TLS рукопожатий.
+        """
+        if not self._pool:
+            return
+
+        async def open_connection() -> None:
+            async with self.session.get(f'{self.base_url}/') as response:
+                await response.read()
+
+        await asyncio.gather(*[open_connection() for _ in range(connections or self._pool_size)])
+
+    async def close(self) -> None:
+        """
+        Закрыть соединения и транспорты.
+        """
+        if self._streams is not None:
+            for subscription in list(self._streams.subscriptions):
+                subscription.close()
+        if self._poller is not None:
+            self._poller.stop()
+        for transport in set(self._routes.values()):
+            await transport.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def spawn(self, coroutine) -> Union[asyncio.Task, concurrent.futures.Future]:
+        """
+        Запустить корутину в цикле устройства. Из другого потока корутина передается потокобезопасно.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return self.loop.create_task(coroutine)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    @property
+    def limiter(self) -> AimdLimiter:
+        return self._limiter
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._breaker
+
+    @property
+    def available(self) -> bool:
+        return self._breaker.state == CLOSED
+
+    def snapshot(self) -> Snapshot:
+        """
+        Неизменяемая копия последнего известного состояния, stale если устройство недоступно.
+        """
+        return take_snapshot(self, stale=not self.available)
+
+    def _check_available(self) -> None:
+        """
+        Быстрый отказ, пока автомат разомкнут.
+        :raise DeviceUnavailableError: с последним известным состоянием
+        """
+        if self._breaker.blocked():
+            self._breaker.rejected += 1
+            raise DeviceUnavailableError(self.base_url, self._breaker.state, self._breaker.retry_in,
+                                         take_snapshot(self, stale=True))
+
+    @property
+    def cache(self) -> ResponseCache:
+        return self._cache
+
     async def get(self, api_urp: str, public_api: bool = False) -> Union[str, Dict[str, Any], List[Any]]:
-        async with aiohttp.ClientSession(cookie_jar=self._jar) as session:
-            headers = public_api if {'Accept': 'vdn.dac.v2', 'Content-Type': 'application/json'} else None
-            api_urp = api_urp.lstrip('/')
-            async with session.get(f'{self.base_url}/{api_urp}', headers=headers) as response:
-                if response.headers.get('Content-Type') == 'application/json':
-                    return json.loads(await response.text())
-                else:
-                    return await response.text()
+        """
+        GET запрос с кэшированием ответа по уровням iolib.cache.
+        """
+        return await self._cache.get(api_urp.lstrip('/'), lambda: self._get(api_urp, public_api))
+
+    async def _get(self, api_urp: str, public_api: bool = False) -> Union[str, Dict[str, Any], List[Any]]:
+        return await self._request('GET', api_urp, READ_PRIORITY, public_api=public_api)
 
     async def post(self, api_urp: str, data: Optional[Any] = None, public_api: bool = False) -> Union[str, Dict[str, Any], List[Any]]:
-        async with aiohttp.ClientSession(cookie_jar=self._jar) as session:
-            headers = public_api if {'Accept': 'vdn.dac.v2', 'Content-Type': 'application/json'} else None
-            api_urp = api_urp.lstrip('/')
-            async with session.post(f'{self.base_url}/{api_urp}', data=data, headers=headers) as response:
-                if response.headers.get('Content-Type') == 'application/json':
-                    return json.loads(await response.text())
-                else:
-                    return await response.text()
+        self._cache.invalidate()
+        return await self._request('POST', api_urp, WRITE_PRIORITY, data, public_api)
 
     async def put(self, api_urp: str, data: Optional[Any] = None, public_api: bool = False) -> Union[str, Dict[str, Any], List[Any]]:
-        async with aiohttp.ClientSession(cookie_jar=self._jar) as session:
-            headers = public_api if {'Accept': 'vdn.dac.v2', 'Content-Type': 'application/json'} else None
-            api_urp = api_urp.lstrip('/')
-            async with session.put(f'{self.base_url}/{api_urp}', data=data, headers=headers) as response:
+        self._cache.invalidate('io')
+        return await self._request('PUT', api_urp, WRITE_PRIORITY, data, public_api)
+
+    async def _request(self, method: str, api_urp: str, priority: int, data: Optional[Any] = None,
+                       public_api: bool = False) -> Union[str, Dict[str, Any], List[Any]]:
+        """
+        Запрос к Web API в пределах ограничения одновременных запросов.
+        Ошибки связи и таймауты учитываются автоматом доступности, при разомкнутом автомате запрос не отправляется.
+        """
+        headers = public_api if {'Accept': 'vdn.dac.v2', 'Content-Type': 'application/json'} else None
+        api_urp = api_urp.lstrip('/')
+        self._check_available()
+        slot = await self._limiter.acquire(priority)
+        try:
+            self._check_available()
+        except DeviceUnavailableError:
+            slot.release()
+            raise
+
+        probe = self._breaker.acquire()
+        options = {'timeout': aiohttp.ClientTimeout(total=probe)} if probe is not None else {}
+        overloaded = False
+        try:
+            async with self.session.request(method, f'{self.base_url}/{api_urp}', data=data, headers=headers, **options) as response:
+                overloaded = response.status >= 500
+                self._breaker.success()
                 if response.headers.get('Content-Type') == 'application/json':
                     return json.loads(await response.text())
                 else:
                     return await response.text()
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+            overloaded = True
+            self._breaker.failure()
+            raise
+        except BaseException:
+            # Отмена и прочие ошибки до ответа не говорят о доступности, но проба не должна остаться незавершенной
+            if probe is not None:
+                self._breaker.abort()
+            raise
+        finally:
+            slot.release(overloaded)
 
     async def _login(self) -> None:
-        async with aiohttp.ClientSession(cookie_jar=self._jar) as session:
-            async with session.get(self.base_url) as response:
-                if response.status == 404:
-                    raise Exception(
-                        f'The requested address was not found. URL: {self._https if "http" else "https"}://{self._host}:{self._port}/\n'
-                        f'{await response.text()}')
-
-            async with session.get(f'{self.base_url}/auth.js') as response:
-                find = re.findall(r'signin:function[\w\W]*r=\"([A-F,0-9]*)\"[\w\W]*n=\"(\d*)\"', await response.text())
-                n: int = int(find[0][0], base=16)
-                e: int = int(find[0][1], base=16)
-
-                if n is None or e is None:
-                    raise Exception('Failed to retrieve public key')
-
-            public_key = rsa.PublicKey(n=n, e=e)
-            data = json.dumps({'username': self._username, 'password': self._password})
-            data = rsa.encrypt(data.encode(), pub_key=public_key)
-            data_hash = hashlib.sha256(data)
-            data = data + data_hash.digest()
-
-            async with session.post(f'{self.base_url}/action/login', data=data) as response:
-                if response.status != 200:
-                    raise Exception(f'Failed to get authorization on the server, code: {response.status}\n'
-                                    f'{await response.text()}')
+        session = self.session
+        async with session.get(self.base_url) as response:
+            if response.status == 404:
+                raise Exception(
+                    f'The requested address was not found. URL: {self._https if "http" else "https"}://{self._host}:{self._port}/\n'
+                    f'{await response.text()}')
+
+        async with session.get(f'{self.base_url}/auth.js') as response:
+            find = re.findall(r'signin:function[\w\W]*r=\"([A-F,0-9]*)\"[\w\W]*n=\"(\d*)\"', await response.text())
+            n: int = int(find[0][0], base=16)
+            e: int = int(find[0][1], base=16)
+
+            if n is None or e is None:
+                raise Exception('Failed to retrieve public key')
+
+        public_key = rsa.PublicKey(n=n, e=e)
+        data = json.dumps({'username': self._username, 'password': self._password})
+        data = rsa.encrypt(data.encode(), pub_key=public_key)
+        data_hash = hashlib.sha256(data)
+        data = data + data_hash.digest()
+
+        async with session.post(f'{self.base_url}/action/login', data=data) as response:
+            if response.status != 200:
+                raise Exception(f'Failed to get authorization on the server, code: {response.status}\n'
+                                f'{await response.text()}')
 
     async def connect(self):
-        if not self._jar:
-            await self._login()
+        self._cache.invalidate()
+        if self._https:
+            await self.warm_up()
         await self._update(install=True)
 
+    def route(self, **transports: Transport) -> None:
+        """
+        Назначить транспорт операциям, например `device.route(read=ModbusTransport(host))`.
+        """
+        for operation, transport in transports.items():
+            if operation not in OPERATIONS:
+                raise KeyError(f'Unknown operation {operation}, expected one of {", ".join(OPERATIONS)}')
+            if operation not in transport.operations:
+                raise ValueError(f'{transport.name} transport does not support {operation}')
+            self._routes[operation] = transport
+
+    def transport(self, operation: str) -> Transport:
+        return self._routes[operation]
+
+    def use_modbus(self, port: int = 502, unit: int = 1, address_map: Optional['ModbusMap'] = None) -> 'ModbusTransport':
+        """
+        Обновлять состояние каналов по Modbus TCP: один запрос на тип каналов модуля,
+        запросы всех слотов передаются одновременно. Состав модулей по-прежнему читается по Web API в connect().
+
+        :param port: Порт Modbus TCP
+        :param unit: Unit ID
+        :param address_map: Таблица адресов Modbus, должна совпадать с настройками устройства
+        """
+        from .modbus import ModbusTransport
+        transport = ModbusTransport(self._host, port, unit, address_map, loop=self.loop)
+        self.route(read=transport)
+        return transport
+
     async def _update(self, install: bool = False) -> None:
-        dev_info = await self.get('/action/device')
-        self._name = dev_info[0]
-        self._module_num = dev_info[1]
-        self._version = dev_info[2]
-        self._serial_num = dev_info[3]
-        self._device_ip = dev_info[4]
-        self._device_mac = dev_info[5]
-        self._level = dev_info[6]
-        self._error = dev_info[7]
-
-        slot_info = await self.get('/action/slotinfo')
-        for module_info in slot_info['infos']:
-            module = Module(self, *module_info) if install else self._module_list[module_info[1]-1]
-
-            io_info = await self.get(f'/action/io/{module.direct}/{module.slot}')
-
-            if 'di' in io_info:
-                for di_info in io_info['di']:
-                    if install:
-                        module.ios.append(DigitalInput(self, module, *di_info))
-                    else:
-                        module.ios[di_info[0]]._update(*di_info)
-            if 'do' in io_info:
-                for do_info in io_info['do']:
-                    if install:
-                        module.ios.append(DigitalOutput(self, module, *do_info))
-                    else:
-                        module.ios[do_info[0]]._update(*do_info)
-            if 'ai' in io_info:
-                for ai_info in io_info['ai']:
-                    if install:
-                        module.ios.append(AnalogInput(self, module, *ai_info))
-                    else:
-                        module.ios[ai_info[0]]._update(*ai_info)
-            if 'ao' in io_info:
-                for ao_info in io_info['ao']:
-                    if install:
-                        module.ios.append(AnalogOutput(self, module, *ao_info))
-                    else:
-                        module.ios[ao_info[0]]._update(*ao_info)
-
-            self._module_list.append(module)
+        self._check_available()
+        sent = time()
+        started = monotonic()
+        if install:
+            await self._routes[DISCOVER].discover(self)
+        else:
+            await self._routes[READ].read(self)
+        self._timestamp = self._clock.stamp(sent, time())
+        for module in self._module_list:
+            module._timestamp = self._timestamp
+        self._confirm_writes(started)
+
+    def _apply_io(self, module: 'Module', io_info: Dict[str, List[Any]], install: bool = False) -> None:
+        """
+        Применить ответ /action/io к каналам модуля.
+        Каналы ищутся по типу и номеру, номера каналов отсчитываются отдельно для каждого типа.
+        Отсутствующие каналы создаются, существующие объекты каналов сохраняются.
+        """
+        channels = {} if install else {(type(io), io.no): io for io in module.ios}
+        for key, kind in (('di', DigitalInput), ('do', DigitalOutput), ('ai', AnalogInput), ('ao', AnalogOutput)):
+            for info in io_info.get(key, []):
+                channel = channels.get((kind, info[0]))
+                if channel is None:
+                    module.ios.append(kind(self, module, *info))
+                else:
+                    channel._update(*info)
+
+    async def refresh_topology(self) -> List[TopologyEvent]:
+        """
+        Прочитать состав модулей и привести модель к нему.
+        :return: Изменения состава модулей
+        """
+        transport = self._routes[DISCOVER]
+        return await self._reconcile(await transport.read_topology(self), transport)
+
+    async def _reconcile(self, slot_infos: List[List[Any]], transport: Transport) -> List[TopologyEvent]:
+        """
+        Сравнить состав модулей с моделью. Для слотов без изменений сохраняются объекты Module и каналов,
+        новые и замененные модули создаются заново, извлеченные удаляются.
+        """
+        async with self._topology_lock:
+            current = {module.slot: module for module in self._module_list}
+            modules = []
+            events = []
+
+            for module_info in slot_infos:
+                slot = module_info[1]
+                previous = current.pop(slot, None)
+                if previous is not None and previous._type == module_info[2] and previous._serial == module_info[5]:
+                    previous._update(*module_info)
+                    modules.append(previous)
+                    continue
+
+                module = Module(self, *module_info)
+                await transport.install_slot(self, module)
+                modules.append(module)
+                events.append(TopologyEvent(ADDED if previous is None else REPLACED, slot, module, previous))
+
+            for previous in current.values():
+                events.append(TopologyEvent(REMOVED, previous.slot, None, previous))
+
+            self._module_list = sorted(modules, key=lambda module: module.slot)
+            self._module_num = len(modules)
+
+        for event in events:
+            logger.info(f'{self.base_url}: slot {event.slot} {event.kind}')
+            for listener in list(self._topology_listeners):
+                try:
+                    listener(event)
+                except Exception:
+                    logger.exception(f'Topology listener failed for {self.base_url}')
+        return events
+
+    def add_topology_listener(self, callback: Callable[[TopologyEvent], None]) -> Callable[[], None]:
+        """
+        Подписаться на изменения состава модулей. Возвращает функцию отписки.
+        """
+        self._topology_listeners.append(callback)
+        return lambda: self._topology_listeners.remove(callback)
+
+    async def update_module(self, module: 'Module') -> None:
+        """
+        Обновить состояние каналов одного модуля, без запроса информации об устройстве и слотах.
+        """
+        self._check_available()
+        sent = time()
+        started = monotonic()
+        await self._routes[READ].read_slot(self, module)
+        module._timestamp = self._clock.stamp(sent, time())
+        self._confirm_writes(started, module)
+
+    @property
+    def clock(self) -> ClockEstimator:
+        return self._clock
+
+    @property
+    def timestamp(self) -> Optional[Timestamp]:
+        """
+        Время последнего полного обновления с погрешностью.
+        """
+        return self._timestamp
+
+    async def sync_clock(self) -> ClockSample:
+        """
+        Один обмен /action/time для оценки смещения часов устройства.
+        """
+        sent = time()
+        device_time = await self.get('/action/time')
+        sample = ClockSample(sent, time(), parse_device_time(device_time))
+        self._clock.add(sample)
+        return sample
+
+    async def write(self, values: List[Tuple[Any, Any]]) -> None:
+        """
+        Записать значения выходов одной операцией транспорта. После успешной записи состояние каналов
+        сразу принимает записанные значения (или значения из ответа устройства) с признаком unconfirmed
+        до первого чтения, начатого после записи.
+
+        :param values: Пары (канал, значение): DigitalOutput - bool, AnalogOutput - float
+        """
+        self._check_available()
+        accepted = await self._routes[WRITE].write(self, values)
+        completed = monotonic()
+        for (channel, value), reported in zip(values, accepted or [None] * len(values)):
+            channel._write_through(value if reported is None else reported, completed)
+            self._unconfirmed.pop(channel, None)
+            self._unconfirmed[channel] = None
+
+    def _confirm_writes(self, started: float, module: Optional['Module'] = None) -> None:
+        """
+        Сверить записанные выходы с прочитанными значениями. Чтение, начатое до завершения записи,
+        могло вернуть старое значение - тогда восстанавливается записанное.
+        """
+        for channel in list(self._unconfirmed):
+            if module is not None and channel._module is not module:
+                continue
+            value, completed = channel._written
+            if completed > started:
+                channel._write_through(value, completed)
+                continue
+            del self._unconfirmed[channel]
+            channel._written = None
+            if not channel._matches(value):
+                self.write_mismatches += 1
+                logger.warning(f'{self.base_url}: {channel.name} written {value}, device reports '
+                               f'{channel.status if isinstance(channel, DigitalOutput) else channel.value}')
+
+    @property
+    def poller(self) -> Poller:
+        if self._poller is None:
+            self._poller = Poller(self)
+        return self._poller
+
+    def set_poll_groups(self, groups: List[PollGroup], default_interval: float = 1.0) -> Poller:
+        """
+        Задать группы опроса для poll().
+
+        :param groups: Группы опроса, модуль относится к первой подходящей группе
+        :param default_interval: Период опроса модулей, не попавших ни в одну группу
+        """
+        if self._poller is not None:
+            self._poller.stop()
+        self._poller = Poller(self, groups, default_interval)
+        return self._poller
+
+    async def poll(self) -> List['Module']:
+        """
+        Опросить только слоты, срок опроса которых наступил по группам опроса.
+        :return: Успешно опрошенные модули
+        """
+        return await self.poller.poll()
+
+    @property
+    def edges(self) -> EdgeCapture:
+        """
+        Фиксация фронтов DI: `await device.edges.poll()`, затем `device.edges.read(channel)`.
+        """
+        if self._edges is None:
+            self._edges = EdgeCapture(self)
+        return self._edges
+
+    @property
+    def streams(self) -> DeviceStream:
+        if self._streams is None:
+            self._streams = DeviceStream(self)
+        return self._streams
+
+    def stream(self, interval: float = 1.0, maxsize: int = 16, policy: str = DROP_OLDEST) -> Subscription:
+        """
+        Поток неизменяемых снимков состояния: `async for snapshot in device.stream(0.5)`.
+        Все потоки устройства используют один опрос, у каждого потребителя свой буфер.
+
+        :param interval: Период снимков для этого потребителя, секунды
+        :param maxsize: Размер буфера потребителя
+        :param policy: Поведение при полном буфере: DROP_OLDEST, LATEST или BLOCK (iolib.stream)
+        """
+        return self.streams.subscribe(Subscription(interval, maxsize, policy, loop=self.loop))
 
     async def update(self, ) -> None:
-        time = monotonic() - self._lust_update
-        if time > self._update_time:
+        """
+        Обновить состояние не чаще _update_time. Одновременные вызовы ожидают одно общее обновление.
+        """
+        if self._updating is None:
+            time = monotonic() - self._lust_update
+            if time <= self._update_time:
+                return
+            self._updating = self.loop.create_task(self._shared_update())
+            self._updating.add_done_callback(consume_exception)
+        await asyncio.shield(self._updating)
+
+    async def _shared_update(self) -> None:
+        """
+        Общее обновление отдельной задачей: отмена вызвавшего update() не оставляет остальных ожидающих без результата.
+        """
+        try:
             await self._update()
             self._lust_update = monotonic()
-        else:
-            return
+        finally:
+            self._updating = None
 
     def __getitem__(self, key: Union[int, str]) -> Optional['Module']:
+        """
+        Модуль по номеру слота, отсчитываемому от 0, или по имени.
+        """
         if type(key) is int:
-            if key < len(self._module_list):
-                return self._module_list[key]
-            else:
-                return None
+            for module in self._module_list:
+                if module.slot == key + 1:
+                    return module
+            return None
         elif type(key) is str:
             for module in self._module_list:
                 if module.name == key:
@@ -345,6 +717,8 @@ class DigitalOutput:
         self._off_width: Optional[int] = off_width
         self._value: Optional[int] = value
         self._status: Optional[int] = status
+        self._written: Optional[Tuple[bool, float]] = None
+        """Записанное значение и время завершения записи, пока запись не подтверждена чтением"""
 
     def _update(self, no: int, name: str, mode: int, on_width: int, off_width: int, value: int, status: int) -> None:
         self._no = no
@@ -385,9 +759,24 @@ class DigitalOutput:
 
     @status.setter
     def status(self, value: bool) -> None:
-        async def set_status():
-            await self._device.put(f'/action/io/do/doStatus/{self._module.direct}/{self._module.slot}/{self.no}', data=f'[{1 if value else 0}]')
-        self._device.loop.create_task(set_status())
+        self._device.spawn(self.set_status(value))
+
+    @property
+    def unconfirmed(self) -> bool:
+        """
+        Состояние записано, но еще не подтверждено чтением.
+        """
+        return self._written is not None
+
+    async def set_status(self, value: bool) -> None:
+        await self._device.write([(self, value)])
+
+    def _write_through(self, value: Any, completed: float) -> None:
+        self._status = int(bool(value))
+        self._written = (bool(value), completed)
+
+    def _matches(self, value: bool) -> bool:
+        return bool(self._status) == value
 
 
 class AnalogInput:
@@ -475,6 +864,8 @@ class AnalogOutput:
         self._value: Optional[float] = value
         self._status: Optional[int] = status
         self._unit: Optional[str] = unit
+        self._written: Optional[Tuple[float, float]] = None
+        """Записанное значение и время завершения записи, пока запись не подтверждена чтением"""
 
     def _update(self, no: int, name: str, mode: int, range_min: float, range_max: float, value: float, status: int, unit: str) -> None:
         self._no = no
@@ -512,9 +903,24 @@ class AnalogOutput:
 
     @value.setter
     def value(self, value: float) -> None:
-        async def set_value():
-            await self._device.put(f'/action/io/ao/aoValueScaled/{self._module.direct}/{self._module.slot}/{self.no}', data=f'[{value}]')
-        self._device.loop.create_task(set_value())
+        self._device.spawn(self.set_value(value))
+
+    @property
+    def unconfirmed(self) -> bool:
+        """
+        Значение записано, но еще не подтверждено чтением.
+        """
+        return self._written is not None
+
+    async def set_value(self, value: float) -> None:
+        await self._device.write([(self, value)])
+
+    def _write_through(self, value: Any, completed: float) -> None:
+        self._value = float(value)
+        self._written = (float(value), completed)
+
+    def _matches(self, value: float) -> bool:
+        return self._value is not None and abs(self._value - value) < 1e-3
 
     @property
     def status(self) -> int:
@@ -540,6 +946,18 @@ class Module:
         self._status: Optional[int] = status
 
         self._io: List[Union[DigitalInput, DigitalOutput, AnalogInput, AnalogOutput]] = []
+        self._timestamp: Optional[Timestamp] = None
+        """Время последнего обновления каналов"""
+
+    def _update(self, direct: int, slot: int, type: int, name: str, version: str, serial: str, locating: int, status: int) -> None:
+        self._direct = direct
+        self._slot = slot
+        self._type = type
+        self._name = name
+        self._version = version
+        self._serial = serial
+        self._locating = locating
+        self._status = status
 
     async def locate(self, on: bool) -> None:
         await self._device.put(f'/action/locate/{self._direct}/{self._slot}', [1 if on else 0])
@@ -562,6 +980,10 @@ class Module:
     def ios(self) -> List[Union[DigitalInput, DigitalOutput, AnalogInput, AnalogOutput]]:
         return self._io
 
+    @property
+    def timestamp(self) -> Optional[Timestamp]:
+        return self._timestamp
+
     @property
     def direct(self) -> int:
         return self._direct
@@ -0,0 +1,169 @@
+import attr
+import asyncio
+import logging
+
+from time import monotonic
+from typing import Dict, FrozenSet, List, Optional, TYPE_CHECKING
+
+from .breaker import DeviceUnavailableError
+from .transport import DISCOVER
+
+if TYPE_CHECKING:
+    from .moxa_io import Device, Module
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(frozen=True, slots=True)
+class PollGroup:
+    name: str = attr.ib()
+    interval: float = attr.ib()
+    """Период опроса в секундах"""
+    types: FrozenSet[int] = attr.ib(default=frozenset(),
+                                    converter=lambda types: frozenset(getattr(type, 'value', type) for type in types))
+    """Типы модулей группы, ModuleType или его значение"""
+    slots: FrozenSet[int] = attr.ib(default=frozenset(), converter=frozenset)
+    """Номера слотов группы, имеют приоритет перед типами"""
+    info: bool = attr.ib(default=False)
+    """Группа опрашивает информацию о головном модуле, состав модулей и часы устройства, а не слоты"""
+
+    def matches(self, module: 'Module') -> bool:
+        return module.slot in self.slots or (not self.slots and getattr(module.type, 'value', module.type) in self.types)
+
+
+def default_groups() -> List[PollGroup]:
+    """
+    Группы по умолчанию: дискретные модули - 100 мс, аналоговые - 1 с, температура - 10 с,
+    головной модуль, состав модулей и часы устройства - 60 с.
+    """
+    from .moxa_io import ModuleType
+
+    return [
+        PollGroup('digital', 0.1, [ModuleType.MODULE_45MR_1600, ModuleType.MODULE_45MR_1601, ModuleType.MODULE_45MR_2600,
+                                   ModuleType.MODULE_45MR_2601, ModuleType.MODULE_45MR_2606, ModuleType.MODULE_45MR_2404]),
+        PollGroup('analog', 1.0, [ModuleType.MODULE_45MR_3800, ModuleType.MODULE_45MR_3810, ModuleType.MODULE_45MR_4420]),
+        PollGroup('temperature', 10.0, [ModuleType.MODULE_45MR_6600, ModuleType.MODULE_45MR_6810]),
+        PollGroup('device', 60.0, info=True),
+    ]
+
+
+class Poller:
+    def __init__(self, device: 'Device', groups: Optional[List[PollGroup]] = None, default_interval: float = 1.0,
+                 retry_interval: float = 0.2) -> None:
+        """
+        Опрос слотов устройства группами с разными периодами. За один цикл читаются только слоты,
+        срок опроса которых наступил. Слот, который не удалось прочитать, повторяется через retry_interval,
+        удваивая паузу при повторных ошибках, но не реже периода своей группы.
+
+        :param device: Устройство
+        :param groups: Группы опроса, модуль относится к первой подходящей группе
+        :param default_interval: Период опроса модулей, не попавших ни в одну группу
+        :param retry_interval: Пауза перед первым повтором неудачного опроса, секунды
+        """
+        self._device: 'Device' = device
+        self._groups: List[PollGroup] = groups if groups is not None else default_groups()
+        self._default: PollGroup = PollGroup('default', default_interval)
+        self.retry_interval: float = retry_interval
+        self._due: Dict[int, float] = {}
+        """Время следующего опроса по номеру слота, 0 - головной модуль"""
+        self._failures: Dict[int, int] = {}
+        """Число ошибок подряд по номеру слота"""
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def groups(self) -> List[PollGroup]:
+        return self._groups
+
+    def group(self, module: 'Module') -> PollGroup:
+        for group in self._groups:
+            if not group.info and group.matches(module):
+                return group
+        return self._default
+
+    def next_due(self) -> float:
+        """
+        Время (monotonic) ближайшего опроса.
+        """
+        now = monotonic()
+        due = [self._due.get(module.slot, now) for module in self._device.modules]
+        if self._info_group() is not None:
+            due.append(self._due.get(0, now))
+        return min(due, default=now + self._default.interval)
+
+    async def poll(self) -> List['Module']:
+        """
+        Опросить слоты, срок опроса которых наступил. Запросы слотов выполняются одновременно.
+        :return: Успешно опрошенные модули
+        :raises DeviceUnavailableError: Устройство недоступно, неудачные слоты будут повторены после пробного запроса
+        """
+        now = monotonic()
+        due = [module for module in self._device.modules if self._due.get(module.slot, 0) <= now]
+        reads = [self._device.update_module(module) for module in due]
+
+        info = self._info_group()
+        info_due = info is not None and self._due.get(0, 0) <= now
+        if info_due:
+            reads.append(self._device.transport(DISCOVER).read_info(self._device))
+            reads.append(self._device.refresh_topology())
+            reads.append(self._device.sync_clock())
+
+        results = await asyncio.gather(*reads, return_exceptions=True)
+        unavailable: Optional[DeviceUnavailableError] = None
+        for result in results:
+            if isinstance(result, DeviceUnavailableError):
+                unavailable = result
+            elif isinstance(result, Exception):
+                logger.error(f'Poll error ({self._device.base_url}): {result}')
+
+        polled = []
+        for module, result in zip(due, results):
+            if self._schedule(module.slot, self.group(module).interval, now, result, unavailable):
+                polled.append(module)
+        if info_due:
+            error = next((result for result in results[len(due):] if isinstance(result, Exception)), None)
+            self._schedule(0, info.interval, now, error, unavailable)
+
+        if unavailable is not None:
+            raise unavailable
+        return polled
+
+    def _schedule(self, slot: int, interval: float, now: float, result: object,
+                  unavailable: Optional[DeviceUnavailableError]) -> bool:
+        """
+        Назначить следующий опрос слота по результату чтения.
+        :return: Чтение успешно
+        """
+        if not isinstance(result, Exception):
+            self._failures.pop(slot, None)
+            self._due[slot] = now + interval
+            return True
+        failures = self._failures[slot] = self._failures.get(slot, 0) + 1
+        delay = min(interval, self.retry_interval * 2 ** (failures - 1))
+        if unavailable is not None:
+            delay = max(delay, unavailable.retry_in)
+        self._due[slot] = now + delay
+        return False
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except DeviceUnavailableError as error:
+                logger.debug(f'Poll skipped: {error}')
+            await asyncio.sleep(max(0.0, self.next_due() - monotonic()))
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = self._device.loop.create_task(self.run())
+        return self._task
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _info_group(self) -> Optional[PollGroup]:
+        for group in self._groups:
+            if group.info:
+                return group
+        return None
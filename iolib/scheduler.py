@@ -0,0 +1,305 @@
+import asyncio
+import logging
+
+from collections import deque
+from time import monotonic
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .moxa_io import Device
+
+logger = logging.getLogger(__name__)
+
+_Step = Tuple[float, Any, Any]
+"""Время срабатывания (monotonic), канал, значение"""
+
+
+class Timer:
+    __slots__ = ('deadline', 'tick', 'channel', 'value', 'job')
+
+    def __init__(self, deadline: float, tick: int, channel: Any, value: Any, job: 'Job') -> None:
+        self.deadline: float = deadline
+        self.tick: int = tick
+        self.channel: Any = channel
+        self.value: Any = value
+        self.job: 'Job' = job
+
+
+class Job:
+    def __init__(self, scheduler: 'Scheduler', steps: Iterator[_Step]) -> None:
+        """
+        Последовательность записей одного задания. Следующий шаг ставится в колесо после срабатывания
+        предыдущего, поэтому бесконечные серии импульсов не занимают память.
+        """
+        self._scheduler: 'Scheduler' = scheduler
+        self._steps: Iterator[_Step] = steps
+        self.cancelled: bool = False
+        self.done: bool = False
+        self.fired: int = 0
+
+    def cancel(self) -> None:
+        """
+        Отменить оставшиеся шаги. Уже отправленные записи не отменяются.
+        """
+        self.cancelled = True
+        self.done = True
+
+    def _next(self) -> Optional[Timer]:
+        if self.cancelled:
+            return None
+        step = next(self._steps, None)
+        if step is None:
+            self.done = True
+            return None
+        return self._scheduler._timer(step[0], step[1], step[2], self)
+
+
+class TimerWheel:
+    def __init__(self, bits: int = 6, levels: int = 4) -> None:
+        """
+        Иерархическое колесо таймеров: levels уровней по 2**bits ячеек. Добавление и срабатывание - O(1),
+        таймер переходит на нижний уровень, когда до срабатывания остается меньше оборота этого уровня.
+        Таймеры дальше 2**(bits * levels) тиков хранятся отдельно до оборота верхнего уровня.
+        """
+        self._bits: int = bits
+        self._mask: int = (1 << bits) - 1
+        self._levels: int = levels
+        self._slots: List[List[List[Timer]]] = [[[] for _ in range(1 << bits)] for _ in range(levels)]
+        self._overflow: List[Timer] = []
+        self._expired: List[Timer] = []
+        self.current: int = 0
+        self.count: int = 0
+
+    def add(self, timer: Timer) -> None:
+        self.count += 1
+        self._place(timer)
+
+    def _place(self, timer: Timer) -> None:
+        if timer.tick <= self.current:
+            self._expired.append(timer)
+            return
+        for level in range(self._levels):
+            shift = self._bits * (level + 1)
+            if timer.tick >> shift == self.current >> shift:
+                self._slots[level][(timer.tick >> (self._bits * level)) & self._mask].append(timer)
+                return
+        self._overflow.append(timer)
+
+    def advance(self, tick: int) -> List[Timer]:
+        """
+        Повернуть колесо до тика tick включительно.
+        :return: Сработавшие таймеры в порядке тиков
+        """
+        due, self._expired = self._expired, []
+        while self.current < tick:
+            self.current += 1
+            current = self.current
+            if current & ((1 << (self._bits * self._levels)) - 1) == 0 and self._overflow:
+                overflow, self._overflow = self._overflow, []
+                for timer in overflow:
+                    self._place(timer)
+            for level in range(self._levels - 1, 0, -1):
+                if current & ((1 << (self._bits * level)) - 1) == 0:
+                    slot = self._slots[level][(current >> (self._bits * level)) & self._mask]
+                    if slot:
+                        cascade = slot[:]
+                        slot.clear()
+                        for timer in cascade:
+                            self._place(timer)
+            slot = self._slots[0][current & self._mask]
+            if slot:
+                due.extend(slot)
+                slot.clear()
+            if self._expired:
+                due.extend(self._expired)
+                self._expired = []
+        self.count -= len(due)
+        return due
+
+
+class Scheduler:
+    def __init__(self, tick: float = 0.01, history: int = 4096, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Клиентское расписание выходов: включение на время, серии импульсов DO и расписания уставок AO
+        для тысяч каналов в одном колесе таймеров. Записи, наступившие в одном тике, объединяются
+        в один вызов Device.write на устройство, записи одного устройства выполняются по порядку.
+
+            scheduler = Scheduler()
+            scheduler.start()
+            scheduler.pulse(device[1].ios[0], on=0.5, off=0.5, count=10)
+            scheduler.setpoints(device[3].ios[0], [(0, 4.0), (60, 12.0), (120, 4.0)])
+
+        :param tick: Шаг колеса, секунды. Точность срабатывания не лучше шага
+        :param history: Число последних опозданий для статистики
+        :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        """
+        self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
+        self.tick: float = tick
+        self._wheel: TimerWheel = TimerWheel()
+        self._origin: float = monotonic()
+        self._task: Optional[asyncio.Future] = None
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._queues: Dict['Device', Deque[List[Tuple[Any, Any]]]] = {}
+        self._writers: Dict['Device', asyncio.Future] = {}
+
+        self.fired: int = 0
+        """Число сработавших шагов"""
+        self.writes: int = 0
+        """Число вызовов Device.write"""
+        self.failures: int = 0
+        self.late: Deque[float] = deque(maxlen=history)
+        """Опоздания последних срабатываний относительно заданного времени, секунды"""
+        self.late_max: float = 0.0
+        self.drift_max: float = 0.0
+        """Наибольшее опоздание пробуждения цикла относительно границы тика"""
+
+    @property
+    def pending(self) -> int:
+        return self._wheel.count
+
+    @property
+    def late_mean(self) -> float:
+        return sum(self.late) / len(self.late) if self.late else 0.0
+
+    def late_percentile(self, percent: float) -> float:
+        if not self.late:
+            return 0.0
+        ordered = sorted(self.late)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def _timer(self, deadline: float, channel: Any, value: Any, job: 'Job') -> Timer:
+        tick = max(0, -int(-(deadline - self._origin) // self.tick))
+        return Timer(deadline, tick, channel, value, job)
+
+    def run(self, steps: Iterable[_Step]) -> Job:
+        """
+        Запланировать последовательность (время monotonic, канал, значение), времена не убывают.
+        """
+        job = Job(self, iter(steps))
+        timer = job._next()
+        if timer is not None:
+            self._add(timer)
+        return job
+
+    def _add(self, timer: Timer) -> None:
+        if not self._wheel.count:
+            self._wheel.current = max(self._wheel.current, int((monotonic() - self._origin) / self.tick))
+            """Пустое колесо не нужно поворачивать через пропущенные тики"""
+        self._wheel.add(timer)
+        self._wakeup.set()
+
+    def at(self, when: float, channel: Any, value: Any) -> Job:
+        """
+        Записать значение в момент when (monotonic).
+        """
+        return self.run([(when, channel, value)])
+
+    def after(self, delay: float, channel: Any, value: Any) -> Job:
+        return self.at(monotonic() + delay, channel, value)
+
+    def timed(self, channel: Any, duration: float, value: Any = True, rest: Any = False, delay: float = 0.0) -> Job:
+        """
+        Установить value на duration секунд, затем rest.
+        """
+        start = monotonic() + delay
+        return self.run([(start, channel, value), (start + duration, channel, rest)])
+
+    def pulse(self, channel: Any, on: float, off: Optional[float] = None, count: Optional[int] = 1,
+              delay: float = 0.0) -> Job:
+        """
+        Серия импульсов DO.
+
+        :param on: Длительность включенного состояния, секунды
+        :param off: Пауза между импульсами, по умолчанию равна on
+        :param count: Число импульсов, None - до отмены
+        :param delay: Задержка начала серии
+        """
+        return self.run(_pulses(monotonic() + delay, channel, on, on if off is None else off, count))
+
+    def setpoints(self, channel: Any, points: Iterable[Tuple[float, Any]], repeat: Optional[float] = None) -> Job:
+        """
+        Расписание уставок: пары (секунды от текущего момента, значение).
+
+        :param repeat: Период повторения расписания, секунды; None - выполнить один раз
+        """
+        return self.run(_setpoints(monotonic(), channel, list(points), repeat))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run(), loop=self.loop)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        writers = list(self._writers.values())
+        await asyncio.gather(*writers, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._wheel.count:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            boundary = self._origin + (self._wheel.current + 1) * self.tick
+            delay = boundary - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            now = monotonic()
+            self.drift_max = max(self.drift_max, now - boundary)
+            self._fire(self._wheel.advance(int((now - self._origin) / self.tick)), now)
+
+    def _fire(self, timers: List[Timer], now: float) -> None:
+        batches: Dict['Device', Dict[Any, Any]] = {}
+        for timer in timers:
+            job = timer.job
+            if job.cancelled:
+                continue
+            batches.setdefault(timer.channel._device, {})[timer.channel] = timer.value
+            job.fired += 1
+            self.fired += 1
+            lateness = now - timer.deadline
+            self.late.append(lateness)
+            self.late_max = max(self.late_max, lateness)
+            following = job._next()
+            if following is not None:
+                self._add(following)
+
+        for device, values in batches.items():
+            self._queues.setdefault(device, deque()).append(list(values.items()))
+            writer = self._writers.get(device)
+            if writer is None or writer.done():
+                self._writers[device] = asyncio.ensure_future(self._drain(device), loop=self.loop)
+
+    async def _drain(self, device: 'Device') -> None:
+        queue = self._queues[device]
+        while queue:
+            values = queue.popleft()
+            self.writes += 1
+            try:
+                await device.write(values)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self.failures += 1
+                logger.warning(f'Scheduled write failed ({device.base_url}): {error}')
+
+
+def _pulses(start: float, channel: Any, on: float, off: float, count: Optional[int]) -> Iterator[_Step]:
+    number = 0
+    while count is None or number < count:
+        when = start + number * (on + off)
+        yield when, channel, True
+        yield when + on, channel, False
+        number += 1
+
+
+def _setpoints(start: float, channel: Any, points: List[Tuple[float, Any]], repeat: Optional[float]) -> Iterator[_Step]:
+    points = sorted(points, key=lambda point: point[0])
+    cycle = 0
+    while True:
+        for offset, value in points:
+            yield start + cycle * (repeat or 0.0) + offset, channel, value
+        if repeat is None:
+            return
+        cycle += 1
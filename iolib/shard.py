@@ -0,0 +1,472 @@
+import os
+import attr
+import json
+import struct
+import asyncio
+import logging
+import multiprocessing
+
+from time import monotonic, process_time, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .stream import ChannelSnapshot, ModuleSnapshot, Snapshot
+
+logger = logging.getLogger(__name__)
+
+KINDS = ['di', 'do', 'ai', 'ao']
+"""Коды типов каналов в двоичных кадрах"""
+
+LAYOUT = 1
+"""Кадр состава модулей: JSON, отправляется при подключении и изменении состава"""
+VALUES = 2
+"""Кадр значений: все каналы (FULL) или только изменившиеся"""
+STATS = 3
+"""Кадр нагрузки процесса"""
+
+FULL = 1
+STALE = 2
+"""Флаги кадра значений"""
+
+_HEADER = struct.Struct('<BIIdBH')
+"""Тип, id устройства, номер снимка, время, флаги, число каналов"""
+_ENTRY = struct.Struct('<BBBdb')
+"""Слот, тип канала, номер канала, значение, состояние (-1 - нет)"""
+_STATS = struct.Struct('<BffH')
+"""Тип, загрузка процессора, отставание опроса, число устройств"""
+
+
+@attr.s(frozen=True, slots=True)
+class ChangeEvent:
+    device: int = attr.ib()
+    """Идентификатор устройства в ShardedPoller"""
+    host: str = attr.ib()
+    slot: int = attr.ib()
+    kind: str = attr.ib()
+    no: int = attr.ib()
+    value: Any = attr.ib()
+    previous: Any = attr.ib()
+
+
+def encode_values(device: int, sequence: int, timestamp: float, flags: int,
+                  entries: List[Tuple[int, int, int, float, int]]) -> bytes:
+    return _HEADER.pack(VALUES, device, sequence, timestamp, flags, len(entries)) + \
+        b''.join(_ENTRY.pack(*entry) for entry in entries)
+
+
+def decode_values(frame: bytes) -> Tuple[int, int, float, int, List[Tuple[int, int, int, float, int]]]:
+    _, device, sequence, timestamp, flags, count = _HEADER.unpack_from(frame)
+    entries = [_ENTRY.unpack_from(frame, _HEADER.size + number * _ENTRY.size) for number in range(count)]
+    return device, sequence, timestamp, flags, entries
+
+
+def _channel_entries(device) -> Dict[Tuple[int, int, int], Tuple[float, int]]:
+    from .moxa_io import DigitalInput, DigitalOutput, AnalogInput
+
+    values = {}
+    for module in device.modules:
+        for io in module.ios:
+            if isinstance(io, DigitalInput):
+                values[(module.slot, 0, io.no)] = (float(io.value or 0), int(io._status if io._status is not None else -1))
+            elif isinstance(io, DigitalOutput):
+                values[(module.slot, 1, io.no)] = (float(io.status), int(io._status if io._status is not None else -1))
+            elif isinstance(io, AnalogInput):
+                values[(module.slot, 2, io.no)] = (float(io.value if io.value is not None else 'nan'), -1)
+            else:
+                values[(module.slot, 3, io.no)] = (float(io.value if io.value is not None else 'nan'),
+                                                   int(io.status if io.status is not None else -1))
+    return values
+
+
+def _layout(device) -> Dict[str, Any]:
+    from .moxa_io import DigitalInput, DigitalOutput, AnalogInput
+
+    modules = []
+    for module in device.modules:
+        channels = []
+        for io in module.ios:
+            kind = 0 if isinstance(io, DigitalInput) else 1 if isinstance(io, DigitalOutput) else \
+                2 if isinstance(io, AnalogInput) else 3
+            channels.append([kind, io.no, io.name])
+        modules.append([module.slot, module._type, module.name, channels])
+    return {'host': device.base_url, 'modules': modules}
+
+
+class _Worker:
+    def __init__(self, conn, interval: float) -> None:
+        """
+        Процесс опроса: свой цикл событий и свои сессии, устройства добавляет и удаляет родитель.
+        """
+        self._conn = conn
+        self._interval: float = interval
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._lag: Dict[int, float] = {}
+        self._stopped: asyncio.Event = asyncio.Event()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._conn.fileno(), self._command)
+        stats = loop.create_task(self._stats())
+        await self._stopped.wait()
+        loop.remove_reader(self._conn.fileno())
+        stats.cancel()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), stats, return_exceptions=True)
+
+    def _command(self) -> None:
+        try:
+            while self._conn.poll():
+                command = self._conn.recv()
+                if command[0] == 'add':
+                    _, device, host, port, username, password, options = command
+                    self._tasks[device] = asyncio.get_running_loop().create_task(
+                        self._poll(device, host, port, username, password, options))
+                elif command[0] == 'remove':
+                    task = self._tasks.pop(command[1], None)
+                    self._lag.pop(command[1], None)
+                    if task is not None:
+                        task.cancel()
+                elif command[0] == 'stop':
+                    self._stopped.set()
+        except (EOFError, OSError):
+            self._stopped.set()
+
+    def _send(self, frame: bytes) -> None:
+        try:
+            self._conn.send_bytes(frame)
+        except (BrokenPipeError, OSError):
+            self._stopped.set()
+
+    async def _poll(self, id: int, host: str, port: int, username: str, password: str, options: Dict[str, Any]) -> None:
+        from .moxa_io import Device
+
+        device = Device(host, port, username, password, loop=asyncio.get_running_loop(), **options)
+        layout = [True]
+        """Состав модулей изменился, родителю нужен кадр LAYOUT и все значения"""
+        device.add_topology_listener(lambda event: layout.__setitem__(0, True))
+        sent: Dict[Tuple[int, int, int], Tuple[float, int]] = {}
+        connected = False
+        sequence = 0
+        try:
+            while True:
+                started = monotonic()
+                try:
+                    if not connected:
+                        await device.connect()
+                        connected = True
+                    else:
+                        await device._update()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as error:
+                    logger.debug(f'Poll error ({host}:{port}): {error}')
+                    sequence += 1
+                    self._send(encode_values(id, sequence, time(), STALE, []))
+                else:
+                    sequence += 1
+                    values = _channel_entries(device)
+                    if layout[0]:
+                        self._send(bytes([LAYOUT]) + id.to_bytes(4, 'little') + json.dumps(_layout(device)).encode())
+                        changed, flags = values, FULL
+                        layout[0] = False
+                    else:
+                        changed = {key: value for key, value in values.items() if sent.get(key) != value}
+                        flags = 0
+                    sent = values
+                    self._send(encode_values(id, sequence, time(), flags,
+                                             [key + value for key, value in changed.items()]))
+
+                elapsed = monotonic() - started
+                self._lag[id] = max(0.0, elapsed - self._interval) / self._interval if self._interval > 0 else 0.0
+                await asyncio.sleep(max(0.0, self._interval - elapsed))
+        finally:
+            await device.close()
+
+    async def _stats(self) -> None:
+        wall, cpu = monotonic(), process_time()
+        while True:
+            await asyncio.sleep(1.0)
+            now_wall, now_cpu = monotonic(), process_time()
+            load = (now_cpu - cpu) / max(now_wall - wall, 1e-6)
+            wall, cpu = now_wall, now_cpu
+            lag = sum(self._lag.values()) / len(self._lag) if self._lag else 0.0
+            self._send(_STATS.pack(STATS, load, lag, len(self._tasks)))
+
+
+def _worker_main(conn, interval: float) -> None:
+    try:
+        asyncio.run(_Worker(conn, interval).run())
+    except KeyboardInterrupt:
+        pass
+
+
+class _DeviceState:
+    def __init__(self, id: int, worker: int, spec: Tuple[str, int, str, str, Dict[str, Any]]) -> None:
+        self.id: int = id
+        self.worker: int = worker
+        self.spec = spec
+        self.host: str = f'{spec[0]}:{spec[1]}'
+        self.layout: Optional[Dict[str, Any]] = None
+        self.values: Dict[Tuple[int, int, int], Tuple[float, int]] = {}
+        self.sequence: int = 0
+        self.time: float = 0.0
+        self.stale: bool = True
+        self.snapshot: Optional[Snapshot] = None
+        """Собранный снимок, сбрасывается при новом кадре"""
+
+
+class _WorkerState:
+    def __init__(self, process, conn) -> None:
+        self.process = process
+        self.conn = conn
+        self.load: float = 0.0
+        self.lag: float = 0.0
+        self.devices: int = 0
+        self.alive: bool = True
+
+
+class ShardedPoller:
+    def __init__(self, workers: Optional[int] = None, interval: float = 1.0, rebalance_interval: float = 5.0,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Опрос большого числа устройств в нескольких процессах. Каждый процесс опрашивает свою часть устройств
+        в своем цикле событий и передает родителю только изменившиеся значения компактными двоичными кадрами.
+        Родитель собирает снимки и события изменений, перенося устройства с перегруженных процессов.
+
+        :param workers: Число процессов, по умолчанию число ядер
+        :param interval: Период опроса устройства, секунды
+        :param rebalance_interval: Период проверки нагрузки процессов, секунды
+        :param loop: Обработчик событий AsyncIO. Необязательный параметр
+        """
+        self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
+        self._count: int = workers or os.cpu_count() or 1
+        self.interval: float = interval
+        self.rebalance_interval: float = rebalance_interval
+        self._workers: List[_WorkerState] = []
+        self._devices: Dict[int, _DeviceState] = {}
+        self._next_id: int = 1
+        self._listeners: List[Callable[[ChangeEvent], None]] = []
+        self._rebalance: Optional[asyncio.Task] = None
+
+        self.frames: int = 0
+        self.updates: int = 0
+        """Число принятых кадров значений, по одному на обновление устройства"""
+        self.received_bytes: int = 0
+        self.moves: int = 0
+        self.crashes: int = 0
+        """Число процессов опроса, завершившихся без команды stop"""
+
+    @property
+    def workers(self) -> List[Dict[str, Any]]:
+        """
+        Нагрузка процессов: load - доля процессорного времени, lag - среднее отставание опроса в периодах.
+        """
+        return [{'pid': worker.process.pid, 'load': worker.load, 'lag': worker.lag, 'devices': worker.devices,
+                 'alive': worker.alive} for worker in self._workers]
+
+    def start(self) -> None:
+        for number in range(self._count):
+            self._workers.append(self._spawn(number))
+        for device in self._devices.values():
+            self._assign(device, self._least_loaded())
+        self._rebalance = self.loop.create_task(self._balance())
+
+    def _spawn(self, number: int) -> _WorkerState:
+        context = multiprocessing.get_context('spawn')
+        parent, child = context.Pipe()
+        process = context.Process(target=_worker_main, args=(child, self.interval), name=f'iolib-shard-{number}',
+                                  daemon=True)
+        process.start()
+        child.close()
+        worker = _WorkerState(process, parent)
+        self.loop.add_reader(parent.fileno(), self._receive, worker)
+        return worker
+
+    async def stop(self) -> None:
+        if self._rebalance is not None:
+            self._rebalance.cancel()
+            self._rebalance = None
+        for worker in self._workers:
+            if not worker.alive:
+                continue
+            self.loop.remove_reader(worker.conn.fileno())
+            try:
+                worker.conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            await self.loop.run_in_executor(None, worker.process.join, 5.0)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+        self._workers.clear()
+
+    def add(self, host: str, port: int, username: str, password: str, **options: Any) -> int:
+        """
+        Добавить устройство. Параметры options передаются Device в процессе опроса.
+        :return: Идентификатор устройства
+        """
+        id = self._next_id
+        self._next_id += 1
+        device = self._devices[id] = _DeviceState(id, -1, (host, int(port), username, password, options))
+        if self._workers:
+            self._assign(device, self._least_loaded())
+        return id
+
+    def remove(self, id: int) -> None:
+        device = self._devices.pop(id)
+        if device.worker >= 0 and self._workers:
+            self._workers[device.worker].devices -= 1
+            self._command(device.worker, ('remove', id))
+
+    def add_listener(self, callback: Callable[[ChangeEvent], None]) -> Callable[[], None]:
+        """
+        Подписаться на изменения значений каналов всех устройств. Возвращает функцию отписки.
+        """
+        self._listeners.append(callback)
+        return lambda: self._listeners.remove(callback)
+
+    def devices(self) -> List[int]:
+        return list(self._devices)
+
+    def snapshot(self, id: int) -> Optional[Snapshot]:
+        """
+        Последний снимок устройства, None до получения состава модулей.
+        """
+        device = self._devices[id]
+        if device.snapshot is None and device.layout is not None:
+            device.snapshot = self._build(device)
+        return device.snapshot
+
+    def _assign(self, device: _DeviceState, worker: int) -> None:
+        device.worker = worker
+        self._workers[worker].devices += 1
+        self._command(worker, ('add', device.id) + device.spec)
+
+    def _command(self, number: int, message: Tuple) -> None:
+        worker = self._workers[number]
+        if not worker.alive:
+            return
+        try:
+            worker.conn.send(message)
+        except (BrokenPipeError, OSError):
+            self._lost(worker)
+
+    def _alive(self) -> List[int]:
+        return [number for number, worker in enumerate(self._workers) if worker.alive]
+
+    def _least_loaded(self) -> int:
+        return min(self._alive(), key=lambda number: (self._workers[number].devices, self._workers[number].load))
+
+    def _receive(self, worker: _WorkerState) -> None:
+        try:
+            while worker.conn.poll():
+                self._dispatch(worker, worker.conn.recv_bytes())
+        except (EOFError, OSError):
+            self._lost(worker)
+
+    def _lost(self, worker: _WorkerState) -> None:
+        """
+        Процесс опроса завершился: его устройства помечаются stale и переносятся на работающие процессы.
+        Если работающих не осталось, процесс перезапускается.
+        """
+        if not worker.alive:
+            return
+        worker.alive = False
+        self.crashes += 1
+        number = self._workers.index(worker)
+        logger.error(f'Shard worker {worker.process.pid} exited, moving {worker.devices} devices')
+        self.loop.remove_reader(worker.conn.fileno())
+        worker.conn.close()
+        worker.devices = 0
+
+        orphans = [device for device in self._devices.values() if device.worker == number]
+        for device in orphans:
+            device.stale = True
+            device.snapshot = None
+            device.worker = -1
+        if not self._alive():
+            self._workers[number] = self._spawn(number)
+        for device in orphans:
+            self._assign(device, self._least_loaded())
+
+    def _dispatch(self, worker: _WorkerState, frame: bytes) -> None:
+        self.frames += 1
+        self.received_bytes += len(frame)
+        if frame[0] == STATS:
+            _, worker.load, worker.lag, _ = _STATS.unpack(frame)
+        elif frame[0] == LAYOUT:
+            device = self._devices.get(int.from_bytes(frame[1:5], 'little'))
+            if device is not None:
+                device.layout = json.loads(frame[5:].decode())
+                device.host = device.layout['host']
+                device.values = {}
+                device.snapshot = None
+        elif frame[0] == VALUES:
+            self.updates += 1
+            id, sequence, timestamp, flags, entries = decode_values(frame)
+            device = self._devices.get(id)
+            if device is None or (device.worker >= 0 and self._workers[device.worker] is not worker):
+                return
+            device.sequence, device.time, device.stale = sequence, timestamp, bool(flags & STALE)
+            device.snapshot = None
+            for slot, kind, no, value, status in entries:
+                key = (slot, kind, no)
+                previous = device.values.get(key)
+                device.values[key] = (value, status)
+                if previous is not None and not flags & FULL and self._listeners:
+                    event = ChangeEvent(id, device.host, slot, KINDS[kind], no, _value(kind, value, status),
+                                        _value(kind, *previous))
+                    for listener in list(self._listeners):
+                        try:
+                            listener(event)
+                        except Exception:
+                            logger.exception('Change listener failed')
+
+    def _build(self, device: _DeviceState) -> Snapshot:
+        modules = []
+        for slot, type, name, channels in device.layout['modules']:
+            snapshots = []
+            for kind, no, channel_name in channels:
+                value, status = device.values.get((slot, kind, no), (float('nan'), -1))
+                snapshots.append(ChannelSnapshot(KINDS[kind], no, channel_name, _value(kind, value, status),
+                                                 None if status < 0 else status))
+            modules.append(ModuleSnapshot(slot, type, name, snapshots))
+        return Snapshot(device.host, device.sequence, device.time, monotonic(), modules, device.stale)
+
+    async def _balance(self) -> None:
+        while True:
+            await asyncio.sleep(self.rebalance_interval)
+            self.rebalance()
+
+    def rebalance(self) -> bool:
+        """
+        Перенести одно устройство с самого загруженного процесса на наименее загруженный,
+        если первый не успевает опрашивать (отставание или загрузка выше 90%), а второй заметно свободнее.
+        """
+        alive = self._alive()
+        if len(alive) < 2:
+            return False
+        hot = max(alive, key=lambda number: self._workers[number].load + self._workers[number].lag)
+        cold = min(alive, key=lambda number: self._workers[number].load + self._workers[number].lag)
+        busy = self._workers[hot].lag > 0.1 or self._workers[hot].load > 0.9
+        if not busy or self._workers[hot].load - self._workers[cold].load < 0.2 or self._workers[hot].devices < 2:
+            return False
+
+        for device in self._devices.values():
+            if device.worker == hot:
+                self._workers[hot].devices -= 1
+                self._command(hot, ('remove', device.id))
+                self._assign(device, cold)
+                self.moves += 1
+                logger.info(f'Moved {device.host} from shard {hot} to {cold}')
+                return True
+        return False
+
+
+def _value(kind: int, value: float, status: int) -> Any:
+    if kind == 1:
+        return bool(value)
+    if kind == 0:
+        return int(value)
+    return value
@@ -0,0 +1,316 @@
+import os
+import mmap
+import json
+import struct
+import asyncio
+import logging
+
+from time import monotonic, sleep
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union, TYPE_CHECKING
+
+from .stream import ChannelSnapshot, ModuleSnapshot, Snapshot, LATEST
+
+if TYPE_CHECKING:
+    from .moxa_io import Device
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'IOSM'
+VERSION = 1
+
+KINDS = ['di', 'do', 'ai', 'ao']
+"""Коды типов каналов в записях"""
+
+STALE = 1
+"""Флаг устройства: значения - последние известные"""
+
+_FILE = struct.Struct('<4sHHIIII')
+"""Заголовок файла: метка, версия формата, резерв, число устройств, число каналов, размер состава, занято устройств"""
+_FILE_SIZE = 64
+_DEVICE = struct.Struct('<IIQdBxHI')
+"""Заголовок устройства: счетчик seqlock, версия состава, номер снимка, время, флаги, число каналов, длина состава"""
+_DEVICE_SIZE = 64
+_ENTRY = struct.Struct('<BBBb4xd')
+"""Канал: слот, тип, номер, состояние (-1 - нет), значение"""
+_SEQUENCE = struct.Struct('<I')
+
+_Layout = Tuple[str, Tuple[Tuple[int, int, str, Tuple[Tuple[int, int, str], ...]], ...]]
+
+
+class SharedLayoutError(Exception):
+    pass
+
+
+def _geometry(devices: int, channels: int, layout_size: int) -> Tuple[int, int]:
+    block = _DEVICE_SIZE + layout_size + channels * _ENTRY.size
+    return block, _FILE_SIZE + devices * block
+
+
+class SnapshotPublisher:
+    def __init__(self, path: str, devices: int = 64, channels: int = 256, layout_size: int = 16384) -> None:
+        """
+        Публикация снимков устройств в файл, отображаемый в память (например, в /dev/shm).
+        Область каждого устройства имеет постоянный размер и защищена счетчиком seqlock:
+        нечетное значение - идет запись. Писатель один, читателей - сколько угодно процессов.
+
+        :param path: Путь к файлу области
+        :param devices: Наибольшее число устройств
+        :param channels: Наибольшее число каналов устройства
+        :param layout_size: Размер места под состав модулей устройства (JSON), байты
+        """
+        self.path: str = path
+        self.devices: int = devices
+        self.channels: int = channels
+        self.layout_size: int = layout_size
+        self._block, size = _geometry(devices, channels, layout_size)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._map: mmap.mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        _FILE.pack_into(self._map, 0, MAGIC, VERSION, 0, devices, channels, layout_size, 0)
+
+        self._index: Dict[str, int] = {}
+        self._layouts: Dict[int, _Layout] = {}
+        self._versions: Dict[int, int] = {}
+        self.published: int = 0
+
+    def _offset(self, host: str) -> int:
+        index = self._index.get(host)
+        if index is None:
+            if len(self._index) >= self.devices:
+                raise SharedLayoutError(f'No room for {host}: {self.devices} devices already published')
+            index = self._index[host] = len(self._index)
+        return _FILE_SIZE + index * self._block
+
+    def publish(self, snapshot: Snapshot) -> None:
+        """
+        Записать снимок. Вызывается из одного потока.
+        """
+        new = snapshot.host not in self._index
+        offset = self._offset(snapshot.host)
+        index = self._index[snapshot.host]
+
+        layout = (snapshot.host, tuple((module.slot, module.type, module.name,
+                                        tuple((KINDS.index(channel.kind), channel.no, channel.name)
+                                              for channel in module.channels))
+                                       for module in snapshot.modules))
+        entries = [(module.slot, KINDS.index(channel.kind), channel.no,
+                    -1 if channel.status is None else int(channel.status),
+                    float('nan') if channel.value is None else float(channel.value))
+                   for module in snapshot.modules for channel in module.channels]
+        if len(entries) > self.channels:
+            raise SharedLayoutError(f'{snapshot.host} has {len(entries)} channels, region holds {self.channels}')
+
+        encoded = None
+        if self._layouts.get(index) != layout:
+            encoded = json.dumps({'host': layout[0], 'modules': layout[1]}).encode()
+            if len(encoded) > self.layout_size:
+                raise SharedLayoutError(f'{snapshot.host} layout takes {len(encoded)} bytes, '
+                                        f'region holds {self.layout_size}')
+            self._layouts[index] = layout
+            self._versions[index] = self._versions.get(index, 0) + 1
+
+        sequence = _SEQUENCE.unpack_from(self._map, offset)[0]
+        _SEQUENCE.pack_into(self._map, offset, (sequence + 1) & 0xFFFFFFFF)
+        if encoded is not None:
+            self._map[offset + _DEVICE_SIZE:offset + _DEVICE_SIZE + len(encoded)] = encoded
+        _DEVICE.pack_into(self._map, offset, (sequence + 1) & 0xFFFFFFFF, self._versions[index], snapshot.sequence,
+                          snapshot.time, STALE if snapshot.stale else 0, len(entries),
+                          len(encoded) if encoded is not None else
+                          _DEVICE.unpack_from(self._map, offset)[6])
+        position = offset + _DEVICE_SIZE + self.layout_size
+        for entry in entries:
+            _ENTRY.pack_into(self._map, position, *entry)
+            position += _ENTRY.size
+        _SEQUENCE.pack_into(self._map, offset, (sequence + 2) & 0xFFFFFFFF)
+
+        if new:
+            _FILE.pack_into(self._map, 0, MAGIC, VERSION, 0, self.devices, self.channels, self.layout_size,
+                            len(self._index))
+        self.published += 1
+
+    async def follow(self, device: 'Device', interval: float = 1.0) -> None:
+        """
+        Публиковать снимки устройства из общего потока до отмены задачи.
+        """
+        subscription = device.stream(interval, policy=LATEST)
+        try:
+            async for snapshot in subscription:
+                self.publish(snapshot)
+        finally:
+            subscription.close()
+
+    def close(self, unlink: bool = False) -> None:
+        self._map.close()
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class SnapshotReader:
+    def __init__(self, path: str, timeout: float = 1.0, spins: int = 100) -> None:
+        """
+        Чтение снимков, опубликованных SnapshotPublisher, без системных вызовов: значения читаются прямо
+        из отображенной памяти, чтение повторяется, если писатель изменил область во время чтения.
+
+            reader = SnapshotReader('/dev/shm/iolib')
+            value = reader.value('http://192.168.127.254', 1, 'ai', 0)
+
+        :param path: Путь к файлу области
+        :param timeout: Наибольшее время ожидания писателя, секунды
+        :param spins: Число повторов без уступки процессора, затем поток уступает его писателю
+        """
+        self.path: str = path
+        self.timeout: float = timeout
+        self.spins: int = spins
+        with open(path, 'rb') as file:
+            self._map: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.capacity, self.channels, self.layout_size, _ = _FILE.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise SharedLayoutError(f'{path} is not an iolib snapshot region')
+        self._block, _ = _geometry(self.capacity, self.channels, self.layout_size)
+
+        self._layouts: Dict[int, Tuple[int, Dict[str, Any], Dict[Tuple[int, int, int], int]]] = {}
+        """Разобранный состав: версия, JSON, смещение канала по (слот, тип, номер)"""
+        self._hosts: Dict[str, int] = {}
+        self.torn: int = 0
+        """Число чтений, повторенных из-за одновременной записи"""
+
+    @property
+    def count(self) -> int:
+        return _FILE.unpack_from(self._map, 0)[6]
+
+    def devices(self) -> List[str]:
+        return [self._layout(index)[1]['host'] for index in range(self.count)]
+
+    def index(self, host: str) -> int:
+        index = self._hosts.get(host)
+        if index is None:
+            self.devices()
+            index = self._hosts.get(host)
+            if index is None:
+                raise KeyError(f'{host} is not published in {self.path}')
+        return index
+
+    def _attempts(self) -> Iterator[int]:
+        yield 0
+        deadline = monotonic() + self.timeout
+        attempt = 1
+        while monotonic() < deadline:
+            if attempt > self.spins:
+                sleep(0)
+            yield attempt
+            attempt += 1
+        raise TimeoutError(f'{self.path}: writer holds the region too long')
+
+    def _begin(self, offset: int) -> int:
+        for _ in self._attempts():
+            sequence = _SEQUENCE.unpack_from(self._map, offset)[0]
+            if not sequence & 1:
+                return sequence
+            self.torn += 1
+
+    def _consistent(self, offset: int, sequence: int) -> bool:
+        if _SEQUENCE.unpack_from(self._map, offset)[0] == sequence:
+            return True
+        self.torn += 1
+        return False
+
+    def _layout(self, index: int) -> Tuple[int, Dict[str, Any], Dict[Tuple[int, int, int], int]]:
+        offset = _FILE_SIZE + index * self._block
+        cached = self._layouts.get(index)
+        for _ in self._attempts():
+            sequence = self._begin(offset)
+            header = _DEVICE.unpack_from(self._map, offset)
+            if cached is not None and cached[0] == header[1]:
+                return cached
+            encoded = self._map[offset + _DEVICE_SIZE:offset + _DEVICE_SIZE + header[6]]
+            if not self._consistent(offset, sequence):
+                continue
+            layout = json.loads(encoded.decode())
+            positions = {}
+            position = offset + _DEVICE_SIZE + self.layout_size
+            for slot, _, _, channels in layout['modules']:
+                for kind, no, _ in channels:
+                    positions[(slot, kind, no)] = position
+                    position += _ENTRY.size
+            cached = self._layouts[index] = (header[1], layout, positions)
+            self._hosts[layout['host']] = index
+            return cached
+
+    def sequence(self, device: Union[int, str]) -> int:
+        """
+        Номер последнего снимка устройства, дешевая проверка наличия новых данных.
+        """
+        index = self.index(device) if isinstance(device, str) else device
+        return _DEVICE.unpack_from(self._map, _FILE_SIZE + index * self._block)[2]
+
+    def value(self, device: Union[int, str], slot: int, kind: str, no: int) -> Tuple[Any, Optional[int]]:
+        """
+        Значение и состояние одного канала.
+        """
+        index = self.index(device) if isinstance(device, str) else device
+        offset = _FILE_SIZE + index * self._block
+        code = KINDS.index(kind)
+        for _ in self._attempts():
+            version, _, positions = self._layout(index)
+            sequence = self._begin(offset)
+            position = positions.get((slot, code, no))
+            if position is None:
+                raise KeyError(f'{kind} {no} not found in slot {slot}')
+            _, _, _, status, value = _ENTRY.unpack_from(self._map, position)
+            if _DEVICE.unpack_from(self._map, offset)[1] == version and self._consistent(offset, sequence):
+                return _value(code, value), None if status < 0 else status
+
+    def read(self, device: Union[int, str]) -> Snapshot:
+        """
+        Согласованный снимок устройства.
+        """
+        index = self.index(device) if isinstance(device, str) else device
+        offset = _FILE_SIZE + index * self._block
+        for _ in self._attempts():
+            version, layout, _ = self._layout(index)
+            sequence = self._begin(offset)
+            _, current, number, timestamp, flags, count, _ = _DEVICE.unpack_from(self._map, offset)
+            entries = list(_ENTRY.iter_unpack(self._map[offset + _DEVICE_SIZE + self.layout_size:
+                                                         offset + _DEVICE_SIZE + self.layout_size + count * _ENTRY.size]))
+            if current != version or not self._consistent(offset, sequence):
+                continue
+
+            modules = []
+            position = 0
+            for slot, type, name, channels in layout['modules']:
+                snapshots = []
+                for kind, no, channel_name in channels:
+                    _, _, _, status, value = entries[position]
+                    position += 1
+                    snapshots.append(ChannelSnapshot(KINDS[kind], no, channel_name, _value(kind, value),
+                                                     None if status < 0 else status))
+                modules.append(ModuleSnapshot(slot, type, name, snapshots))
+            return Snapshot(layout['host'], number, timestamp, monotonic(), modules, bool(flags & STALE))
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def _value(kind: int, value: float) -> Any:
+    if value != value:
+        return None
+    if kind == 1:
+        return bool(value)
+    if kind == 0:
+        return int(value)
+    return value
+
+
+async def publish_devices(publisher: SnapshotPublisher, devices: List['Device'], interval: float = 1.0) -> None:
+    """
+    Публиковать снимки нескольких устройств до отмены задачи.
+    """
+    await asyncio.gather(*[publisher.follow(device, interval) for device in devices])
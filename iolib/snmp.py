@@ -0,0 +1,158 @@
+import asyncio
+import logging
+
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from pysnmp.hlapi.asyncio import (
+    CommunityData,
+    ContextData,
+    ObjectIdentity,
+    ObjectType,
+    SnmpEngine,
+    UdpTransportTarget,
+    getCmd,
+    setCmd,
+)
+from pysnmp.proto.rfc1902 import Integer, OctetString
+
+from .transport import Transport, READ, WRITE
+
+if TYPE_CHECKING:
+    from .moxa_io import Device, Module
+
+logger = logging.getLogger(__name__)
+
+IOTHINX_OID = '1.3.6.1.4.1.8691.10.4510'
+
+TABLE_ENTRIES: Dict[str, str] = {
+    'di': f'{IOTHINX_OID}.11.1.1',
+    'do': f'{IOTHINX_OID}.12.1.1',
+    'ai': f'{IOTHINX_OID}.21.1.1',
+    'ao': f'{IOTHINX_OID}.22.1.1',
+}
+"""Записи таблиц каналов MOXA-IOTHINX4510-MIB"""
+
+VALUE_COLUMNS: Dict[str, int] = {
+    'di': 6,
+    'do': 6,
+    'ai': 10,
+    'ao': 8,
+}
+"""Столбцы значений: diStatus, doStatus, aiValueScaled, aoValueScaled"""
+
+MAX_VARBINDS = 32
+"""Число OID в одном запросе"""
+
+
+class SnmpError(Exception):
+    pass
+
+
+def _channel_class(table: str):
+    from .moxa_io import DigitalInput, DigitalOutput, AnalogInput, AnalogOutput
+    return {'di': DigitalInput, 'do': DigitalOutput, 'ai': AnalogInput, 'ao': AnalogOutput}.get(table)
+
+
+def table_channels(device: 'Device', table: str) -> List:
+    """
+    Каналы устройства в порядке строк таблицы MIB.
+    Строки таблицы нумеруются сквозным образом по всем модулям в порядке слотов.
+    """
+    kind = _channel_class(table)
+    if kind is None:
+        return []
+    return [io for module in sorted(device.modules, key=lambda m: m.slot) for io in module.ios if type(io) is kind]
+
+
+def resolve_channel(device: 'Device', table: Optional[str], index: Optional[int]):
+    """
+    Канал устройства по строке таблицы MIB.
+    """
+    if table is None or index is None:
+        return None
+    channels = table_channels(device, table)
+    return channels[index] if 0 <= index < len(channels) else None
+
+
+def channel_oid(device: 'Device', channel) -> str:
+    """
+    OID значения канала.
+    """
+    for table in TABLE_ENTRIES:
+        if type(channel) is _channel_class(table):
+            return f'{TABLE_ENTRIES[table]}.{VALUE_COLUMNS[table]}.{table_channels(device, table).index(channel)}'
+    raise TypeError(f'{type(channel).__name__} has no SNMP table')
+
+
+class SnmpTransport(Transport):
+    """
+    Чтение и запись каналов по SNMP (MOXA-IOTHINX4510-MIB). Состав модулей в MIB отсутствует,
+    поэтому discover выполняется другим транспортом, обычно HttpTransport.
+    """
+    name = 'snmp'
+    operations = (READ, WRITE)
+
+    def __init__(self, host: str, port: int = 161, auth: Optional[Any] = None, timeout: float = 1.0, retries: int = 3) -> None:
+        """
+        :param host: IP адрес устройства
+        :param port: UDP порт
+        :param auth: CommunityData или UsmUserData, по умолчанию community public, SNMPv2c
+        :param timeout: Время ожидания ответа в секундах
+        :param retries: Число повторов запроса
+        """
+        self._engine: SnmpEngine = SnmpEngine()
+        self._auth: Any = auth or CommunityData('public', mpModel=1)
+        self._target: UdpTransportTarget = UdpTransportTarget((host, port), timeout=timeout, retries=retries)
+
+    async def read(self, device: 'Device') -> None:
+        await self._read_channels(device, [(table, channels) for table in TABLE_ENTRIES
+                                           for channels in [table_channels(device, table)]])
+
+    async def read_slot(self, device: 'Device', module: 'Module') -> None:
+        await self._read_channels(device, [(table, [io for io in table_channels(device, table) if io._module is module])
+                                           for table in TABLE_ENTRIES])
+
+    async def write(self, device: 'Device', values: List[Tuple[Any, Any]]) -> Optional[List[Any]]:
+        from .moxa_io import DigitalOutput, AnalogOutput
+
+        varbinds = []
+        for channel, value in values:
+            if isinstance(channel, DigitalOutput):
+                varbinds.append(ObjectType(ObjectIdentity(channel_oid(device, channel)), Integer(1 if value else 0)))
+            elif isinstance(channel, AnalogOutput):
+                varbinds.append(ObjectType(ObjectIdentity(channel_oid(device, channel)), OctetString(str(round(float(value), 3)))))
+            else:
+                raise TypeError(f'{type(channel).__name__} is read only')
+
+        accepted = []
+        for start in range(0, len(varbinds), MAX_VARBINDS):
+            table = await self._request(setCmd, varbinds[start:start + MAX_VARBINDS])
+            for (channel, _), (_, value) in zip(values[start:start + MAX_VARBINDS], table):
+                accepted.append(int(value) if isinstance(channel, DigitalOutput) else float(str(value)))
+        return accepted
+
+    async def _read_channels(self, device: 'Device', tables: List[Tuple[str, List]]) -> None:
+        requests: List[Tuple[str, Any, str]] = []
+        for table, channels in tables:
+            rows = table_channels(device, table)
+            for channel in channels:
+                requests.append((table, channel, f'{TABLE_ENTRIES[table]}.{VALUE_COLUMNS[table]}.{rows.index(channel)}'))
+
+        chunks = [requests[start:start + MAX_VARBINDS] for start in range(0, len(requests), MAX_VARBINDS)]
+        results = await asyncio.gather(*[self._request(getCmd, [ObjectType(ObjectIdentity(oid)) for _, _, oid in chunk])
+                                         for chunk in chunks])
+
+        for chunk, table in zip(chunks, results):
+            for (kind, channel, _), (_, value) in zip(chunk, table):
+                if kind in ('di', 'do'):
+                    channel._status = int(value)
+                else:
+                    channel._value = float(str(value))
+
+    async def _request(self, command, varbinds: List[ObjectType]) -> List:
+        error, status, index, table = await command(self._engine, self._auth, self._target, ContextData(), *varbinds)
+        if error:
+            raise SnmpError(f'SNMP error: {error}')
+        elif status:
+            raise SnmpError(f'SNMP error: {status.prettyPrint()} at {index and table[int(index) - 1][0] or "?"}')
+        return table
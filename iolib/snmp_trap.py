@@ -0,0 +1,214 @@
+import os
+import attr
+import asyncio
+import logging
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from pysnmp.entity import engine, config
+from pysnmp.entity.rfc3413 import ntfrcv
+from pysnmp.carrier.asyncio.dgram import udp
+from pysnmp.proto.api import v2c
+from pysnmp.smi import builder, view, error
+
+from .snmp import resolve_channel
+
+if TYPE_CHECKING:
+    from .moxa_io import Device, Module
+
+logger = logging.getLogger(__name__)
+
+MIB_NAME = 'MOXA-IOTHINX4510-MIB'
+MIB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+"""Каталог со скомпилированным MIB, по умолчанию корень репозитория"""
+
+TABLE_PREFIXES = ['relay', 'rtd', 'bir', 'wir', 'dir', 'fir', 'di', 'do', 'ai', 'ao', 'tc', 'sp', 'fp']
+"""Префиксы имен столбцов таблиц MIB, более длинные проверяются первыми"""
+
+PUSH_COLUMNS: Dict[str, Tuple[str, Callable[[Any], Any]]] = {
+    'diStatus': ('_status', int),
+    'diCounterValue': ('_value', int),
+    'doStatus': ('_status', int),
+    'aiValueScaled': ('_value', float),
+    'aoValueScaled': ('_value', float),
+}
+"""Столбцы, значение которых записывается в канал напрямую без повторного чтения"""
+
+
+@attr.s(frozen=True, slots=True)
+class TrapVarBind:
+    oid: Tuple[int, ...] = attr.ib()
+    value: Any = attr.ib()
+    symbol: Optional[str] = attr.ib(default=None)
+    """Имя объекта MIB, например diStatus"""
+    table: Optional[str] = attr.ib(default=None)
+    """Таблица MIB: di, do, relay, ai, ao, rtd, tc, bir, wir, dir, fir"""
+    index: Optional[int] = attr.ib(default=None)
+    """Номер строки таблицы"""
+
+
+@attr.s(frozen=True, slots=True)
+class TrapEvent:
+    host: str = attr.ib()
+    notification: Optional[str] = attr.ib()
+    """Имя уведомления, например trapInform01"""
+    varbinds: Tuple[TrapVarBind, ...] = attr.ib()
+    trigger: Optional[int] = attr.ib(default=None)
+    """Значение eventTriggerType, если оно передано"""
+
+
+class TrapReceiver:
+    def __init__(self, host: str = '0.0.0.0', port: int = 162, community: Optional[str] = 'public',
+                 users: Optional[List[Dict[str, str]]] = None, mib_dir: str = MIB_DIR) -> None:
+        """
+        Прием SNMP trap/inform от устройств ioThinx.
+
+        :param host: Адрес для прослушивания
+        :param port: UDP порт
+        :param community: Community для v1/v2c, None отключает v1/v2c
+        :param users: Пользователи v3, словари с ключами username, auth_key, priv_key, auth_protocol,
+            priv_protocol и engine_id (EngineID отправителя, для trap v3)
+        :param mib_dir: Каталог с MOXA-IOTHINX4510-MIB.py
+        """
+        self._host: str = host
+        self._port: int = port
+        self._community: Optional[str] = community
+        self._users: List[Dict[str, str]] = users or []
+
+        mib_builder = builder.MibBuilder()
+        mib_builder.addMibSources(builder.DirMibSource(mib_dir))
+        mib_builder.loadModules('SNMPv2-MIB', MIB_NAME)
+        self._mib_view: view.MibViewController = view.MibViewController(mib_builder)
+
+        self._engine: Optional[engine.SnmpEngine] = None
+        self._listeners: List[Callable[[TrapEvent], None]] = []
+        self._devices: Dict[str, 'Device'] = {}
+
+    def add_listener(self, callback: Callable[[TrapEvent], None]) -> Callable[[], None]:
+        """
+        Подписаться на все принятые уведомления. Возвращает функцию отписки.
+        """
+        self._listeners.append(callback)
+        return lambda: self._listeners.remove(callback)
+
+    def register(self, device: 'Device') -> None:
+        """
+        Применять уведомления от устройства к его каналам.
+        """
+        self._devices[device._host] = device
+
+    def start(self) -> None:
+        self._engine = snmp_engine = engine.SnmpEngine()
+        config.addTransport(snmp_engine, udp.domainName, udp.UdpTransport().openServerMode((self._host, self._port)))
+
+        if self._community is not None:
+            config.addV1System(snmp_engine, 'iothinx-trap', self._community)
+        for user in self._users:
+            config.addV3User(snmp_engine, user['username'],
+                             getattr(config, user.get('auth_protocol') or 'usmNoAuthProtocol'), user.get('auth_key'),
+                             getattr(config, user.get('priv_protocol') or 'usmNoPrivProtocol'), user.get('priv_key'),
+                             securityEngineId=user.get('engine_id') and v2c.OctetString(hexValue=user['engine_id']))
+
+        ntfrcv.NotificationReceiver(snmp_engine, self._received)
+        logger.info(f'SNMP trap receiver listening on {self._host}:{self._port}')
+
+    def stop(self) -> None:
+        if self._engine is not None:
+            self._engine.transportDispatcher.closeDispatcher()
+            self._engine = None
+
+    def decode(self, host: str, var_binds: List[Tuple[Any, Any]]) -> TrapEvent:
+        """
+        Разобрать переменные уведомления по MIB.
+        """
+        notification = None
+        trigger = None
+        varbinds = []
+
+        for name, value in var_binds:
+            oid = tuple(name)
+            try:
+                module, symbol, suffix = self._mib_view.getNodeLocation(oid)
+            except error.SmiError:
+                module, symbol, suffix = None, None, ()
+
+            if symbol == 'sysUpTime':
+                continue
+            elif symbol == 'snmpTrapOID':
+                try:
+                    notification = self._mib_view.getNodeLocation(tuple(value))[1]
+                except error.SmiError:
+                    notification = str(value.prettyPrint())
+                continue
+
+            value = self._python_value(value)
+            if module == MIB_NAME and symbol == 'eventTriggerType':
+                trigger = value
+
+            table = None
+            index = None
+            if module == MIB_NAME and len(suffix) == 1:
+                for prefix in TABLE_PREFIXES:
+                    if symbol.startswith(prefix) and symbol[len(prefix):][:1].isupper():
+                        table, index = prefix, int(suffix[0])
+                        break
+
+            varbinds.append(TrapVarBind(oid, value, symbol, table, index))
+
+        return TrapEvent(host, notification, tuple(varbinds), trigger)
+
+    @staticmethod
+    def _python_value(value: Any) -> Any:
+        if hasattr(value, 'asOctets'):
+            return value.prettyPrint()
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value.prettyPrint()
+
+    def _received(self, snmp_engine, state_reference, context_engine_id, context_name, var_binds, cb_ctx) -> None:
+        _, address = snmp_engine.msgAndPduDsp.getTransportInfo(state_reference)
+        event = self.decode(address[0], var_binds)
+
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception:
+                logger.exception(f'Trap listener failed for {event.host}')
+
+        device = self._devices.get(event.host)
+        if device is not None:
+            task = asyncio.ensure_future(apply_event(device, event))
+            task.add_done_callback(lambda task: self._applied(task, event))
+
+    @staticmethod
+    def _applied(task: asyncio.Future, event: TrapEvent) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f'Failed to apply trap from {event.host}: {task.exception()}')
+
+
+async def apply_event(device: 'Device', event: TrapEvent) -> None:
+    """
+    Записать значения из уведомления в каналы устройства. Модули, значения которых
+    не переданы в уведомлении, перечитываются по отдельности, без опроса всей стойки.
+    """
+    pushed = False
+    refresh: List['Module'] = []
+    for varbind in event.varbinds:
+        channel = resolve_channel(device, varbind.table, varbind.index)
+        if channel is None:
+            continue
+
+        if varbind.symbol in PUSH_COLUMNS:
+            attribute, convert = PUSH_COLUMNS[varbind.symbol]
+            setattr(channel, attribute, convert(varbind.value))
+            pushed = True
+        elif channel._module not in refresh:
+            refresh.append(channel._module)
+
+    if not pushed and not refresh:
+        await device.update()
+        return
+
+    for module in refresh:
+        await device.update_module(module)
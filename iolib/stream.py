@@ -0,0 +1,271 @@
+import attr
+import asyncio
+import logging
+
+from collections import deque
+from time import monotonic, time
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from .breaker import DeviceUnavailableError
+from .clock import Timestamp
+
+if TYPE_CHECKING:
+    from .moxa_io import Device
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = 'drop_oldest'
+"""Полный буфер: отбросить самый старый снимок"""
+LATEST = 'latest'
+"""Хранить только последний снимок"""
+BLOCK = 'block'
+"""Полный буфер: опрос ждет потребителя, замедляет остальных подписчиков устройства"""
+POLICIES = [DROP_OLDEST, LATEST, BLOCK]
+
+
+@attr.s(frozen=True, slots=True)
+class ChannelSnapshot:
+    kind: str = attr.ib()
+    """di, do, ai или ao"""
+    no: int = attr.ib()
+    name: str = attr.ib()
+    value: Any = attr.ib()
+    status: Optional[int] = attr.ib(default=None)
+    unconfirmed: bool = attr.ib(default=False)
+    """Значение выхода записано, но еще не подтверждено чтением"""
+
+
+@attr.s(frozen=True, slots=True)
+class ModuleSnapshot:
+    slot: int = attr.ib()
+    type: int = attr.ib()
+    name: str = attr.ib()
+    channels: Tuple[ChannelSnapshot, ...] = attr.ib(converter=tuple)
+    timestamp: Optional[Timestamp] = attr.ib(default=None)
+    """Время получения данных модуля устройством"""
+
+    def channel(self, kind: str, no: int) -> Optional[ChannelSnapshot]:
+        for channel in self.channels:
+            if channel.kind == kind and channel.no == no:
+                return channel
+        return None
+
+
+@attr.s(frozen=True, slots=True)
+class Snapshot:
+    host: str = attr.ib()
+    sequence: int = attr.ib()
+    """Номер снимка устройства, пропуски означают отброшенные снимки"""
+    time: float = attr.ib()
+    """Время снимка, time.time()"""
+    monotonic: float = attr.ib()
+    modules: Tuple[ModuleSnapshot, ...] = attr.ib(converter=tuple)
+    stale: bool = attr.ib(default=False)
+    """Устройство недоступно, значения - последние известные"""
+
+    def module(self, slot: int) -> Optional[ModuleSnapshot]:
+        for module in self.modules:
+            if module.slot == slot:
+                return module
+        return None
+
+
+def take_snapshot(device: 'Device', sequence: int = 0, stale: bool = False) -> Snapshot:
+    """
+    Неизменяемая копия текущего состояния каналов устройства.
+    """
+    from .moxa_io import DigitalInput, DigitalOutput, AnalogInput
+
+    modules = []
+    for module in device.modules:
+        channels = []
+        for io in module.ios:
+            if isinstance(io, DigitalInput):
+                channels.append(ChannelSnapshot('di', io.no, io.name, io.value, io._status))
+            elif isinstance(io, DigitalOutput):
+                channels.append(ChannelSnapshot('do', io.no, io.name, io.status, io._status, io.unconfirmed))
+            elif isinstance(io, AnalogInput):
+                channels.append(ChannelSnapshot('ai', io.no, io.name, io.value))
+            else:
+                channels.append(ChannelSnapshot('ao', io.no, io.name, io.value, io.status, io.unconfirmed))
+        modules.append(ModuleSnapshot(module.slot, module._type, module.name, channels, module.timestamp))
+    return Snapshot(device.base_url, sequence, time(), monotonic(), modules, stale)
+
+
+class Subscription:
+    def __init__(self, interval: float, maxsize: int = 16, policy: str = DROP_OLDEST,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Буфер снимков одного потребителя. Используется как асинхронный итератор:
+        `async for snapshot in device.stream(1.0)`.
+
+        :param interval: Минимальный интервал между снимками одного устройства для этого потребителя
+        :param maxsize: Размер буфера
+        :param policy: Поведение при полном буфере: DROP_OLDEST, LATEST или BLOCK
+        """
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown backpressure policy {policy}, expected one of {", ".join(POLICIES)}')
+        self.loop: asyncio.AbstractEventLoop = loop or asyncio.get_event_loop()
+        self.interval: float = interval
+        self.policy: str = policy
+        self.maxsize: int = 1 if policy == LATEST else max(1, maxsize)
+        self._buffer: Deque[Snapshot] = deque()
+        self._readable: asyncio.Event = asyncio.Event()
+        self._writable: asyncio.Event = asyncio.Event()
+        self._writable.set()
+        self._last: Dict[str, float] = {}
+        """Время последнего принятого снимка по устройству"""
+        self._streams: List['DeviceStream'] = []
+        self._closed: bool = False
+
+        self.received: int = 0
+        """Принято в буфер"""
+        self.delivered: int = 0
+        """Выдано потребителю"""
+        self.dropped: int = 0
+        """Отброшено из-за переполнения"""
+        self.max_lag: int = 0
+
+    @property
+    def lag(self) -> int:
+        """
+        Число снимков в буфере, ожидающих потребителя.
+        """
+        return len(self._buffer)
+
+    @property
+    def age(self) -> float:
+        """
+        Возраст самого старого снимка в буфере, секунды.
+        """
+        return monotonic() - self._buffer[0].monotonic if self._buffer else 0.0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def wants(self, snapshot: Snapshot) -> bool:
+        last = self._last.get(snapshot.host)
+        return not self._closed and (last is None or snapshot.monotonic - last >= self.interval * 0.95)
+
+    async def put(self, snapshot: Snapshot) -> None:
+        if not self.wants(snapshot):
+            return
+        self._last[snapshot.host] = snapshot.monotonic
+
+        while self.policy == BLOCK and len(self._buffer) >= self.maxsize and not self._closed:
+            self._writable.clear()
+            await self._writable.wait()
+        if self._closed:
+            return
+
+        while len(self._buffer) >= self.maxsize:
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append(snapshot)
+        self.received += 1
+        self.max_lag = max(self.max_lag, len(self._buffer))
+        self._readable.set()
+
+    async def get(self) -> Snapshot:
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration
+            self._readable.clear()
+            await self._readable.wait()
+
+        snapshot = self._buffer.popleft()
+        self.delivered += 1
+        self._writable.set()
+        return snapshot
+
+    def close(self) -> None:
+        """
+        Отписаться. Снимки, оставшиеся в буфере, еще можно получить.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for stream in self._streams:
+            stream.unsubscribe(self)
+        self._streams.clear()
+        self._readable.set()
+        self._writable.set()
+
+    def __aiter__(self) -> 'Subscription':
+        return self
+
+    async def __anext__(self) -> Snapshot:
+        return await self.get()
+
+
+class DeviceStream:
+    def __init__(self, device: 'Device') -> None:
+        """
+        Общий опрос устройства для всех подписчиков. Период опроса - наименьший интервал подписчиков,
+        каждый подписчик получает снимки не чаще своего интервала. Опрос останавливается без подписчиков.
+        """
+        self._device: 'Device' = device
+        self._subscriptions: List[Subscription] = []
+        self._sequence: int = 0
+        self._task: Optional[asyncio.Task] = None
+
+        self.errors: int = 0
+
+    @property
+    def subscriptions(self) -> List[Subscription]:
+        return self._subscriptions
+
+    @property
+    def interval(self) -> float:
+        return min((subscription.interval for subscription in self._subscriptions), default=1.0)
+
+    def subscribe(self, subscription: Subscription) -> Subscription:
+        self._subscriptions.append(subscription)
+        subscription._streams.append(self)
+        if self._task is None or self._task.done():
+            self._task = self._device.loop.create_task(self.run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+        if not self._subscriptions and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run(self) -> None:
+        while self._subscriptions:
+            started = monotonic()
+            refreshed = self._device._timestamp
+            try:
+                await self._device.update()
+            except asyncio.CancelledError:
+                raise
+            except DeviceUnavailableError as error:
+                self.errors += 1
+                self._sequence += 1
+                await self.publish(attr.evolve(error.snapshot, sequence=self._sequence))
+            except Exception as error:
+                self.errors += 1
+                logger.error(f'Stream update error ({self._device.base_url}): {error}')
+            else:
+                if self._device._timestamp is not refreshed:
+                    # Device.update() не читает устройство чаще _update_time, повторный снимок тех же данных не нужен
+                    self._sequence += 1
+                    await self.publish(take_snapshot(self._device, self._sequence))
+            await asyncio.sleep(max(0.0, self.interval - (monotonic() - started)))
+
+    async def publish(self, snapshot: Snapshot) -> None:
+        await asyncio.gather(*[subscription.put(snapshot) for subscription in list(self._subscriptions)])
+
+
+def stream_devices(devices: Iterable['Device'], interval: float = 1.0, maxsize: int = 16, policy: str = DROP_OLDEST,
+                   loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+    """
+    Общий поток снимков нескольких устройств в порядке поступления. Снимки различаются по Snapshot.host.
+    """
+    subscription = Subscription(interval, maxsize, policy, loop=loop)
+    for device in devices:
+        device.streams.subscribe(subscription)
+    return subscription
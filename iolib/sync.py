@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import threading
+import concurrent.futures
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .moxa_io import Device, DigitalOutput, AnalogOutput
+from .stream import Snapshot, LATEST
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    def __init__(self, name: str = 'iolib') -> None:
+        """
+        Цикл событий AsyncIO в отдельном потоке-демоне. Один цикл обслуживает все устройства синхронных клиентов.
+        """
+        self._name: str = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                started = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._loop, started), name=self._name, daemon=True)
+                self._thread.start()
+                started.wait()
+            return self._loop
+
+    @staticmethod
+    def _run(loop: asyncio.AbstractEventLoop, started: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        loop.run_forever()
+
+    def in_loop(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coroutine: Awaitable[Any]) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, coroutine: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """
+        Выполнить корутину и дождаться результата. Нельзя вызывать из потока цикла.
+        """
+        if self.in_loop():
+            raise RuntimeError('Blocking call from the background loop thread would deadlock')
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._loop is not None and self._thread is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+            self._loop = None
+            self._thread = None
+
+
+_default_loop = BackgroundLoop()
+
+
+class SyncDevice:
+    def __init__(self, background: BackgroundLoop, host: str, port: int, username: str, password: str,
+                 interval: float = 1.0, **options: Any) -> None:
+        """
+        Синхронный доступ к Device из обычных потоков. Все операции выполняются в общем фоновом цикле,
+        опрос один на устройство независимо от числа вызывающих потоков.
+
+        :param background: Фоновый цикл
+        :param interval: Период опроса для snapshot()
+        :param options: Дополнительные параметры Device
+        """
+        self._background: BackgroundLoop = background
+        self.interval: float = interval
+        self._device: Device = background.call(self._create(host, port, username, password, options))
+        self._snapshot: Optional[Snapshot] = None
+        """Последний снимок, заменяется целиком, поэтому читается без блокировок"""
+        self._ready: threading.Event = threading.Event()
+        self._task: Optional[concurrent.futures.Future] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    async def _create(self, host: str, port: int, username: str, password: str, options: Dict[str, Any]) -> Device:
+        return Device(host, port, username, password, loop=asyncio.get_running_loop(), **options)
+
+    @property
+    def device(self) -> Device:
+        """
+        Асинхронное устройство, использовать только из фонового цикла.
+        """
+        return self._device
+
+    def connect(self, timeout: Optional[float] = None) -> None:
+        self._background.call(self._device.connect(), timeout)
+
+    def connect_future(self) -> concurrent.futures.Future:
+        return self._background.submit(self._device.connect())
+
+    def update(self, timeout: Optional[float] = None) -> Snapshot:
+        """
+        Обновить состояние и вернуть снимок.
+        """
+        return self._background.call(self._update(), timeout)
+
+    def update_future(self) -> concurrent.futures.Future:
+        return self._background.submit(self._update())
+
+    async def _update(self) -> Snapshot:
+        await self._device.update()
+        self._snapshot = self._device.snapshot()
+        return self._snapshot
+
+    def write(self, values: List[Tuple[Any, Any]], timeout: Optional[float] = None) -> None:
+        self._background.call(self._device.write(values), timeout)
+
+    def write_future(self, values: List[Tuple[Any, Any]]) -> concurrent.futures.Future:
+        return self._background.submit(self._device.write(values))
+
+    def set_output(self, slot: int, no: int, value: Any, timeout: Optional[float] = None) -> None:
+        """
+        Записать DO (bool) или AO (float) по номеру слота (от 1) и номеру канала в типе.
+        """
+        self.write([(self._output(slot, no, value), value)], timeout)
+
+    def set_output_future(self, slot: int, no: int, value: Any) -> concurrent.futures.Future:
+        return self.write_future([(self._output(slot, no, value), value)])
+
+    def _output(self, slot: int, no: int, value: Any):
+        module = self._device[slot - 1]
+        if module is None:
+            raise KeyError(f'Slot {slot} not found on {self._device.base_url}')
+        kind = DigitalOutput if isinstance(value, bool) else AnalogOutput
+        for io in module.ios:
+            if type(io) is kind and io.no == no:
+                return io
+        raise KeyError(f'{kind.__name__} {no} not found in slot {slot}')
+
+    def start(self) -> None:
+        """
+        Запустить общий фоновый опрос для snapshot().
+        """
+        with self._lock:
+            if self._task is None or self._task.done():
+                self._task = self._background.submit(self._follow())
+
+    async def _follow(self) -> None:
+        subscription = self._device.stream(self.interval, policy=LATEST)
+        try:
+            async for snapshot in subscription:
+                self._snapshot = snapshot
+                self._ready.set()
+        finally:
+            subscription.close()
+
+    def snapshot(self, wait: Optional[float] = None) -> Optional[Snapshot]:
+        """
+        Последний снимок без обращения к циклу событий. Запускает фоновый опрос при первом вызове.
+
+        :param wait: Ждать первый снимок не дольше wait секунд
+        """
+        self.start()
+        if self._snapshot is None and wait:
+            self._ready.wait(wait)
+        return self._snapshot
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            if self._task is not None:
+                self._task.cancel()
+                self._task = None
+        self._background.call(self._device.close(), timeout)
+
+
+class SyncClient:
+    def __init__(self, background: Optional[BackgroundLoop] = None) -> None:
+        """
+        Реестр синхронных устройств. Потоки, запрашивающие одно устройство, получают общий SyncDevice.
+
+            client = SyncClient()
+            rack = client.device('192.168.127.254', 80, 'admin', 'moxa')
+            rack.connect()
+            rack.set_output(2, 0, True)
+            print(rack.snapshot(wait=5).module(1).channel('di', 0).value)
+        """
+        self._background: BackgroundLoop = background or _default_loop
+        self._devices: Dict[Tuple[str, int, str], SyncDevice] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def background(self) -> BackgroundLoop:
+        return self._background
+
+    def device(self, host: str, port: int, username: str, password: str, interval: float = 1.0,
+               **options: Any) -> SyncDevice:
+        key = (host, int(port), username)
+        with self._lock:
+            device = self._devices.get(key)
+            if device is None:
+                device = self._devices[key] = SyncDevice(self._background, host, int(port), username, password,
+                                                         interval, **options)
+            return device
+
+    def run(self, function: Callable[..., Awaitable[Any]], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Выполнить произвольную корутину в фоновом цикле.
+        """
+        return self._background.call(function(*args), timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            devices = list(self._devices.values())
+            self._devices.clear()
+        for device in devices:
+            device.close()
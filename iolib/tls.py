@@ -0,0 +1,37 @@
+import ssl
+import logging
+
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_contexts: Dict[Tuple[str, bool, Optional[str]], ssl.SSLContext] = {}
+"""SSL контексты по (хост, проверка сертификата, файл CA)"""
+
+
+def ssl_context(host: str, verify: bool = False, cafile: Optional[str] = None) -> ssl.SSLContext:
+    """
+    SSL контекст для устройства. Контексты кэшируются: загрузка сертификатов CA выполняется один раз на хост,
+    а соединения всех Device одного хоста используют общий контекст.
+    ioThinx по умолчанию использует самоподписанный сертификат, поэтому проверка по умолчанию отключена.
+
+    :param host: Адрес устройства
+    :param verify: Проверять сертификат и имя хоста
+    :param cafile: Файл сертификатов CA для проверки
+    """
+    key = (host, verify, cafile)
+    context = _contexts.get(key)
+    if context is None:
+        context = ssl.create_default_context(cafile=cafile)
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        _contexts[key] = context
+    return context
+
+
+def clear_contexts() -> None:
+    """
+    Сбросить кэш контекстов, например после замены сертификата CA.
+    """
+    _contexts.clear()
@@ -0,0 +1,22 @@
+import attr
+
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .moxa_io import Module
+
+ADDED = 'added'
+REMOVED = 'removed'
+REPLACED = 'replaced'
+"""В слоте установлен модуль другого типа или с другим серийным номером"""
+
+
+@attr.s(frozen=True, slots=True)
+class TopologyEvent:
+    kind: str = attr.ib()
+    """ADDED, REMOVED или REPLACED"""
+    slot: int = attr.ib()
+    module: Optional['Module'] = attr.ib(default=None)
+    """Новый модуль, None для REMOVED"""
+    previous: Optional['Module'] = attr.ib(default=None)
+    """Прежний модуль, None для ADDED"""
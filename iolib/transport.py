@@ -0,0 +1,141 @@
+import asyncio
+import logging
+
+from typing import Any, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .moxa_io import Device, Module
+
+logger = logging.getLogger(__name__)
+
+DISCOVER = 'discover'
+"""Чтение состава модулей и каналов"""
+READ = 'read'
+"""Чтение состояния всех каналов или одного слота"""
+WRITE = 'write'
+"""Запись выходов"""
+OPERATIONS = [DISCOVER, READ, WRITE]
+
+
+class Transport:
+    """
+    Протокол обмена с устройством. Device выбирает транспорт отдельно для каждой операции,
+    например состав модулей по Web API, чтение по Modbus TCP, запись по SNMP.
+    Транспорт не хранит состояние каналов, он заполняет объекты Module и каналов устройства.
+    """
+    name: str = 'base'
+    operations: Tuple[str, ...] = ()
+    """Поддерживаемые операции"""
+
+    async def discover(self, device: 'Device') -> None:
+        """
+        Прочитать состав модулей и создать объекты Module и каналов.
+        """
+        raise NotImplementedError(f'{self.name} transport does not support {DISCOVER}')
+
+    async def read_info(self, device: 'Device') -> None:
+        """
+        Обновить информацию о головном модуле: имя, версия, состояние.
+        """
+        raise NotImplementedError(f'{self.name} transport does not support {DISCOVER}')
+
+    async def read_topology(self, device: 'Device') -> List[List[Any]]:
+        """
+        Прочитать состав модулей.
+        :return: Описания слотов в формате /action/slotinfo: direct, slot, type, name, version, serial, locating, status
+        """
+        raise NotImplementedError(f'{self.name} transport does not support {DISCOVER}')
+
+    async def install_slot(self, device: 'Device', module: 'Module') -> None:
+        """
+        Создать каналы нового модуля.
+        """
+        raise NotImplementedError(f'{self.name} transport does not support {DISCOVER}')
+
+    async def read(self, device: 'Device') -> None:
+        """
+        Обновить состояние всех каналов устройства.
+        """
+        raise NotImplementedError(f'{self.name} transport does not support {READ}')
+
+    async def read_slot(self, device: 'Device', module: 'Module') -> None:
+        """
+        Обновить состояние каналов одного модуля.
+        """
+        raise NotImplementedError(f'{self.name} transport does not support {READ}')
+
+    async def write(self, device: 'Device', values: List[Tuple[Any, Any]]) -> Optional[List[Any]]:
+        """
+        Записать значения выходов.
+
+        :param values: Пары (канал, значение): DigitalOutput - bool, AnalogOutput - float
+        :return: Значения, принятые устройством, в порядке values, если их сообщает ответ; None - приняты записанные
+        """
+        raise NotImplementedError(f'{self.name} transport does not support {WRITE}')
+
+    async def close(self) -> None:
+        pass
+
+
+class HttpTransport(Transport):
+    """
+    Web API устройства (см. iothinx-web-api.md). Единственный транспорт, умеющий читать состав модулей.
+    """
+    name = 'http'
+    operations = (DISCOVER, READ, WRITE)
+
+    async def discover(self, device: 'Device') -> None:
+        if not device._jar:
+            await device._login()
+
+        await self.read_info(device)
+        await device.refresh_topology()
+
+    async def read(self, device: 'Device') -> None:
+        await self.read_info(device)
+        events = await device.refresh_topology()
+        installed = [event.module for event in events if event.module is not None]
+        for module in device.modules:
+            if module not in installed:
+                await self.read_slot(device, module)
+
+    async def read_topology(self, device: 'Device') -> List[List[Any]]:
+        return (await device.get('/action/slotinfo'))['infos']
+
+    async def install_slot(self, device: 'Device', module: 'Module') -> None:
+        io_info = await device.get(f'/action/io/{module.direct}/{module.slot}')
+        device._apply_io(module, io_info, install=True)
+
+    async def read_slot(self, device: 'Device', module: 'Module') -> None:
+        io_info = await device.get(f'/action/io/{module.direct}/{module.slot}')
+        device._apply_io(module, io_info)
+
+    async def write(self, device: 'Device', values: List[Tuple[Any, Any]]) -> Optional[List[Any]]:
+        from .moxa_io import DigitalOutput, AnalogOutput
+
+        for channel, _ in values:
+            if not isinstance(channel, (DigitalOutput, AnalogOutput)):
+                raise TypeError(f'{type(channel).__name__} is read only')
+
+        writes = []
+        for channel, value in values:
+            module = channel._module
+            if isinstance(channel, DigitalOutput):
+                writes.append(device.put(f'/action/io/do/doStatus/{module.direct}/{module.slot}/{channel.no}',
+                                         data=f'[{1 if value else 0}]'))
+            elif isinstance(channel, AnalogOutput):
+                writes.append(device.put(f'/action/io/ao/aoValueScaled/{module.direct}/{module.slot}/{channel.no}',
+                                         data=f'[{value}]'))
+        await asyncio.gather(*writes)
+        return None
+
+    async def read_info(self, device: 'Device') -> None:
+        dev_info = await device.get('/action/device')
+        device._name = dev_info[0]
+        device._module_num = dev_info[1]
+        device._version = dev_info[2]
+        device._serial_num = dev_info[3]
+        device._device_ip = dev_info[4]
+        device._device_mac = dev_info[5]
+        device._level = dev_info[6]
+        device._error = dev_info[7]
@@ -0,0 +1,219 @@
+"""
+Локальный Modbus TCP сервер имитируемой стойки, адреса по таблице iolib.modbus.ModbusMap.
+
+    python -m simulator.modbus_server --count 10 --port 5020 --latency 0.005
+"""
+import struct
+import asyncio
+import logging
+import argparse
+
+from typing import Dict, List, Optional, Tuple
+
+from iolib.modbus import (
+    ModbusMap,
+    READ_COILS,
+    READ_DISCRETE_INPUTS,
+    READ_HOLDING_REGISTERS,
+    READ_INPUT_REGISTERS,
+    WRITE_SINGLE_COIL,
+    WRITE_MULTIPLE_COILS,
+    WRITE_MULTIPLE_REGISTERS,
+    MAX_READ_BITS,
+    MAX_READ_REGISTERS,
+    floats_to_registers,
+    registers_to_floats,
+)
+
+from .rack import SimRack, SimChannel
+
+logger = logging.getLogger(__name__)
+
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+ILLEGAL_VALUE = 3
+
+
+class ModbusError(Exception):
+    def __init__(self, code: int) -> None:
+        super().__init__(code)
+        self.code: int = code
+
+
+class ModbusServer:
+    def __init__(self, rack: SimRack, host: str = '127.0.0.1', port: int = 5020, address_map: Optional[ModbusMap] = None,
+                 latency: float = 0.0) -> None:
+        """
+        Modbus TCP сервер имитируемой стойки ioThinx 4510.
+        Запросы одного соединения обрабатываются независимо, поэтому конвейерные запросы клиента
+        выполняются параллельно и ответы могут приходить не по порядку.
+
+        :param rack: Имитируемая стойка
+        :param host: Адрес для прослушивания
+        :param port: TCP порт
+        :param address_map: Таблица адресов
+        :param latency: Задержка обработки запроса в секундах
+        """
+        self.rack: SimRack = rack
+        self.host: str = host
+        self.port: int = port
+        self.latency: float = latency
+        self.requests: int = 0
+        """Число обработанных запросов"""
+
+        self._map: ModbusMap = address_map or ModbusMap()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        self._bits: Dict[Tuple[str, int], SimChannel] = {}
+        """Дискретные каналы по (тип, адрес)"""
+        self._registers: Dict[Tuple[str, int], SimChannel] = {}
+        """Аналоговые каналы по (тип, адрес первого регистра)"""
+        for module in rack.modules:
+            numbers: Dict[str, int] = {}
+            for channel in module.channels:
+                no = numbers[channel.kind] = numbers.get(channel.kind, -1) + 1
+                if channel.kind in ('di', 'do'):
+                    self._bits[channel.kind, getattr(self._map, channel.kind)(module.slot, no)] = channel
+                elif channel.kind in ('ai', 'ao'):
+                    self._registers[channel.kind, getattr(self._map, channel.kind)(module.slot, no)] = channel
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._connection, self.host, self.port)
+        logger.info(f'Modbus TCP {self.rack.name} listening on {self.host}:{self.port}')
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                transaction, protocol, length, unit = struct.unpack('>HHHB', header)
+                pdu = await reader.readexactly(length - 1)
+                task = asyncio.ensure_future(self._respond(writer, transaction, unit, pdu))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, transaction: int, unit: int, pdu: bytes) -> None:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        try:
+            response = self.handle(pdu)
+        except ModbusError as error:
+            response = struct.pack('>BB', pdu[0] | 0x80, error.code)
+        if not writer.is_closing():
+            writer.write(struct.pack('>HHHB', transaction, 0, len(response) + 1, unit) + response)
+
+    def handle(self, pdu: bytes) -> bytes:
+        function = pdu[0]
+        if function in (READ_COILS, READ_DISCRETE_INPUTS):
+            address, count = struct.unpack('>HH', pdu[1:5])
+            if not 0 < count <= MAX_READ_BITS:
+                raise ModbusError(ILLEGAL_VALUE)
+            bits = self._read_bits('do' if function == READ_COILS else 'di', address, count)
+            data = bytearray((count + 7) // 8)
+            for i, bit in enumerate(bits):
+                data[i // 8] |= bit << (i % 8)
+            return struct.pack('>BB', function, len(data)) + bytes(data)
+
+        elif function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            address, count = struct.unpack('>HH', pdu[1:5])
+            if not 0 < count <= MAX_READ_REGISTERS:
+                raise ModbusError(ILLEGAL_VALUE)
+            registers = self._read_registers('ao' if function == READ_HOLDING_REGISTERS else 'ai', address, count)
+            return struct.pack(f'>BB{count}H', function, count * 2, *registers)
+
+        elif function == WRITE_SINGLE_COIL:
+            address, value = struct.unpack('>HH', pdu[1:5])
+            if value not in (0x0000, 0xFF00):
+                raise ModbusError(ILLEGAL_VALUE)
+            self._write_bits(address, [value == 0xFF00])
+            return pdu[:5]
+
+        elif function == WRITE_MULTIPLE_COILS:
+            address, count, size = struct.unpack('>HHB', pdu[1:6])
+            data = pdu[6:6 + size]
+            self._write_bits(address, [bool(data[i // 8] >> (i % 8) & 1) for i in range(count)])
+            return pdu[:5]
+
+        elif function == WRITE_MULTIPLE_REGISTERS:
+            address, count, size = struct.unpack('>HHB', pdu[1:6])
+            if count % 2 or size != count * 2:
+                raise ModbusError(ILLEGAL_VALUE)
+            values = registers_to_floats(struct.unpack(f'>{count}H', pdu[6:6 + size]))
+            for i, value in enumerate(values):
+                channel = self._registers.get(('ao', address + i * 2))
+                if channel is None:
+                    raise ModbusError(ILLEGAL_ADDRESS)
+                channel.set_value(value)
+            return pdu[:5]
+
+        raise ModbusError(ILLEGAL_FUNCTION)
+
+    def _read_bits(self, kind: str, address: int, count: int) -> List[int]:
+        channels = [self._bits.get((kind, address + i)) for i in range(count)]
+        if channels[0] is None:
+            raise ModbusError(ILLEGAL_ADDRESS)
+        return [channel.status if channel is not None else 0 for channel in channels]
+
+    def _read_registers(self, kind: str, address: int, count: int) -> List[int]:
+        if count % 2 or (kind, address) not in self._registers:
+            raise ModbusError(ILLEGAL_ADDRESS)
+        values = []
+        for offset in range(0, count, 2):
+            channel = self._registers.get((kind, address + offset))
+            values.append(channel.value if channel is not None else 0.0)
+        return floats_to_registers(values)
+
+    def _write_bits(self, address: int, values: List[bool]) -> None:
+        for i, value in enumerate(values):
+            channel = self._bits.get(('do', address + i))
+            if channel is None:
+                raise ModbusError(ILLEGAL_ADDRESS)
+            channel.set_status(value)
+
+
+async def run_servers(count: int, port: int, layout: List[str], host: str = '127.0.0.1', latency: float = 0.0,
+                      interval: float = 0.1) -> None:
+    servers = []
+    for number in range(count):
+        server = ModbusServer(SimRack(layout, name=f'ioThinx-SIM-{number:03}', seed=number), host, port + number, latency=latency)
+        await server.start()
+        servers.append(server)
+
+    try:
+        await asyncio.gather(*[server.rack.run(interval) for server in servers])
+    finally:
+        for server in servers:
+            await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='ioThinx 4510 Modbus TCP simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5020)
+    parser.add_argument('--count', type=int, default=1, help='number of servers on consecutive ports')
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds')
+    parser.add_argument('--interval', type=float, default=0.1, help='simulation step, seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    layout = args.layout.split(',') if args.layout else None
+    asyncio.run(run_servers(args.count, args.port, layout, args.host, args.latency, args.interval))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+import math
+import random
+import asyncio
+
+from time import monotonic
+from typing import Dict, List, Optional
+
+from iolib.moxa_io import ModuleType
+
+MODULE_CHANNELS: Dict[ModuleType, Dict[str, int]] = {
+    ModuleType.MODULE_45MR_1600: {'di': 16},
+    ModuleType.MODULE_45MR_1601: {'di': 16},
+    ModuleType.MODULE_45MR_2600: {'do': 16},
+    ModuleType.MODULE_45MR_2601: {'do': 16},
+    ModuleType.MODULE_45MR_2606: {'di': 8, 'do': 8},
+    ModuleType.MODULE_45MR_2404: {'relay': 4},
+    ModuleType.MODULE_45MR_3800: {'ai': 8},
+    ModuleType.MODULE_45MR_3810: {'ai': 8},
+    ModuleType.MODULE_45MR_4420: {'ao': 4},
+    ModuleType.MODULE_45MR_6600: {'rtd': 6},
+    ModuleType.MODULE_45MR_6810: {'tc': 8},
+}
+"""Состав каналов модулей"""
+
+CHANNEL_KINDS = ['di', 'do', 'relay', 'ai', 'ao', 'rtd', 'tc']
+
+REGISTER_KINDS = ['bir', 'wir', 'dir', 'fir']
+REGISTER_COUNT = 16
+
+ANALOG_RANGES = {
+    'ai': (4.0, 20.0),
+    'ao': (4.0, 20.0),
+    'rtd': (15.0, 30.0),
+    'tc': (100.0, 300.0),
+}
+"""Диапазоны имитируемых значений аналоговых каналов"""
+
+DEFAULT_LAYOUT = ['45MR-1600', '45MR-2600', '45MR-3810', '45MR-4420', '45MR-6600']
+
+
+def module_type(name: str) -> ModuleType:
+    """
+    Тип модуля по имени вида `45MR-1600`.
+    """
+    return ModuleType[f'MODULE_{name.replace("-", "_")}']
+
+
+def module_name(type: ModuleType) -> str:
+    return type.name.replace('MODULE_', '').replace('_', '-')
+
+
+class SimChannel:
+    def __init__(self, kind: str, slot: int, no: int, index: int) -> None:
+        self.kind: str = kind
+        self.slot: int = slot
+        self.no: int = no
+        self.index: int = index
+        """Номер строки в таблице MIB, сквозной для всех модулей"""
+        self.name: str = f'{kind.upper()}-{slot:02}-{no:02}'
+
+        self.mode: int = 0
+        self.status: int = 0
+        self.trigger: int = 0
+        self.filter: int = 1
+
+        self.counter: int = 0
+        self.counter_run: int = 1
+        self.overflow: int = 0
+
+        self.on_width: int = 1
+        self.off_width: int = 1
+        self.pulse_status: int = 0
+        self.pulse_count: int = 0
+
+        self.total_count: int = 0
+        self.current_count: int = 0
+
+        low, high = ANALOG_RANGES.get(kind, (0.0, 1.0))
+        self.range_min: float = low
+        self.range_max: float = high
+        self.value: float = low
+        self.min: float = low
+        self.max: float = low
+        self.phase: float = 0.0
+
+    @property
+    def raw(self) -> int:
+        """
+        Значение аналогового канала в отсчетах АЦП (16 бит).
+        """
+        span = self.range_max - self.range_min
+        return int(round((self.value - self.range_min) / span * 65535)) if span else 0
+
+    @raw.setter
+    def raw(self, value: int) -> None:
+        self.set_value(self.range_min + (self.range_max - self.range_min) * value / 65535)
+
+    def set_value(self, value: float) -> None:
+        self.value = value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def set_status(self, status: int) -> None:
+        if status and not self.status:
+            self.total_count += 1
+            self.current_count += 1
+            if self.kind == 'di' and self.counter_run:
+                self.counter = (self.counter + 1) & 0xFFFFFFFF
+                self.overflow = self.overflow or int(self.counter == 0)
+        self.status = int(bool(status))
+
+
+class SimRegister:
+    def __init__(self, kind: str, index: int) -> None:
+        self.kind: str = kind
+        self.index: int = index
+        self.name: str = f'{kind.upper()}-{index:03}'
+        self.value = 0.0 if kind == 'fir' else 0
+
+
+class SimModule:
+    def __init__(self, slot: int, type: ModuleType) -> None:
+        self.slot: int = slot
+        self.type: ModuleType = type
+        self.name: str = module_name(type)
+        self.serial: str = f'SIM{slot:05}'
+        self.version: str = '1.0.0'
+        self.channels: List[SimChannel] = []
+
+
+class SimRack:
+    def __init__(self, layout: Optional[List[str]] = None, name: str = 'ioThinx-SIM', ip: str = '127.0.0.1',
+                 seed: Optional[int] = None, di_toggle: float = 0.05) -> None:
+        """
+        Имитация стойки ioThinx 4510 с модулями.
+
+        :param layout: Список типов модулей по слотам, начиная с первого. Например ['45MR-1600', '45MR-2600']
+        :param name: Имя устройства
+        :param ip: IP адресс устройства
+        :param seed: Зерно генератора случайных значений
+        :param di_toggle: Вероятность переключения DI канала за один шаг имитации
+        """
+        self.name: str = name
+        self.version: str = '1.2.0'
+        self.serial: str = 'SIM000000'
+        self.ip: str = ip
+        self.mac: str = '00:90:E8:00:00:00'
+        self.error: int = 0
+        self.di_toggle: float = di_toggle
+
+        self._random: random.Random = random.Random(seed)
+        self._started: float = monotonic()
+
+        self.modules: List[SimModule] = []
+        self.tables: Dict[str, List[SimChannel]] = {kind: [] for kind in CHANNEL_KINDS}
+        """Каналы по типам в порядке строк таблиц MIB"""
+        self.registers: Dict[str, List[SimRegister]] = {
+            kind: [SimRegister(kind, index) for index in range(REGISTER_COUNT)] for kind in REGISTER_KINDS
+        }
+
+        for slot, type_name in enumerate(layout or DEFAULT_LAYOUT, start=1):
+            self.add_module(slot, module_type(type_name))
+
+    def add_module(self, slot: int, type: ModuleType) -> SimModule:
+        """
+        Установить модуль в слот. Модуль, уже установленный в слоте, извлекается.
+        """
+        self.remove_module(slot)
+        module = SimModule(slot, type)
+        for kind, count in MODULE_CHANNELS[type].items():
+            for no in range(count):
+                channel = SimChannel(kind, slot, no, 0)
+                channel.phase = self._random.random() * 2 * math.pi
+                module.channels.append(channel)
+        self.modules.append(module)
+        self.modules.sort(key=lambda m: m.slot)
+        self._reindex()
+        return module
+
+    def remove_module(self, slot: int) -> Optional[SimModule]:
+        module = self.module(slot)
+        if module is not None:
+            self.modules.remove(module)
+            self._reindex()
+        return module
+
+    def module(self, slot: int) -> Optional[SimModule]:
+        for module in self.modules:
+            if module.slot == slot:
+                return module
+        return None
+
+    def channel(self, slot: int, no: int) -> Optional[SimChannel]:
+        module = self.module(slot)
+        if module is not None and no < len(module.channels):
+            return module.channels[no]
+        return None
+
+    def _reindex(self) -> None:
+        """
+        Перестроить таблицы MIB: строки нумеруются сквозным образом в порядке слотов.
+        """
+        self.tables = {kind: [] for kind in CHANNEL_KINDS}
+        for module in self.modules:
+            for channel in module.channels:
+                channel.index = len(self.tables[channel.kind])
+                self.tables[channel.kind].append(channel)
+
+    def step(self) -> None:
+        """
+        Один шаг имитации: случайные переключения DI и плавное изменение аналоговых входов.
+        """
+        t = monotonic() - self._started
+        for channel in self.tables['di']:
+            if self._random.random() < self.di_toggle:
+                channel.set_status(not channel.status)
+        for kind, period in (('ai', 30.0), ('rtd', 600.0), ('tc', 600.0)):
+            for channel in self.tables[kind]:
+                span = channel.range_max - channel.range_min
+                value = channel.range_min + span * (0.5 + 0.4 * math.sin(2 * math.pi * t / period + channel.phase))
+                channel.set_value(round(value + self._random.gauss(0, span * 0.001), 3))
+
+    async def run(self, interval: float = 0.1) -> None:
+        while True:
+            self.step()
+            await asyncio.sleep(interval)
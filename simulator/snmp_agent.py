@@ -0,0 +1,352 @@
+"""
+Локальный SNMP агент, имитирующий MIB MOXA-IOTHINX4510-MIB.
+
+Пример запуска 20 агентов на портах 1161-1180:
+    python -m simulator.snmp_agent --count 20 --port 1161 --layout 45MR-1600,45MR-2600,45MR-3810 --latency 0.005 --loss 0.01
+"""
+import bisect
+import random
+import asyncio
+import logging
+import argparse
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pysnmp.entity import engine, config
+from pysnmp.entity.rfc3413 import cmdrsp, context
+from pysnmp.carrier.asyncio.dgram import udp
+from pysnmp.proto import rfc1902
+from pysnmp.proto.api import v2c
+from pysnmp.smi import error, instrum
+
+from .rack import SimRack, SimChannel, SimRegister
+
+logger = logging.getLogger(__name__)
+
+OID = Tuple[int, ...]
+Getter = Callable[[Any], Any]
+Setter = Optional[Callable[[Any, Any], None]]
+
+IOTHINX_OID: OID = (1, 3, 6, 1, 4, 1, 8691, 10, 4510)
+
+
+def _text(value: Any) -> rfc1902.OctetString:
+    return rfc1902.OctetString(str(value))
+
+
+def _reset_min(channel: SimChannel, _) -> None:
+    channel.min = channel.value
+
+
+def _reset_max(channel: SimChannel, _) -> None:
+    channel.max = channel.value
+
+
+_COMMON_COLUMNS: List[Tuple[int, Getter, Setter]] = [
+    (1, lambda c: rfc1902.Integer32(c.index), None),
+    (2, lambda c: _text(c.slot), None),
+    (3, lambda c: rfc1902.Integer32(c.no), None),
+    (4, lambda c: _text(c.name), None),
+]
+
+_TEMPERATURE_COLUMNS: List[Tuple[int, Getter, Setter]] = _COMMON_COLUMNS + [
+    (5, lambda c: rfc1902.Integer32(c.mode), None),
+    (6, lambda c: rfc1902.Integer32(0), None),
+    (7, lambda c: _text(c.value), None),
+    (8, lambda c: _text(c.min), None),
+    (9, lambda c: _text(c.max), None),
+    (10, lambda c: rfc1902.Integer32(1), _reset_min),
+    (11, lambda c: rfc1902.Integer32(1), _reset_max),
+]
+
+TABLES: Dict[str, Tuple[OID, List[Tuple[int, Getter, Setter]]]] = {
+    'di': ((11, 1, 1), _COMMON_COLUMNS + [
+        (5, lambda c: rfc1902.Integer32(c.mode), None),
+        (6, lambda c: rfc1902.Integer32(c.status), None),
+        (7, lambda c: rfc1902.Integer32(c.counter_run), lambda c, v: setattr(c, 'counter_run', int(v))),
+        (8, lambda c: rfc1902.Gauge32(c.counter), lambda c, v: setattr(c, 'counter', int(v))),
+        (9, lambda c: rfc1902.Integer32(c.overflow), None),
+        (10, lambda c: rfc1902.Integer32(1), lambda c, v: setattr(c, 'overflow', 0)),
+    ]),
+    'do': ((12, 1, 1), _COMMON_COLUMNS + [
+        (5, lambda c: rfc1902.Integer32(c.mode), None),
+        (6, lambda c: rfc1902.Integer32(c.status), lambda c, v: c.set_status(int(v))),
+        (7, lambda c: rfc1902.Integer32(c.pulse_status), lambda c, v: setattr(c, 'pulse_status', int(v))),
+        (8, lambda c: rfc1902.Gauge32(c.pulse_count), lambda c, v: setattr(c, 'pulse_count', int(v))),
+        (9, lambda c: rfc1902.Integer32(c.on_width), lambda c, v: setattr(c, 'on_width', int(v))),
+        (10, lambda c: rfc1902.Integer32(c.off_width), lambda c, v: setattr(c, 'off_width', int(v))),
+    ]),
+    'relay': ((13, 1, 1), _COMMON_COLUMNS + [
+        (5, lambda c: rfc1902.Integer32(c.status), lambda c, v: c.set_status(int(v))),
+        (6, lambda c: rfc1902.Integer32(c.total_count), None),
+        (7, lambda c: rfc1902.Integer32(c.current_count), None),
+        (8, lambda c: rfc1902.Integer32(1), lambda c, v: setattr(c, 'current_count', 0)),
+    ]),
+    'ai': ((21, 1, 1), _COMMON_COLUMNS + [
+        (5, lambda c: rfc1902.Integer32(c.mode), None),
+        (6, lambda c: rfc1902.Integer32(c.status), None),
+        (7, lambda c: rfc1902.Gauge32(c.raw), None),
+        (8, lambda c: rfc1902.Gauge32(0), None),
+        (9, lambda c: rfc1902.Gauge32(65535), None),
+        (10, lambda c: _text(c.value), None),
+        (11, lambda c: _text(c.min), None),
+        (12, lambda c: _text(c.max), None),
+        (13, lambda c: _text(c.range_min), None),
+        (14, lambda c: rfc1902.Integer32(1), _reset_min),
+        (15, lambda c: rfc1902.Integer32(1), _reset_max),
+    ]),
+    'ao': ((22, 1, 1), _COMMON_COLUMNS + [
+        (5, lambda c: rfc1902.Integer32(c.mode), None),
+        (6, lambda c: rfc1902.Integer32(c.status), None),
+        (7, lambda c: rfc1902.Gauge32(c.raw), lambda c, v: setattr(c, 'raw', int(v))),
+        (8, lambda c: _text(c.value), lambda c, v: c.set_value(float(str(v)))),
+    ]),
+    'rtd': ((23, 1, 1), _TEMPERATURE_COLUMNS),
+    'tc': ((24, 1, 1), _TEMPERATURE_COLUMNS),
+}
+"""Таблицы каналов: OID строки относительно ioThinx4510 и столбцы (номер, чтение, запись)"""
+
+
+def _register_value(register: SimRegister) -> Any:
+    if register.kind == 'bir':
+        return rfc1902.Integer32(int(register.value))
+    elif register.kind == 'fir':
+        return _text(register.value)
+    return rfc1902.Integer32(int(register.value))
+
+
+def _set_register(register: SimRegister, value: Any) -> None:
+    register.value = float(str(value)) if register.kind == 'fir' else int(value)
+
+
+REGISTER_TABLES: Dict[str, OID] = {
+    'bir': (41, 1, 1),
+    'wir': (41, 2, 1),
+    'dir': (41, 3, 1),
+    'fir': (41, 4, 1),
+}
+
+REGISTER_COLUMNS: List[Tuple[int, Getter, Setter]] = [
+    (1, lambda r: rfc1902.Integer32(r.index), None),
+    (2, lambda r: _text(r.name), None),
+    (3, _register_value, _set_register),
+]
+
+SYSTEM_INFO: List[Tuple[int, Getter]] = [
+    (1, lambda rack: _text(rack.name)),
+    (2, lambda rack: _text(rack.version)),
+    (3, lambda rack: _text(rack.serial)),
+    (4, lambda rack: _text('2020/01/01 00:00:00')),
+    (5, lambda rack: rfc1902.Integer32(rack.error)),
+]
+
+
+class RackMibController(instrum.AbstractMibInstrumController):
+    def __init__(self, rack: SimRack) -> None:
+        """
+        Обработчик запросов к MIB имитируемой стойки.
+        """
+        self._rack: SimRack = rack
+        self._objects: Dict[OID, Tuple[Any, Getter, Setter]] = {}
+        self._oids: List[OID] = []
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        Перестроить дерево OID, например после изменения состава модулей.
+        """
+        objects: Dict[OID, Tuple[Any, Getter, Setter]] = {}
+        for column, getter in SYSTEM_INFO:
+            objects[IOTHINX_OID + (1, column, 0)] = (self._rack, getter, None)
+        for kind, (entry, columns) in TABLES.items():
+            for column, getter, setter in columns:
+                for channel in self._rack.tables[kind]:
+                    objects[IOTHINX_OID + entry + (column, channel.index)] = (channel, getter, setter)
+        for kind, entry in REGISTER_TABLES.items():
+            for column, getter, setter in REGISTER_COLUMNS:
+                for register in self._rack.registers[kind]:
+                    objects[IOTHINX_OID + entry + (column, register.index)] = (register, getter, setter)
+        self._objects = objects
+        self._oids = sorted(objects)
+
+    def _read(self, oid: OID) -> Any:
+        item, getter, _ = self._objects[oid]
+        return getter(item)
+
+    def readVars(self, varBinds, acInfo=(None, None)):
+        result = []
+        for name, _ in varBinds:
+            oid = tuple(name)
+            result.append((name, self._read(oid) if oid in self._objects else v2c.NoSuchInstance()))
+        return result
+
+    def readNextVars(self, varBinds, acInfo=(None, None)):
+        result = []
+        for name, _ in varBinds:
+            position = bisect.bisect_right(self._oids, tuple(name))
+            if position < len(self._oids):
+                oid = self._oids[position]
+                result.append((v2c.ObjectIdentifier(oid), self._read(oid)))
+            else:
+                result.append((name, v2c.EndOfMibView()))
+        return result
+
+    def writeVars(self, varBinds, acInfo=(None, None)):
+        for idx, (name, _) in enumerate(varBinds):
+            oid = tuple(name)
+            if oid not in self._objects:
+                raise error.NoCreationError(name=name, idx=idx)
+            if self._objects[oid][2] is None:
+                raise error.NotWritableError(name=name, idx=idx)
+
+        for idx, (name, value) in enumerate(varBinds):
+            item, _, setter = self._objects[tuple(name)]
+            try:
+                setter(item, value)
+            except (TypeError, ValueError):
+                raise error.WrongValueError(name=name, idx=idx)
+        return [(name, self._read(tuple(name))) for name, _ in varBinds]
+
+
+class LossyUdpTransport(udp.UdpAsyncioTransport):
+    """
+    UDP транспорт с имитацией задержки и потери пакетов.
+    """
+    latency: float = 0.0
+    loss: float = 0.0
+    rng: random.Random = random.Random()
+
+    def datagram_received(self, datagram, transportAddress):
+        if self.loss and self.rng.random() < self.loss:
+            return
+        if self.latency:
+            asyncio.get_event_loop().call_later(self.latency, super().datagram_received, datagram, transportAddress)
+        else:
+            super().datagram_received(datagram, transportAddress)
+
+
+class IoThinxAgent:
+    def __init__(self, rack: SimRack, host: str = '127.0.0.1', port: int = 1161, community: Optional[str] = 'public',
+                 users: Optional[List[Dict[str, str]]] = None, latency: float = 0.0, loss: float = 0.0,
+                 seed: Optional[int] = None) -> None:
+        """
+        SNMP агент имитируемой стойки ioThinx 4510.
+
+        :param rack: Имитируемая стойка
+        :param host: Адрес для прослушивания
+        :param port: UDP порт
+        :param community: Community для v1/v2c, None отключает v1/v2c
+        :param users: Пользователи v3, словари с ключами username, auth_key, priv_key, auth_protocol, priv_protocol.
+            Протоколы задаются именами из pysnmp.entity.config, например usmHMACSHAAuthProtocol
+        :param latency: Задержка обработки запроса в секундах
+        :param loss: Доля теряемых запросов от 0 до 1
+        :param seed: Зерно генератора потерь
+        """
+        self.rack: SimRack = rack
+        self.host: str = host
+        self.port: int = port
+        self._community: Optional[str] = community
+        self._users: List[Dict[str, str]] = users or []
+        self._latency: float = latency
+        self._loss: float = loss
+        self._seed: Optional[int] = seed
+
+        self.controller: RackMibController = RackMibController(rack)
+        self._engine: Optional[engine.SnmpEngine] = None
+
+    def start(self) -> None:
+        self._engine = snmp_engine = engine.SnmpEngine()
+
+        transport = type('AgentTransport', (LossyUdpTransport,), {
+            'latency': self._latency, 'loss': self._loss, 'rng': random.Random(self._seed)
+        })
+        config.addTransport(snmp_engine, udp.domainName, transport().openServerMode((self.host, self.port)))
+
+        if self._community is not None:
+            config.addV1System(snmp_engine, 'iothinx-area', self._community)
+            config.addVacmUser(snmp_engine, 1, 'iothinx-area', 'noAuthNoPriv', IOTHINX_OID, IOTHINX_OID)
+            config.addVacmUser(snmp_engine, 2, 'iothinx-area', 'noAuthNoPriv', IOTHINX_OID, IOTHINX_OID)
+
+        for user in self._users:
+            auth_protocol = getattr(config, user.get('auth_protocol') or 'usmNoAuthProtocol')
+            priv_protocol = getattr(config, user.get('priv_protocol') or 'usmNoPrivProtocol')
+            config.addV3User(snmp_engine, user['username'], auth_protocol, user.get('auth_key'), priv_protocol, user.get('priv_key'))
+            if priv_protocol != config.usmNoPrivProtocol:
+                level = 'authPriv'
+            elif auth_protocol != config.usmNoAuthProtocol:
+                level = 'authNoPriv'
+            else:
+                level = 'noAuthNoPriv'
+            config.addVacmUser(snmp_engine, 3, user['username'], level, IOTHINX_OID, IOTHINX_OID)
+
+        snmp_context = context.SnmpContext(snmp_engine)
+        snmp_context.unregisterContextName(v2c.OctetString(''))
+        snmp_context.registerContextName(v2c.OctetString(''), self.controller)
+
+        cmdrsp.GetCommandResponder(snmp_engine, snmp_context)
+        cmdrsp.NextCommandResponder(snmp_engine, snmp_context)
+        cmdrsp.BulkCommandResponder(snmp_engine, snmp_context)
+        cmdrsp.SetCommandResponder(snmp_engine, snmp_context)
+
+        logger.info(f'SNMP agent {self.rack.name} listening on {self.host}:{self.port}')
+
+    def stop(self) -> None:
+        if self._engine is not None:
+            self._engine.transportDispatcher.closeDispatcher()
+            self._engine = None
+
+
+async def run_agents(count: int, port: int, layout: List[str], host: str = '127.0.0.1', community: Optional[str] = 'public',
+                     users: Optional[List[Dict[str, str]]] = None, latency: float = 0.0, loss: float = 0.0,
+                     interval: float = 0.1) -> None:
+    """
+    Запустить несколько агентов на последовательных портах, начиная с port.
+    """
+    agents = []
+    for number in range(count):
+        rack = SimRack(layout, name=f'ioThinx-SIM-{number:03}', seed=number)
+        agent = IoThinxAgent(rack, host, port + number, community, users, latency, loss, seed=number)
+        agent.start()
+        agents.append(agent)
+
+    try:
+        await asyncio.gather(*[agent.rack.run(interval) for agent in agents])
+    finally:
+        for agent in agents:
+            agent.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='ioThinx 4510 SNMP agent simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1161)
+    parser.add_argument('--count', type=int, default=1, help='number of agents on consecutive ports')
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    parser.add_argument('--community', default='public')
+    parser.add_argument('--user', default=None, help='SNMPv3 user name')
+    parser.add_argument('--auth-key', default=None)
+    parser.add_argument('--auth-protocol', default='usmHMACSHAAuthProtocol')
+    parser.add_argument('--priv-key', default=None)
+    parser.add_argument('--priv-protocol', default='usmAesCfb128Protocol')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='fraction of dropped requests')
+    parser.add_argument('--interval', type=float, default=0.1, help='simulation step, seconds')
+    args = parser.parse_args()
+
+    users = None
+    if args.user:
+        users = [{
+            'username': args.user,
+            'auth_key': args.auth_key,
+            'auth_protocol': args.auth_protocol if args.auth_key else None,
+            'priv_key': args.priv_key,
+            'priv_protocol': args.priv_protocol if args.priv_key else None,
+        }]
+
+    logging.basicConfig(level=logging.INFO)
+    layout = args.layout.split(',') if args.layout else None
+    asyncio.run(run_agents(args.count, args.port, layout, args.host, args.community, users, args.latency, args.loss, args.interval))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Локальная имитация Web API ioThinx 4510 (см. iothinx-web-api.md) для iolib.Device.
+
+    python -m simulator.web_api --count 10 --port 8080 --latency 0.005
+"""
+import os
+import ssl
+import json
+import uuid
+import rsa
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+from .rack import SimRack, SimModule
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = 'sessionid'
+
+_KEYS: Dict[int, Tuple[rsa.PublicKey, rsa.PrivateKey]] = {}
+
+
+def _keys(bits: int) -> Tuple[rsa.PublicKey, rsa.PrivateKey]:
+    """
+    RSA ключи авторизации, общие для всех серверов процесса: генерация ключа занимает заметное время.
+    """
+    if bits not in _KEYS:
+        _KEYS[bits] = rsa.newkeys(bits)
+    return _KEYS[bits]
+
+
+def _json(data: Any) -> web.Response:
+    # iolib сравнивает Content-Type целиком, без charset
+    return web.Response(body=json.dumps(data).encode(), content_type='application/json')
+
+
+def _io_info(module: SimModule) -> dict:
+    info = {}
+    for channel in module.channels:
+        no = len(info.get(channel.kind, []))
+        if channel.kind == 'di':
+            row = [no, channel.name, channel.mode, channel.counter, channel.trigger, channel.filter, channel.status]
+        elif channel.kind in ('do', 'relay'):
+            row = [no, channel.name, channel.mode, channel.on_width, channel.off_width, channel.pulse_count, channel.status]
+        elif channel.kind == 'ai':
+            row = [no, channel.name, 1, channel.range_min, channel.range_max, channel.value, channel.min, channel.max, 0, 'mA']
+        elif channel.kind == 'ao':
+            row = [no, channel.name, channel.mode, channel.range_min, channel.range_max, channel.value, 1, 'mA']
+        else:
+            row = [no, channel.name, 1, channel.value, channel.min, channel.max, 'C']
+        info.setdefault(channel.kind, []).append(row)
+    return info
+
+
+class WebApiServer:
+    def __init__(self, rack: SimRack, host: str = '127.0.0.1', port: int = 8080, username: str = 'admin',
+                 password: str = 'moxa', latency: float = 0.0, key_bits: int = 1024, capacity: int = 0) -> None:
+        """
+        HTTP сервер имитируемой стойки ioThinx 4510.
+
+        :param rack: Имитируемая стойка
+        :param host: Адрес для прослушивания
+        :param port: TCP порт
+        :param username: Имя пользователя
+        :param password: Пароль
+        :param latency: Задержка обработки запроса в секундах
+        :param key_bits: Длина RSA ключа авторизации
+        :param capacity: Число одновременно обрабатываемых запросов, сверх него ответ 503. 0 - без ограничения
+        """
+        self.rack: SimRack = rack
+        self.host: str = host
+        self.port: int = port
+        self.latency: float = latency
+        self.requests: int = 0
+        """Число обработанных запросов"""
+        self.capacity: int = capacity
+        self.inflight: int = 0
+        self.rejected: int = 0
+        """Число запросов, отклоненных из-за перегрузки"""
+
+        self._username: str = username
+        self._password: str = password
+        self._public_key, self._private_key = _keys(key_bits)
+        self._sessions: Set[str] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app: web.Application = web.Application(middlewares=[self._middleware])
+        self.app.add_routes([
+            web.get('/', self._index),
+            web.get('/auth.js', self._auth_js),
+            web.post('/action/login', self._login),
+            web.get('/action/device', self._device),
+            web.get('/action/slotinfo', self._slotinfo),
+            web.get('/action/time', self._time),
+            web.get('/action/io/{direct}/{slot}', self._io),
+            web.put('/action/io/do/doStatus/{direct}/{slot}/{no}', self._do_status),
+            web.put('/action/io/ao/aoValueScaled/{direct}/{slot}/{no}', self._ao_value),
+        ])
+
+    async def start(self, ssl_context=None) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port, ssl_context=ssl_context).start()
+        logger.info(f'Web API {self.rack.name} listening on {self.host}:{self.port}')
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        if self.capacity and self.inflight >= self.capacity:
+            self.rejected += 1
+            return web.Response(status=503, text='Server busy')
+
+        self.inflight += 1
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if request.path.startswith('/action/') and request.path != '/action/login':
+                if request.cookies.get(SESSION_COOKIE) not in self._sessions:
+                    return web.Response(status=401, text='Unauthorized')
+            return await handler(request)
+        finally:
+            self.inflight -= 1
+
+    async def _index(self, request: web.Request) -> web.Response:
+        return web.Response(text='<html><body>ioThinx 4510</body></html>', content_type='text/html')
+
+    async def _auth_js(self, request: web.Request) -> web.Response:
+        n = f'{self._public_key.n:X}'
+        e = f'{self._public_key.e:x}'
+        return web.Response(text=f'var auth={{signin:function(t){{var r="{n}",n="{e}";return t}}}};',
+                            content_type='application/javascript')
+
+    async def _login(self, request: web.Request) -> web.Response:
+        data = await request.read()
+        try:
+            credentials = json.loads(rsa.decrypt(data[:-32], self._private_key))
+        except (rsa.DecryptionError, ValueError):
+            return web.Response(status=400, text='Bad request')
+        if credentials.get('username') != self._username or credentials.get('password') != self._password:
+            return web.Response(status=403, text='Forbidden')
+
+        session = uuid.uuid4().hex
+        self._sessions.add(session)
+        response = web.Response(text='OK')
+        response.set_cookie(SESSION_COOKIE, session)
+        return response
+
+    async def _device(self, request: web.Request) -> web.Response:
+        rack = self.rack
+        return _json([rack.name, len(rack.modules), rack.version, rack.serial, rack.ip, rack.mac, 1, rack.error])
+
+    async def _slotinfo(self, request: web.Request) -> web.Response:
+        infos = [[0, module.slot, module.type.value, module.name, module.version, module.serial, 0, 0]
+                 for module in self.rack.modules]
+        return _json({'infos': infos})
+
+    async def _time(self, request: web.Request) -> web.Response:
+        return _json(datetime.now().strftime('%Y-%m-%dT%H:%M:%S'))
+
+    def _module(self, request: web.Request) -> SimModule:
+        module = self.rack.module(int(request.match_info['slot']))
+        if module is None:
+            raise web.HTTPNotFound()
+        return module
+
+    def _channels(self, request: web.Request, kind: str) -> List:
+        return [channel for channel in self._module(request).channels if channel.kind == kind]
+
+    async def _io(self, request: web.Request) -> web.Response:
+        return _json(_io_info(self._module(request)))
+
+    async def _do_status(self, request: web.Request) -> web.Response:
+        channels = self._channels(request, 'do')
+        no = int(request.match_info['no'])
+        if no >= len(channels):
+            raise web.HTTPNotFound()
+        channels[no].set_status(json.loads(await request.text())[0])
+        return _json({'result': 0})
+
+    async def _ao_value(self, request: web.Request) -> web.Response:
+        channels = self._channels(request, 'ao')
+        no = int(request.match_info['no'])
+        if no >= len(channels):
+            raise web.HTTPNotFound()
+        channels[no].set_value(float(json.loads(await request.text())[0]))
+        return _json({'result': 0})
+
+
+def self_signed_context(directory: Optional[str] = None) -> ssl.SSLContext:
+    """
+    Серверный SSL контекст с самоподписанным сертификатом, как у ioThinx по умолчанию. Требуется openssl.
+    Счетчик полных и возобновленных рукопожатий: context.session_stats().
+    """
+    directory = directory or tempfile.mkdtemp(prefix='iothinx-sim-')
+    certfile, keyfile = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    if not os.path.exists(certfile):
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '365', '-subj', '/CN=ioThinx-SIM',
+                        '-keyout', keyfile, '-out', certfile], check=True, capture_output=True)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+async def run_servers(count: int, port: int, layout: List[str], host: str = '127.0.0.1', latency: float = 0.0,
+                      interval: float = 0.1, tls: bool = False) -> None:
+    servers = []
+    context = self_signed_context() if tls else None
+    for number in range(count):
+        server = WebApiServer(SimRack(layout, name=f'ioThinx-SIM-{number:03}', seed=number), host, port + number, latency=latency)
+        await server.start(context)
+        servers.append(server)
+
+    try:
+        await asyncio.gather(*[server.rack.run(interval) for server in servers])
+    finally:
+        for server in servers:
+            await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='ioThinx 4510 web API simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--count', type=int, default=1, help='number of servers on consecutive ports')
+    parser.add_argument('--layout', default=None, help='comma separated module types, e.g. 45MR-1600,45MR-2600')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds')
+    parser.add_argument('--interval', type=float, default=0.1, help='simulation step, seconds')
+    parser.add_argument('--tls', action='store_true', help='serve HTTPS with a self-signed certificate')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    layout = args.layout.split(',') if args.layout else None
+    asyncio.run(run_servers(args.count, args.port, layout, args.host, args.latency, args.interval, args.tls))
+
+
+if __name__ == '__main__':
+    main()